@@ -0,0 +1,94 @@
+// SPDX-License-Identifier: MIT
+pragma solidity 0.8.26;
+
+import {Test} from "forge-std/Test.sol";
+import {GasSnapshot} from "forge-gas-snapshot/GasSnapshot.sol";
+import {Deployers} from "@uniswap/v4-core/test/utils/Deployers.sol";
+import {IPoolManager} from "v4-core/interfaces/IPoolManager.sol";
+import {LPFeeLibrary} from "v4-core/libraries/LPFeeLibrary.sol";
+import {Hooks} from "v4-core/libraries/Hooks.sol";
+import {PoolSwapTest} from "v4-core/test/PoolSwapTest.sol";
+import {TickMath} from "v4-core/libraries/TickMath.sol";
+
+import {DammHook} from "../src/DammHook.sol";
+
+/*
+Gas snapshots of the hook as a function of the number of fee submitters
+(`senders`) in the block, written to `forge-snapshots/` by
+`forge test --match-contract TestDammHookGas` and read by
+`stats/gas_model.py` to calibrate its coefficients:
+    swap_first_in_block_cleared_<k>   first swap of a block, deleting the k senders of the previous one
+    swap_new_sender_senders_<k>       swap by a new fee submitter with k senders stored
+    swap_existing_sender_senders_<k>  swap raising the fee of one of the k senders
+    swap_no_fee_senders_<k>           swap without a submitted fee, with k senders stored
+    combined_fee_senders_<k>          calculateCombinedFee with k senders
+*/
+contract TestDammHookGas is Test, Deployers, GasSnapshot {
+    DammHook hook;
+    PoolSwapTest.TestSettings testSettings = PoolSwapTest.TestSettings({takeClaims: false, settleUsingBurn: false});
+    IPoolManager.SwapParams params = IPoolManager.SwapParams({
+        zeroForOne: true,
+        amountSpecified: -0.000001 ether,
+        sqrtPriceLimitX96: TickMath.MIN_SQRT_PRICE + 1
+    });
+
+    function setUp() public {
+        deployFreshManagerAndRouters();
+        deployMintAndApprove2Currencies();
+        address hookAddress = address(
+            uint160(
+                Hooks.BEFORE_INITIALIZE_FLAG |
+                    Hooks.BEFORE_SWAP_FLAG |
+                    Hooks.AFTER_SWAP_FLAG
+            )
+        );
+        vm.txGasPrice(10 gwei);
+        deployCodeTo("DammHook", abi.encode(manager), hookAddress);
+        hook = DammHook(hookAddress);
+        (key, ) = initPool(currency0, currency1, hook, LPFeeLibrary.DYNAMIC_FEE_FLAG, SQRT_PRICE_1_1, ZERO_BYTES);
+        modifyLiquidityRouter.modifyLiquidity(
+            key,
+            IPoolManager.ModifyLiquidityParams({
+                tickLower: -120,
+                tickUpper: 120,
+                liquidityDelta: 10000 ether,
+                salt: bytes32(0)
+            }),
+            ZERO_BYTES
+        );
+    }
+
+    function _swap(address sender, uint256 submittedDeltaFee) internal {
+        bytes memory hookData = abi.encode(DammHook.NewHookData(hook.getHookData(submittedDeltaFee), sender));
+        swapRouter.swap(key, params, testSettings, hookData);
+    }
+
+    function testGasBySenders() public {
+        uint16[7] memory sizes = [1, 2, 4, 8, 16, 32, 64];
+        uint256 previousSenders = 0;
+        for (uint256 s = 0; s < sizes.length; s++) {
+            uint256 k = sizes[s];
+            vm.roll(block.number + 1);
+            // fresh addresses per block: `submittedDeltaFees` is not cleared between blocks
+            address first = address(uint160(0x10000 * (s + 1)));
+            // the highest 15% first, so that the sort has to swap them to the end and
+            // the kept fees are all equal (unequal ones underflow `sortedFees[i] - meanFee`)
+            uint256 high = k - k * 85 / 100;
+            _swap(first, 2000);
+            snapLastCall(string.concat("swap_first_in_block_cleared_", vm.toString(previousSenders)));
+            for (uint256 i = 1; i < k; i++) {
+                _swap(address(uint160(0x10000 * (s + 1) + i)), i < high ? 2000 : 1000);
+                if (i == k - 1) {
+                    snapLastCall(string.concat("swap_new_sender_senders_", vm.toString(k - 1)));
+                }
+            }
+            _swap(first, 2500);
+            snapLastCall(string.concat("swap_existing_sender_senders_", vm.toString(k)));
+            _swap(address(uint160(0x10000 * (s + 1) + k)), 0);
+            snapLastCall(string.concat("swap_no_fee_senders_", vm.toString(k)));
+            hook.publicCalculateCombinedFee(block.number, first, false);
+            snapLastCall(string.concat("combined_fee_senders_", vm.toString(k)));
+            previousSenders = k;
+        }
+    }
+}
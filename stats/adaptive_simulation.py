@@ -0,0 +1,204 @@
+"""
+Adaptive Monte-Carlo runner for `Simulation`.
+
+`AdaptiveSimulation.run_until` adds batches of paths until the
+confidence interval half-width of both mean lvr and mean arb gain per day
+is below a target, instead of running a fixed number of paths. Two
+variance reductions can be combined:
+
+- antithetic paths: every drawn path is also run mirrored
+  (`GBMPricePaths.antithetic`), with the same submitted fees, swappers and
+  order book pressures. A sample is the average of the pair.
+- a control variate: the frictionless arb gain of the same price path,
+
+      C = sum_b L (sqrt(P_b) - sqrt(P_b-1))^2 / sqrt(P_b-1),
+
+  the loss of a pool without fees or gas rebalanced every block, whose
+  mean over a martingale GBM path is exactly 2 L sqrt(P_0) (1 - exp(-sigma^2 (blocks - 1) / 8)).
+  Samples are adjusted by the regression coefficient on C.
+
+The result reports means, half-widths, the paths used and the variance
+reduction: the plain per-path variance divided by `paths` times the
+variance of the estimator, i.e. how many times fewer paths the same
+precision took.
+
+NOTE: at low volatility lvr is dominated by the fee-driven trades around
+the efficient price, weakly correlated with C, and the antithetic pair
+does most of the work; at high volatility it is the reverse. Compare the
+reported reductions with either switched off.
+"""
+import math
+from statistics import NormalDist
+import click
+import numpy as np
+from simulation import Simulation
+from amm_kernel import amm_params, draw_path, run_path
+from price_paths import GBMPricePaths, path_rng
+
+METRICS = ('lvr', 'arbitrage_gain')
+
+
+def frictionless_arbitrage(prices: np.ndarray, L: float) -> float:
+    """Arb gain before fees and gas of a pool with liquidity `L` rebalanced to every price of `prices`."""
+    sqrt_prices = np.sqrt(prices)
+    return float(L * np.sum(np.diff(sqrt_prices)**2 / sqrt_prices[:-1]))
+
+
+def expected_frictionless_arbitrage(initial_price: float, sigma: float, total_number_of_blocks: int, L: float) -> float:
+    """
+    Mean of `frictionless_arbitrage` over martingale GBM paths with block
+    volatility `sigma`: E sqrt(P_b) = sqrt(P_0) exp(-b sigma^2 / 8) and the
+    block terms telescope.
+    """
+    return -2 * L * math.sqrt(initial_price) * math.expm1(-(total_number_of_blocks - 1) * sigma**2 / 8)
+
+
+def mean_and_half_width(samples: np.ndarray,
+                        controls: np.ndarray|None=None,
+                        expected_control: float=0.0,
+                        confidence: float=0.95) -> tuple[float, float, float]:
+    """
+    Mean of i.i.d. `samples`, adjusted by the regression on `controls` if given.
+    Returns:
+        mean, confidence interval half-width and variance of the mean.
+    """
+    n = samples.shape[0]
+    if controls is not None and n > 2 and np.var(controls) > 0.0:
+        centred = controls - controls.mean()
+        beta = np.dot(centred, samples - samples.mean()) / np.dot(centred, centred)
+        samples = samples - beta * (controls - expected_control)
+        # one degree of freedom spent on beta
+        variance = np.var(samples, ddof=2) / n
+    else:
+        variance = np.var(samples, ddof=1) / n
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    return float(samples.mean()), float(z * math.sqrt(variance)), float(variance)
+
+
+class AdaptiveSimulation(Simulation):
+    """
+    `Simulation` run until a confidence interval target by `run_until`,
+    `paths` being the maximum number of paths. `do_simulation` is still the
+    fixed-size run of `Simulation`.
+    """
+    def run_until(self,
+                      tolerance: float,
+                      relative: bool=False,
+                      confidence: float=0.95,
+                      antithetic: bool=True,
+                      control_variate: bool=True,
+                      batch_size: int=16,
+                      min_paths: int=32,
+                      seed: int|None=None) -> dict:
+        """
+        Args:
+            tolerance: target half-width of mean lvr and arb gain per day,
+                as a fraction of the absolute mean if `relative`.
+            batch_size: paths added between two checks of the target.
+            seed: root of the per-sample streams, `path_rng(entropy, sample)`.
+                Kept in `self.entropy`. With a `gas_model`, paths run on the
+                scalar AMM, which still draws fees and swappers from the
+                global RNGs.
+        Returns:
+            per metric the mean, `_half_width` and `_variance_reduction`,
+            the `paths` run, whether the target was `converged` and the
+            (3, paths) `results` per path as in `Simulation.do_simulation`.
+        """
+        self.entropy = np.random.SeedSequence(seed).entropy
+        price_paths = GBMPricePaths(self.initial_price,
+                                    self.daily_sigma,
+                                    self.days,
+                                    self.blocks_per_day)
+        L = 166_666.67
+        expected_control = expected_frictionless_arbitrage(self.initial_price,
+                                                           price_paths.sigma,
+                                                           price_paths.total_number_of_blocks,
+                                                           L) / self.days
+        params = amm_params(L=L,
+                            base_fee=0.003,
+                            m=0.5,
+                            n=2,
+                            alpha=0.5,
+                            intent_threshold=0.95)
+        paths_per_sample = 2 if antithetic else 1
+        max_samples = max(2, self.paths // paths_per_sample)
+        batch_samples = max(1, batch_size // paths_per_sample)
+        min_samples = max(3, min_paths // paths_per_sample)
+        results = np.zeros((3, max_samples * paths_per_sample))
+        controls = np.zeros(max_samples)
+        summary = {}
+        samples = 0
+        converged = False
+        while samples < max_samples and not converged:
+            for sample in range(samples, min(samples + batch_samples, max_samples)):
+                rng = path_rng(self.entropy, sample)
+                if self.gas_model is None:
+                    prices, submitted_fees, swappers, pressures = draw_path(rng,
+                                                                            float(self.initial_price),
+                                                                            price_paths.sigma,
+                                                                            price_paths.total_number_of_blocks)
+                else:
+                    prices = price_paths.path(rng)
+                pair = (prices, price_paths.antithetic(prices)) if antithetic else (prices,)
+                for i, path_prices in enumerate(pair):
+                    if self.gas_model is None:
+                        totals = run_path(path_prices, submitted_fees, swappers, pressures, params, self.gas_cost)
+                    else:
+                        totals = self.run_path(path_prices)
+                    results[:, sample * paths_per_sample + i] = totals / self.days
+                    controls[sample] += frictionless_arbitrage(path_prices, L) / self.days / paths_per_sample
+                samples = sample + 1
+            if samples < min(min_samples, max_samples):
+                continue
+            per_sample = results[:, :samples * paths_per_sample].reshape(3, samples, paths_per_sample).mean(axis=2)
+            converged = True
+            for row, metric in enumerate(METRICS):
+                mean, half_width, variance = mean_and_half_width(per_sample[row],
+                                                                 controls[:samples] if control_variate else None,
+                                                                 expected_control,
+                                                                 confidence)
+                plain_variance = np.var(results[row, :samples * paths_per_sample], ddof=1)
+                summary[metric] = mean
+                summary[metric + '_half_width'] = half_width
+                summary[metric + '_variance_reduction'] = \
+                    float(plain_variance / (samples * paths_per_sample * variance)) if variance > 0.0 else math.inf
+                converged &= half_width <= (tolerance * abs(mean) if relative else tolerance)
+        summary['paths'] = samples * paths_per_sample
+        summary['converged'] = converged
+        summary['results'] = results[:, :samples * paths_per_sample]
+        return summary
+
+
+@click.command()
+@click.option('--initial-price', type=float, default=2000.0, show_default=True)
+@click.option('--daily-sigma', type=float, default=0.05, show_default=True)
+@click.option('--days', type=float, default=1.0, show_default=True)
+@click.option('--gas-cost', type=float, default=1.0, show_default=True)
+@click.option('--tolerance', type=float, default=0.01, show_default=True,
+              help='Target confidence interval half-width, relative to the mean unless --absolute.')
+@click.option('--absolute', is_flag=True, help='--tolerance is in the units of the metrics.')
+@click.option('--confidence', type=float, default=0.95, show_default=True)
+@click.option('--max-paths', type=int, default=10_000, show_default=True)
+@click.option('--batch-size', type=int, default=16, show_default=True)
+@click.option('--no-antithetic', is_flag=True)
+@click.option('--no-control-variate', is_flag=True)
+@click.option('--seed', type=int, default=None)
+def main(initial_price, daily_sigma, days, gas_cost, tolerance, absolute, confidence, max_paths,
+         batch_size, no_antithetic, no_control_variate, seed):
+    """Runs the simulation until the target precision and prints the confidence intervals."""
+    simulation = AdaptiveSimulation(initial_price, daily_sigma, days, gas_cost, 166_666.67, 0.003, max_paths)
+    summary = simulation.run_until(tolerance,
+                                   relative=not absolute,
+                                   confidence=confidence,
+                                   antithetic=not no_antithetic,
+                                   control_variate=not no_control_variate,
+                                   batch_size=batch_size,
+                                   seed=seed)
+    click.echo(f"paths: {summary['paths']} ({'converged' if summary['converged'] else 'maximum reached'})")
+    for metric in METRICS:
+        click.echo(f"{metric:>15}: {summary[metric]:.4f} ± {summary[metric + '_half_width']:.4f} "
+                   f"({confidence:.0%}), variance reduction x{summary[metric + '_variance_reduction']:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,520 @@
+"""
+Pool logic shared by the AMM variants (`amm_modified`, `amm_v2`), which
+only differ in which directional fee a buy or a sell pays under the
+order book pressure, see `BaseAMM._buy_and_sell_fees`.
+"""
+import numpy as np
+import math
+import logging
+from price_feed import PriceFeed, PressureSeries
+from order_statistics import SortedFees
+from block_cache import BlockCache, block_cached
+from swapper_registry import SwapperRegistry
+from gas_model import GasModel
+from pool_state import PoolState
+from instrumentation import (Instrumentation,
+                             SWAPS_EXECUTED,
+                             SWAPS_REJECTED,
+                             SWAPS_GAS_REJECTED,
+                             FIRST_TRANSACTION_SURCHARGES,
+                             LOYALTY_DISCOUNTS,
+                             ENDOGENOUS_FEE,
+                             EXOGENOUS_FEE,
+                             COMBINED_FEE)
+
+class BaseAMM:
+    def __init__(self,
+                 price,
+                 L: float=166_666.67,
+                 base_fee=0.003,
+                 m=0.5,
+                 n=2,
+                 alpha=0.5,
+                 intent_threshold=0.95,
+                 intent_window: int=256,
+                 cut_off_percentile: float=0.85,
+                 cut_off_percentile_step: float=0.05,
+                 block_cache_size: int=128,
+                 instrumentation: Instrumentation|None=None,
+                 price_feed: PriceFeed|PressureSeries|None=None,
+                 gas_model: GasModel|None=None) -> None:
+        self.logger = logging.getLogger(type(self).__name__)
+        self.sqrt_price = math.sqrt(price)
+        # block:
+        self.current_block_id = None
+        self.price_before_previous_block = int(price * 0.995)
+        self.price_after_previous_block = price
+        self.slippage = 0
+        # order book pressure of the current block, set by `begin_block`
+        self.order_bool_pressure = 0.0
+        # pool price around the last price move
+        self.price_x_before_swap = price
+        self.price_x_after_swap = price
+
+        self.L = L
+        self.base_fee = base_fee
+        # fees as rates, i.e. without the leading 1
+        self.pool_fee = base_fee
+        self.pool_fee_in_market_direction = base_fee
+        self.pool_fee_in_opposite_direction = base_fee
+        # fee components of the last swap, as computed by `calculate_combined_fee`
+        self.endogenous_fee = base_fee
+        self.exogenous_fee = base_fee
+        self.combined_fee = base_fee
+       
+        self.cut_off_percentile = cut_off_percentile
+        self.cut_off_percentile_step = cut_off_percentile_step
+        self.m = m
+        self.n = n
+        self.alpha = alpha  # Weight for endogenous fee
+        # Threshold for intent to trade
+        self.intent_threshold = intent_threshold  
+        # Flag to track the first transaction
+        self.first_transaction = True  
+        # Swappers per block over the last `intent_window` blocks, tracks intent to trade
+        self.swapper_registry = SwapperRegistry(window=intent_window)
+        # Total number of blocks
+        self.total_blocks = 0  
+       
+        # NOTE: mocking chain_link price feed from CEX,
+        # a `PressureSeries` replays pre-generated or recorded pressures instead
+        self.price_feed = PriceFeed(price) if price_feed is None else price_feed
+
+        # submitted fee
+        self.submitted_fees_multiple_threshold = 3
+        self.submitted_fees = SortedFees()
+
+        # per-instance cache, cleared at every block boundary
+        self.block_cache = BlockCache(maxsize=block_cache_size)
+
+        # opt-in per-block counters and timers, None costs one check per site
+        self.instrumentation = instrumentation
+
+        # gas charged per swap: the given constant, or scaled by `gas_model`
+        # to the hook's fee submitters (`senders`) of the block
+        self.gas_model = gas_model
+        self.gas_charged = 0.0
+        self.hook_senders = set()
+        self.previous_block_senders = 0
+        self.first_swap_in_block = True
+
+    @block_cached
+    def endogenous_dynamic_fee(self, block_id: int) -> float:
+        if block_id == 0:
+            return self.base_fee
+        price_impact = abs(self.price_after_previous_block -
+                           self.price_before_previous_block) / self.price_before_previous_block
+        dynamic_fee = self.base_fee + price_impact * 0.01  # Example: 1% of price impact
+        return dynamic_fee
+
+    def exogenous_dynamic_fee(self, swapper_id: int|None):
+        # exogenous fees - submitted fees ordered
+        if len(self.submitted_fees) < 2:
+            return self.base_fee
+        # constant set in constructor to 0.85 - first time, will be amended top 15% will be discarded
+        mean_fee, sigma_fee = self.submitted_fees.trimmed_mean_and_std(self.cut_off_percentile)
+        # identifies if former intent also led to swap loyal LT - to be improved by LaaS
+        if self.swapper_registry.in_current_block(swapper_id):
+            # Discounted fee
+            dynamic_fee = mean_fee + self.m * sigma_fee  
+        else:
+            # Regular fee
+            dynamic_fee = self.n * sigma_fee  
+        return dynamic_fee
+
+    def calculate_combined_fee(self, block_id, swapper_id):
+        instrumentation = self.instrumentation
+        if instrumentation is None:
+            endogenous_fee = self.endogenous_dynamic_fee(block_id=block_id)
+            exogenous_fee = self.exogenous_dynamic_fee(swapper_id)
+        else:
+            endogenous_fee = instrumentation.time(ENDOGENOUS_FEE, self.endogenous_dynamic_fee, block_id=block_id)
+            exogenous_fee = instrumentation.time(EXOGENOUS_FEE, self.exogenous_dynamic_fee, swapper_id)
+        combined_fee, self.cut_off_percentile, loyal = self._combine_fees(endogenous_fee, exogenous_fee, swapper_id)
+        if self.first_transaction:
+            self.first_transaction = False
+            if instrumentation is not None:
+                instrumentation.count(FIRST_TRANSACTION_SURCHARGES)
+        if loyal and instrumentation is not None:
+            instrumentation.count(LOYALTY_DISCOUNTS)
+        self.endogenous_fee = endogenous_fee
+        self.exogenous_fee = exogenous_fee
+        self.combined_fee = combined_fee
+        return combined_fee
+
+    def _combine_fees(self, endogenous_fee: float, exogenous_fee: float, swapper_id) -> tuple[float, float, bool]:
+        """
+        Combined fee of a swap from its components, without side effects.
+        Returns:
+            combined fee, cut-off percentile after the swap and whether the
+            swapper gets the loyalty discount.
+        """
+        combined_fee = self.alpha * endogenous_fee + (1 -  self.alpha) * exogenous_fee
+        combined_fee = max(combined_fee, endogenous_fee)
+        cut_off_percentile = self.cut_off_percentile
+        # Adjust cut-off percentile
+        if combined_fee <= (self.base_fee * 1.25):
+            # 1 - no VCG auction everybody participates
+            cut_off_percentile = min(cut_off_percentile + self.cut_off_percentile_step, 1.0)
+        if combined_fee > self.base_fee * 2: # set by AMM how aggressive
+            cut_off_percentile = max(cut_off_percentile - self.cut_off_percentile_step, 0.5)
+
+        # first transaction is on a pool by pool basis - not yet included
+        if self.first_transaction:
+            combined_fee *= 5  # Charge higher fee for the first transaction
+        # NOTE: unhandled case: -> high gas fees.
+       
+        # Check for continuous intent to trade
+        # might include pool_id to identify other types of pools for instance meme pools
+        # swapper intent -> laas
+        loyal = False
+        if swapper_id in self.swapper_registry:
+            intent_rate = self.swapper_registry.intent_rate(swapper_id)
+            if intent_rate >= self.intent_threshold:
+                # NOTE: Apply additional discount for loyal swapper addresses in dict
+                # NOTE: mocking brevis
+                combined_fee *= 0.9
+                loyal = True
+        return combined_fee, cut_off_percentile, loyal
+   
+    def buy_x_tokens_for_y_tokens(self,
+                                  new_sqrt_price: float,
+                                  pool_fee_plus_one: float):
+        """
+        Returns:
+            x, y, fee: The amounts of X and Y tokens traded and the fee.
+        """
+        x = self.calculate_amount_x_tokens_involved_in_swap(new_sqrt_price)
+        y = self.calculate_amount_of_y_tokens_involved_in_swap(new_sqrt_price)
+        return (x,
+                y * pool_fee_plus_one,
+                -y * (pool_fee_plus_one - 1))
+
+    def sell_x_tokens_for_y_tokens(self,
+                                   new_sqrt_price: float,
+                                   pool_fee_plus_one: float):
+        """
+        Returns:
+            x, y, fee: The amounts of X and Y tokens traded and the fee.
+        """
+        x = self.calculate_amount_x_tokens_involved_in_swap(new_sqrt_price)
+        y = self.calculate_amount_of_y_tokens_involved_in_swap(new_sqrt_price)
+        return (x,
+                y * (2 - pool_fee_plus_one),
+                (y - y *(2 - pool_fee_plus_one)))
+
+    def calculate_amount_x_tokens_involved_in_swap(self, new_sqrt_price: float) -> float:
+        """
+        Args:
+            new_sqrt_price (float): The new square root price after the swap.
+        Returns:
+            float: The amount of X tokens.
+        """
+        return (new_sqrt_price - self.sqrt_price) * self.L / (self.sqrt_price * new_sqrt_price)
+
+    def calculate_amount_of_y_tokens_involved_in_swap(self, new_sqrt_price: float) -> float:
+        """
+        Args:
+            new_sqrt_price (float): The new square root price after the swap.
+        Returns:
+            float: The amount of Y tokens.
+        """
+        return -(new_sqrt_price - self.sqrt_price) * self.L
+   
+    def get_bid_and_ask_of_amm(self, current_amm_price: float):
+        """
+        Get the bid and ask prices of the AMM.
+        Returns:
+            float, float: The bid and ask prices.
+        """
+        bid_price = current_amm_price * (2 - (1 + self.base_fee))
+        ask_price = current_amm_price * (1+ self.base_fee)
+        return bid_price, ask_price
+
+    def trade_to_price_with_gas_fee(self,
+                                    efficient_off_chain_price: float,
+                                    submitted_fee: float|None,
+                                    swapper_id: float|None,
+                                    block_id: int,
+                                    gas: float=0.0,
+                                    informed: bool=True):
+        if self.current_block_id is None:
+            self.current_block_id = block_id
+            self.begin_block(block_id=block_id)
+        elif self.current_block_id != block_id:
+            # NOTE: in python, end_block called
+            # at the beginning of first swap of the next block
+            self.end_block()
+            self.current_block_id += 1
+            self.begin_block(block_id=self.current_block_id)
+        return self._trade(efficient_off_chain_price, submitted_fee, swapper_id, block_id, gas, informed)
+
+    def _trade(self,
+               efficient_off_chain_price: float,
+               submitted_fee: float|None,
+               swapper_id: float|None,
+               block_id: int,
+               gas: float,
+               informed: bool):
+        """`trade_to_price_with_gas_fee` within the current block."""
+        if self.current_block_id == 0:
+            self.pool_fee = self.base_fee
+        else:
+            if self.instrumentation is None:
+                delta = self.calculate_combined_fee(block_id, swapper_id) - self.base_fee
+            else:
+                delta = self.instrumentation.time(COMBINED_FEE, self.calculate_combined_fee,
+                                                  block_id, swapper_id) - self.base_fee
+            self.pool_fee_in_market_direction = self.pool_fee + delta
+            self.pool_fee_in_opposite_direction = self.pool_fee - delta
+       
+        if self.gas_model is not None:
+            # priced on the hook's state before the swap, updated only if it executes
+            gas, new_sender = self._hook_gas(gas, submitted_fee, swapper_id)
+        if submitted_fee is not None:
+            if submitted_fee < 0:
+                self.logger.debug("Submitted fee must be non-negative.")
+            if submitted_fee > self.base_fee * self.submitted_fees_multiple_threshold:
+                # lazy %-formatting, only paid for when debug logging is enabled
+                self.logger.debug("Submitted fee cannot exceed %s times the base fee.",
+                                  self.submitted_fees_multiple_threshold)
+            self.submitted_fees.append(submitted_fee)
+        if swapper_id is not None:
+            self.swapper_registry.record(swapper_id)
+        x, y, fee, new_sqrt_price, outcome = self._swap_to_price(efficient_off_chain_price,
+                                                                 gas,
+                                                                 informed,
+                                                                 self.pool_fee_in_market_direction,
+                                                                 self.pool_fee_in_opposite_direction)
+        if outcome != SWAPS_REJECTED:
+            self.price_x_before_swap = self.sqrt_price**2
+            self.price_x_after_swap = new_sqrt_price**2
+        if outcome == SWAPS_GAS_REJECTED:
+            self.logger.debug("block_id: %s, swapper_id %s: gas cost cannot exceed the total value of the trade.",
+                              block_id, swapper_id)
+        elif outcome == SWAPS_EXECUTED:
+            self.sqrt_price = new_sqrt_price
+            if self.gas_model is not None:
+                self._record_hook_swap(swapper_id, new_sender, gas)
+        if self.instrumentation is not None:
+            self.instrumentation.count(outcome)
+        return (x, y, fee)
+
+    def _swap_to_price(self,
+                       efficient_off_chain_price: float,
+                       gas: float,
+                       informed: bool,
+                       pool_fee_in_market_direction: float,
+                       pool_fee_in_opposite_direction: float):
+        """
+        Price move of a swap at the given directional fees, without side effects.
+        Returns:
+            x, y, fee, the new sqrt price and the outcome: SWAPS_EXECUTED,
+            SWAPS_REJECTED (no arbitrage) or SWAPS_GAS_REJECTED.
+        """
+        current_amm_price = self.sqrt_price**2
+        amm_bid_price, amm_ask_price = self.get_bid_and_ask_of_amm(current_amm_price)
+        if informed:
+            if (amm_ask_price > efficient_off_chain_price) and (amm_bid_price < efficient_off_chain_price):
+                # efficient price is within the current bid-ask spread, no arb opportunity available
+                # no swap is performed -> hence sqrt_price remains the same
+                return (0, 0, 0, self.sqrt_price, SWAPS_REJECTED)
+        """
+        other cases are common to informed and uninfored traders:
+        # Uninformed trader:
+        will trade even if there is no arbitrage opportunity
+        """
+        if (amm_ask_price < efficient_off_chain_price):
+            _fee = 1 + self._buy_and_sell_fees(pool_fee_in_market_direction, pool_fee_in_opposite_direction)[0]
+            new_sqrt_price = math.sqrt(efficient_off_chain_price / _fee)
+            x, y, fee = self.buy_x_tokens_for_y_tokens(new_sqrt_price=new_sqrt_price,
+                                                        pool_fee_plus_one=_fee)
+        elif (amm_bid_price > efficient_off_chain_price):
+            _fee = 1 + self._buy_and_sell_fees(pool_fee_in_market_direction, pool_fee_in_opposite_direction)[1]
+            new_sqrt_price = math.sqrt(efficient_off_chain_price * (2 - _fee))
+            x, y, fee = self.sell_x_tokens_for_y_tokens(new_sqrt_price=new_sqrt_price,
+                                                        pool_fee_plus_one=_fee)
+        else:
+            # at the bid or ask, or an uninformed swap inside the spread: nothing to trade
+            return (0, 0, 0, self.sqrt_price, SWAPS_REJECTED)
+        if gas > (x * efficient_off_chain_price + y):
+            return (0, 0, 0, new_sqrt_price, SWAPS_GAS_REJECTED)
+        return (x, y, fee, new_sqrt_price, SWAPS_EXECUTED)
+
+    def _buy_and_sell_fees(self,
+                           pool_fee_in_market_direction: float,
+                           pool_fee_in_opposite_direction: float) -> tuple[float, float]:
+        """
+        Fee rates paid by a buy and by a sell of X tokens at the order book
+        pressure of the block, the base fee for both without pressure.
+        """
+        raise NotImplementedError
+
+    def quote(self,
+              efficient_off_chain_price: float,
+              submitted_fee: float|None=None,
+              swapper_id=None,
+              gas: float=0.0,
+              informed: bool=True) -> tuple[float, float, float, float]:
+        """
+        What `trade_to_price_with_gas_fee` would return for a swap in the
+        current block, without changing the pool.
+        Returns:
+            x, y, fee and the combined fee of the swap, the base fee in
+            block 0 where the pool does not compute it.
+        """
+        if self.current_block_id is None:
+            raise ValueError("Quotes are for swaps in the current block, no block has begun.")
+        pool_fee_in_market_direction = self.pool_fee_in_market_direction
+        pool_fee_in_opposite_direction = self.pool_fee_in_opposite_direction
+        combined_fee = self.base_fee
+        if self.current_block_id != 0:
+            combined_fee = self._combine_fees(self.endogenous_dynamic_fee(block_id=self.current_block_id),
+                                              self.exogenous_dynamic_fee(swapper_id),
+                                              swapper_id)[0]
+            delta = combined_fee - self.base_fee
+            pool_fee_in_market_direction = self.pool_fee + delta
+            pool_fee_in_opposite_direction = self.pool_fee - delta
+        if self.gas_model is not None:
+            gas = self._hook_gas(gas, submitted_fee, swapper_id)[0]
+        x, y, fee, _, _ = self._swap_to_price(efficient_off_chain_price,
+                                              gas,
+                                              informed,
+                                              pool_fee_in_market_direction,
+                                              pool_fee_in_opposite_direction)
+        return x, y, fee, combined_fee
+
+    def _hook_gas(self, gas: float, submitted_fee: float|None, swapper_id) -> tuple[float, bool]:
+        """
+        `gas`, the cost of a swap with no senders, scaled by `gas_model` to
+        the hook's state before this swap, without updating it.
+        Returns:
+            the gas and whether the swapper is a new sender.
+        """
+        # the hook ignores zero fees and keeps one fee per sender
+        submits = submitted_fee is not None and submitted_fee > 0
+        new_sender = submits and swapper_id not in self.hook_senders
+        gas = self.gas_model.cost(gas,
+                                  senders=len(self.hook_senders),
+                                  new_sender=new_sender,
+                                  existing_sender=submits and not new_sender,
+                                  first_in_block=self.first_swap_in_block,
+                                  previous_senders=self.previous_block_senders)
+        return gas, new_sender
+
+    def _record_hook_swap(self, swapper_id, new_sender: bool, gas: float) -> None:
+        """
+        Hook state after an executed swap: rejected swaps never reach
+        `DammHook.beforeSwap`, so they neither add senders nor pay the clearing.
+        """
+        if new_sender:
+            self.hook_senders.add(swapper_id)
+        self.first_swap_in_block = False
+        self.gas_charged = gas
+
+    def trade_batch(self,
+                    efficient_off_chain_prices,
+                    submitted_fees,
+                    swapper_ids,
+                    block_ids,
+                    gas=0.0,
+                    informed=True) -> tuple[np.ndarray, np.ndarray, np.ndarray, dict]:
+        """
+        Runs a sequence of swaps in one call, with exactly the results of
+        calling `trade_to_price_with_gas_fee` for each of them in order.
+        Args:
+            efficient_off_chain_prices, block_ids: one entry per swap.
+            submitted_fees, swapper_ids: one entry per swap, an entry or the
+                whole argument may be None for no submitted fee / swapper.
+            gas, informed: one entry per swap or a single value for all.
+        Returns:
+            x, y, fee: arrays of the per-swap results.
+            The pool state after the last swap, see `pool_state`.
+        """
+        block_ids = np.asarray(block_ids)
+        n = block_ids.shape[0]
+        if n == 0:
+            return np.zeros(0), np.zeros(0), np.zeros(0), self.pool_state()
+        prices = np.asarray(efficient_off_chain_prices, dtype=np.float64).tolist()
+        submitted_fees = [None] * n if submitted_fees is None else list(submitted_fees)
+        swapper_ids = [None] * n if swapper_ids is None else list(swapper_ids)
+        gas = np.broadcast_to(np.asarray(gas, dtype=np.float64), (n,)).tolist()
+        informed = np.broadcast_to(np.asarray(informed, dtype=bool), (n,)).tolist()
+        blocks = block_ids.tolist()
+        results = []
+        # swaps of one block run without the block transition check
+        starts = [0, *(np.flatnonzero(block_ids[1:] != block_ids[:-1]) + 1).tolist(), n]
+        for start, stop in zip(starts[:-1], starts[1:]):
+            i = start
+            # as in `trade_to_price_with_gas_fee`, one block is entered per swap
+            while i < stop and self.current_block_id != blocks[i]:
+                results.append(self.trade_to_price_with_gas_fee(prices[i], submitted_fees[i], swapper_ids[i],
+                                                                blocks[i], gas[i], informed[i]))
+                i += 1
+            results.extend(map(self._trade,
+                               prices[i:stop],
+                               submitted_fees[i:stop],
+                               swapper_ids[i:stop],
+                               blocks[i:stop],
+                               gas[i:stop],
+                               informed[i:stop]))
+        x, y, fee = np.array(results, dtype=np.float64).T
+        return x, y, fee, self.pool_state()
+
+    def pool_state(self) -> dict:
+        """Scalar state of the pool."""
+        return {'sqrt_price': self.sqrt_price,
+                'current_block_id': self.current_block_id,
+                'total_blocks': self.total_blocks,
+                'pool_fee': self.pool_fee,
+                'pool_fee_in_market_direction': self.pool_fee_in_market_direction,
+                'pool_fee_in_opposite_direction': self.pool_fee_in_opposite_direction,
+                'cut_off_percentile': self.cut_off_percentile,
+                'first_transaction': self.first_transaction}
+
+    def snapshot(self) -> PoolState:
+        """Mutable state of the pool, to go back to with `restore`."""
+        return PoolState.capture(self)
+
+    def restore(self, state: PoolState) -> None:
+        state.restore(self)
+   
+    def begin_block(self, block_id: int):
+        self.block_cache.clear()
+        self.logger.debug("Beginning block %s.", block_id)
+        try:
+            self.order_bool_pressure = self.price_feed.pressure(block_id)
+        except Exception as e:
+            #TODO: include error handing for broken price_feed in solidity
+            self.logger.exception("%s", e)
+       
+    def end_block(self):
+        """
+        # when this is called, basically last transactional swap call
+        """
+        # Clear the submitted fees at the end of each block
+        self.submitted_fees.clear()
+        # Close the block in the swapper registry, forgetting blocks outside the window
+        self.swapper_registry.end_block()
+        # Increment the total number of blocks
+        self.total_blocks += 1
+        # Reset the first transaction flag
+        self.first_transaction = True
+        # the hook deletes `senders` on the first swap of the next block
+        self.previous_block_senders = len(self.hook_senders)
+        self.hook_senders.clear()
+        self.first_swap_in_block = True
+        # Drop values computed from this block's state
+        self.block_cache.clear()
+        if self.instrumentation is not None:
+            self.instrumentation.end_block(self.current_block_id)
+
+    def finish(self) -> None:
+        """
+        Ends the open block, e.g. the last one of a path, which
+        `trade_to_price_with_gas_fee` would only end on the next block's
+        first swap, so that `instrumentation` records it.
+        """
+        if self.current_block_id is not None:
+            self.end_block()
+            self.current_block_id = None
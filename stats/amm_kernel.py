@@ -0,0 +1,538 @@
+"""
+nopython-compatible core of `amm_modified.AMM`.
+
+The pool is a handful of typed arrays instead of an object:
+    state: float64 array indexed by the constants below
+    params: float64 array built by `amm_params`
+    submitted_fees: sorted submitted fees of the current block
+    swapper_history: ring of `intent_window + 1` rows of 0/1 flags per
+        swapper id, the current block and the last `intent_window` blocks
+    swapper_intent: number of blocks in `swapper_history` with a swap, per id
+so every function here compiles with @njit and is cached on disk.
+Swapper ids are 1..number_of_swappers, a negative id means "no swapper"
+and a NaN submitted fee means "no submitted fee".
+"""
+import math
+import numpy as np
+from numba import njit
+from sketches import BLOCK_METRICS, SWAP_METRICS
+
+# state
+SQRT_PRICE = 0
+POOL_FEE = 1
+POOL_FEE_IN_MARKET_DIRECTION = 2
+POOL_FEE_IN_OPPOSITE_DIRECTION = 3
+CUT_OFF_PERCENTILE = 4
+ENDOGENOUS_FEE = 5
+FIRST_TRANSACTION = 6
+ORDER_BOOK_PRESSURE = 7
+CURRENT_BLOCK_ID = 8
+TOTAL_BLOCKS = 9
+NUMBER_OF_SUBMITTED_FEES = 10
+COMBINED_FEE = 11
+STATE_SIZE = 12
+
+# params
+L = 0
+BASE_FEE = 1
+M = 2
+N = 3
+ALPHA = 4
+INTENT_THRESHOLD = 5
+INTENT_WINDOW = 6
+INITIAL_CUT_OFF_PERCENTILE = 7
+CUT_OFF_PERCENTILE_STEP = 8
+PARAMS_SIZE = 9
+
+
+def amm_params(L: float=166_666.67,
+               base_fee=0.003,
+               m=0.5,
+               n=2,
+               alpha=0.5,
+               intent_threshold=0.95,
+               intent_window: int=256,
+               cut_off_percentile: float=0.85,
+               cut_off_percentile_step: float=0.05) -> np.ndarray:
+    """Same defaults as `AMM.__init__`."""
+    return np.array([L, base_fee, m, n, alpha, intent_threshold, intent_window,
+                     cut_off_percentile, cut_off_percentile_step], dtype=np.float64)
+
+
+@njit(cache=True)
+def new_pool(price: float,
+             params: np.ndarray,
+             number_of_swappers: int,
+             max_submitted_fees: int):
+    """
+    Returns:
+        state, submitted_fees, swapper_history, swapper_intent
+    """
+    state = np.zeros(STATE_SIZE)
+    base_fee = params[BASE_FEE]
+    state[SQRT_PRICE] = math.sqrt(price)
+    state[POOL_FEE] = base_fee
+    state[POOL_FEE_IN_MARKET_DIRECTION] = base_fee
+    state[POOL_FEE_IN_OPPOSITE_DIRECTION] = base_fee
+    state[CUT_OFF_PERCENTILE] = params[INITIAL_CUT_OFF_PERCENTILE]
+    # the previous block prices are never updated in `AMM`
+    price_before_previous_block = float(int(price * 0.995))
+    price_impact = abs(price - price_before_previous_block) / price_before_previous_block
+    state[ENDOGENOUS_FEE] = base_fee + price_impact * 0.01
+    state[COMBINED_FEE] = base_fee
+    state[FIRST_TRANSACTION] = 1.0
+    state[CURRENT_BLOCK_ID] = -1.0
+    submitted_fees = np.empty(max_submitted_fees)
+    swapper_history = np.zeros((int(params[INTENT_WINDOW]) + 1, number_of_swappers + 1), dtype=np.uint8)
+    swapper_intent = np.zeros(number_of_swappers + 1, dtype=np.int64)
+    return state, submitted_fees, swapper_history, swapper_intent
+
+
+@njit(cache=True)
+def _current_swappers(state: np.ndarray, swapper_history: np.ndarray) -> np.ndarray:
+    return swapper_history[int(state[TOTAL_BLOCKS]) % swapper_history.shape[0]]
+
+
+@njit(cache=True)
+def endogenous_dynamic_fee(state: np.ndarray, params: np.ndarray, block_id: int) -> float:
+    if block_id == 0:
+        return params[BASE_FEE]
+    return state[ENDOGENOUS_FEE]
+
+
+@njit(cache=True)
+def exogenous_dynamic_fee(state: np.ndarray,
+                          params: np.ndarray,
+                          submitted_fees: np.ndarray,
+                          swapper_history: np.ndarray,
+                          swapper_id: int) -> float:
+    k = int(state[NUMBER_OF_SUBMITTED_FEES])
+    if k < 2:
+        return params[BASE_FEE]
+    cutoff_index = int(k * state[CUT_OFF_PERCENTILE])
+    filtered_fees = submitted_fees[:cutoff_index]
+    mean_fee = np.mean(filtered_fees)
+    sigma_fee = np.std(filtered_fees)
+    if swapper_id >= 0 and _current_swappers(state, swapper_history)[swapper_id]:
+        # Discounted fee
+        return mean_fee + params[M] * sigma_fee
+    # Regular fee
+    return params[N] * sigma_fee
+
+
+@njit(cache=True)
+def calculate_combined_fee(state: np.ndarray,
+                           params: np.ndarray,
+                           submitted_fees: np.ndarray,
+                           swapper_history: np.ndarray,
+                           swapper_intent: np.ndarray,
+                           block_id: int,
+                           swapper_id: int) -> float:
+    base_fee = params[BASE_FEE]
+    endogenous_fee = endogenous_dynamic_fee(state, params, block_id)
+    combined_fee = params[ALPHA] * endogenous_fee +\
+        (1 - params[ALPHA]) * exogenous_dynamic_fee(state, params, submitted_fees,
+                                                      swapper_history, swapper_id)
+    combined_fee = max(combined_fee, endogenous_fee)
+    # Adjust cut-off percentile
+    if combined_fee <= (base_fee * 1.25):
+        state[CUT_OFF_PERCENTILE] = min(state[CUT_OFF_PERCENTILE] + params[CUT_OFF_PERCENTILE_STEP], 1.0)
+    if combined_fee > base_fee * 2:
+        state[CUT_OFF_PERCENTILE] = max(state[CUT_OFF_PERCENTILE] - params[CUT_OFF_PERCENTILE_STEP], 0.5)
+    if state[FIRST_TRANSACTION] != 0.0:
+        combined_fee *= 5
+        state[FIRST_TRANSACTION] = 0.0
+    if swapper_id >= 0 and swapper_intent[swapper_id] > 0 and state[TOTAL_BLOCKS] > 0:
+        # completed blocks only, as the denominator
+        completed = swapper_intent[swapper_id] - _current_swappers(state, swapper_history)[swapper_id]
+        intent_rate = completed / min(state[TOTAL_BLOCKS], params[INTENT_WINDOW])
+        if intent_rate >= params[INTENT_THRESHOLD]:
+            combined_fee *= 0.9
+    return combined_fee
+
+
+@njit(cache=True)
+def _insert_submitted_fee(state: np.ndarray, submitted_fees: np.ndarray, submitted_fee: float) -> None:
+    k = int(state[NUMBER_OF_SUBMITTED_FEES])
+    i = k
+    while i > 0 and submitted_fees[i - 1] > submitted_fee:
+        submitted_fees[i] = submitted_fees[i - 1]
+        i -= 1
+    submitted_fees[i] = submitted_fee
+    state[NUMBER_OF_SUBMITTED_FEES] = k + 1
+
+
+@njit(cache=True)
+def trade_to_price_with_gas_fee(state: np.ndarray,
+                                params: np.ndarray,
+                                submitted_fees: np.ndarray,
+                                swapper_history: np.ndarray,
+                                swapper_intent: np.ndarray,
+                                efficient_off_chain_price: float,
+                                submitted_fee: float,
+                                swapper_id: int,
+                                block_id: int,
+                                gas: float=0.0,
+                                informed: bool=True):
+    """
+    `AMM.trade_to_price_with_gas_fee` within the current block, i.e.
+    `begin_block` must have been called for `block_id`.
+    Returns:
+        x, y, fee: The amounts of X and Y tokens traded and the fee.
+    """
+    base_fee = params[BASE_FEE]
+    if state[CURRENT_BLOCK_ID] == 0:
+        state[POOL_FEE] = base_fee
+    else:
+        state[COMBINED_FEE] = calculate_combined_fee(state, params, submitted_fees, swapper_history,
+                                                     swapper_intent, block_id, swapper_id)
+        delta = state[COMBINED_FEE] - base_fee
+        state[POOL_FEE_IN_MARKET_DIRECTION] = state[POOL_FEE] + delta
+        state[POOL_FEE_IN_OPPOSITE_DIRECTION] = state[POOL_FEE] - delta
+
+    sqrt_price = state[SQRT_PRICE]
+    current_amm_price = sqrt_price**2
+    amm_bid_price = current_amm_price * (2 - (1 + base_fee))
+    amm_ask_price = current_amm_price * (1 + base_fee)
+    if not math.isnan(submitted_fee):
+        _insert_submitted_fee(state, submitted_fees, submitted_fee)
+    if swapper_id >= 0:
+        current_swappers = _current_swappers(state, swapper_history)
+        if not current_swappers[swapper_id]:
+            current_swappers[swapper_id] = 1
+            swapper_intent[swapper_id] += 1
+    if informed:
+        if (amm_ask_price > efficient_off_chain_price) and (amm_bid_price < efficient_off_chain_price):
+            return (0.0, 0.0, 0.0)
+    pressure = state[ORDER_BOOK_PRESSURE]
+    if amm_ask_price < efficient_off_chain_price:
+        if pressure > 0:
+            _fee = 1 + state[POOL_FEE_IN_MARKET_DIRECTION]
+        elif pressure < 0:
+            _fee = 1 + state[POOL_FEE_IN_OPPOSITE_DIRECTION]
+        else:
+            _fee = 1 + base_fee
+        new_sqrt_price = math.sqrt(efficient_off_chain_price / _fee)
+    elif amm_bid_price > efficient_off_chain_price:
+        if pressure > 0:
+            _fee = 1 + state[POOL_FEE_IN_OPPOSITE_DIRECTION]
+        elif pressure < 0:
+            _fee = 1 + state[POOL_FEE_IN_MARKET_DIRECTION]
+        else:
+            _fee = 1 + base_fee
+        new_sqrt_price = math.sqrt(efficient_off_chain_price * (2 - _fee))
+    else:
+        return (0.0, 0.0, 0.0)
+    x = (new_sqrt_price - sqrt_price) * params[L] / (sqrt_price * new_sqrt_price)
+    y = -(new_sqrt_price - sqrt_price) * params[L]
+    if amm_ask_price < efficient_off_chain_price:
+        y, fee = y * _fee, -y * (_fee - 1)
+    else:
+        y, fee = y * (2 - _fee), (y - y * (2 - _fee))
+    if gas > (x * efficient_off_chain_price + y):
+        return (0.0, 0.0, 0.0)
+    state[SQRT_PRICE] = new_sqrt_price
+    return (x, y, fee)
+
+
+@njit(cache=True)
+def begin_block(state: np.ndarray, block_id: int, order_bool_pressure: float) -> None:
+    state[CURRENT_BLOCK_ID] = block_id
+    state[ORDER_BOOK_PRESSURE] = order_bool_pressure
+
+
+@njit(cache=True)
+def end_block(state: np.ndarray, swapper_history: np.ndarray, swapper_intent: np.ndarray) -> None:
+    state[NUMBER_OF_SUBMITTED_FEES] = 0
+    state[TOTAL_BLOCKS] += 1
+    # the row of the block leaving the window becomes the current block
+    expired = _current_swappers(state, swapper_history)
+    swapper_intent -= expired
+    expired[:] = 0
+    state[FIRST_TRANSACTION] = 1.0
+
+
+@njit(cache=True)
+def l1_order_book_pressure(price: float, bid_size: int, ask_size: int, half_spread: float=0.005) -> float:
+    """`PriceFeed.l1_order_book_pressure`."""
+    bid_price = price * (1 - half_spread)
+    ask_price = price * (1 + half_spread)
+    return (ask_size * ask_price - bid_size * bid_price) /\
+        (ask_size * ask_price + bid_size * bid_price)
+
+
+@njit(cache=True)
+def _draw_block(rng, initial_price, sigma, max_submitted_fee, swapper_ids, submitted_fees, swappers):
+    """
+    Draws the inputs of one block in place and returns the log-price
+    increment and the order book pressure.
+    """
+    increment = rng.normal(0.0, sigma) - sigma**2 / 2
+    for swap in range(submitted_fees.shape[0]):
+        submitted_fees[swap] = rng.uniform(0.0, max_submitted_fee)
+    # partial Fisher-Yates: distinct swappers in random order, like random.sample
+    for swap in range(swappers.shape[0]):
+        j = rng.integers(swap, swapper_ids.shape[0])
+        swapper_ids[swap], swapper_ids[j] = swapper_ids[j], swapper_ids[swap]
+        swappers[swap] = swapper_ids[swap]
+    bid_size = rng.integers(1, 1001)
+    ask_size = rng.integers(1, 1001)
+    while ask_size == bid_size:
+        ask_size = rng.integers(1, 1001)
+    return increment, l1_order_book_pressure(initial_price, bid_size, ask_size)
+
+
+@njit(cache=True)
+def _run_block(pool, params, block_id, price, next_price, submitted_fees, swappers, gas_cost, totals):
+    state, fees, swapper_history, swapper_intent = pool
+    for swap in range(1, submitted_fees.shape[0]):
+        x0, y0, f = trade_to_price_with_gas_fee(state, params, fees, swapper_history,
+                                                swapper_intent, price, submitted_fees[swap],
+                                                swappers[swap], block_id, gas_cost, True)
+        totals[0] += -x0 * next_price - y0
+        if x0 != 0.0:
+            totals[1] += x0 * next_price + y0 - gas_cost
+            totals[2] += gas_cost
+
+
+@njit(cache=True)
+def _run_block_metrics(pool, params, block_id, price, next_price, submitted_fees, swappers, gas_cost, totals,
+                       block_metrics, swap_metrics):
+    """
+    `_run_block` also writing the block's lvr and arb gain to `block_metrics`
+    and every swap's combined fee and fee, NaN if not executed, to `swap_metrics`.
+    """
+    state, fees, swapper_history, swapper_intent = pool
+    block_metrics[:] = 0.0
+    for swap in range(1, submitted_fees.shape[0]):
+        x0, y0, f = trade_to_price_with_gas_fee(state, params, fees, swapper_history,
+                                                swapper_intent, price, submitted_fees[swap],
+                                                swappers[swap], block_id, gas_cost, True)
+        totals[0] += -x0 * next_price - y0
+        block_metrics[0] += -x0 * next_price - y0
+        swap_metrics[0, swap - 1] = state[COMBINED_FEE]
+        swap_metrics[1, swap - 1] = math.nan
+        if x0 != 0.0:
+            totals[1] += x0 * next_price + y0 - gas_cost
+            totals[2] += gas_cost
+            block_metrics[1] += x0 * next_price + y0 - gas_cost
+            swap_metrics[1, swap - 1] = f
+
+
+@njit(cache=True)
+def simulate_blocks(rng,
+                    pool,
+                    price: float,
+                    first_block: int,
+                    last_block: int,
+                    initial_price: float,
+                    sigma: float,
+                    params: np.ndarray,
+                    gas_cost: float,
+                    swapper_ids: np.ndarray,
+                    submitted_fees: np.ndarray,
+                    swappers: np.ndarray,
+                    totals: np.ndarray,
+                    block_metrics: np.ndarray,
+                    swap_metrics: np.ndarray) -> float:
+    """
+    Blocks `first_block`..`last_block - 1` of `simulate_path`, making the
+    same draws, with the metrics of block `first_block + i` in
+    `block_metrics[:, i]` and `swap_metrics[:, i]` (see `_run_block_metrics`).
+    Returns:
+        the price after `last_block - 1`.
+    """
+    for block in range(first_block, last_block):
+        increment, pressure = _draw_block(rng, initial_price, sigma, params[BASE_FEE],
+                                          swapper_ids, submitted_fees, swappers)
+        next_price = price * math.exp(increment)
+        if block > 1:
+            end_block(pool[0], pool[2], pool[3])
+        begin_block(pool[0], block - 1, pressure)
+        _run_block_metrics(pool, params, block - 1, price, next_price, submitted_fees, swappers, gas_cost, totals,
+                           block_metrics[:, block - first_block], swap_metrics[:, block - first_block])
+        price = next_price
+    return price
+
+
+def simulate_path_summary(rng,
+                          initial_price: float,
+                          sigma: float,
+                          total_number_of_blocks: int,
+                          params: np.ndarray,
+                          gas_cost: float,
+                          summary,
+                          chunk_blocks: int=4096,
+                          number_of_swaps_in_block: int=100,
+                          number_of_swappers: int=1000) -> np.ndarray:
+    """
+    `simulate_path` adding the per-block and per-swap metrics to the
+    `sketches.ResultsSummary` `summary`, `chunk_blocks` blocks at a time so
+    memory stays fixed. Same draws and totals as `simulate_path`.
+    """
+    pool = new_pool(initial_price, params, number_of_swappers, number_of_swaps_in_block)
+    swapper_ids = np.arange(1, number_of_swappers + 1)
+    submitted_fees = np.empty(number_of_swaps_in_block)
+    swappers = np.empty(number_of_swaps_in_block, dtype=np.int64)
+    totals = np.zeros(3)
+    block_metrics = np.empty((len(BLOCK_METRICS), chunk_blocks))
+    swap_metrics = np.empty((len(SWAP_METRICS), chunk_blocks, number_of_swaps_in_block - 1))
+    price = initial_price
+    for first_block in range(1, total_number_of_blocks, chunk_blocks):
+        last_block = min(first_block + chunk_blocks, total_number_of_blocks)
+        price = simulate_blocks(rng, pool, price, first_block, last_block, initial_price, sigma, params,
+                                gas_cost, swapper_ids, submitted_fees, swappers, totals,
+                                block_metrics, swap_metrics)
+        blocks = last_block - first_block
+        for row, name in enumerate(BLOCK_METRICS):
+            summary.update(name, block_metrics[row, :blocks])
+        for row, name in enumerate(SWAP_METRICS):
+            summary.update(name, swap_metrics[row, :blocks])
+    return totals
+
+
+@njit(cache=True)
+def noise_trade_price(state: np.ndarray, params: np.ndarray, x: float) -> float:
+    """
+    Price an uninformed trade of `x` X (sold if negative) trades the pool
+    to: the pool price after it, as quoted with the base fee. The current
+    pool price if the pool cannot pay `x`.
+    """
+    inverse_sqrt_price = 1 / state[SQRT_PRICE] - x / params[L]
+    if inverse_sqrt_price <= 0.0:
+        return state[SQRT_PRICE]**2
+    price = 1 / inverse_sqrt_price**2
+    return price * (1 + params[BASE_FEE]) if x > 0 else price * (2 - (1 + params[BASE_FEE]))
+
+
+@njit(cache=True)
+def run_order_flow(pool,
+                   params: np.ndarray,
+                   first_block: int,
+                   prices: np.ndarray,
+                   pressures: np.ndarray,
+                   offsets: np.ndarray,
+                   swapper_ids: np.ndarray,
+                   informed: np.ndarray,
+                   submitted_fees: np.ndarray,
+                   trade_sizes: np.ndarray,
+                   gas_cost: float,
+                   totals: np.ndarray) -> None:
+    """
+    Blocks `first_block`, `first_block + 1`, ... of a path traded by the
+    order flow of `trader_population.OrderFlow`, `prices` holding one
+    more price than blocks. Informed swaps trade to the block's price,
+    uninformed ones trade their size whatever the price (see
+    `noise_trade_price`), both only when worth `gas_cost`. Adds to
+    `totals` the lvr of the informed swaps, their arb gain, the gas of all
+    executed swaps and the lvr of the uninformed swaps, the pool's loss
+    (a gain if negative) on them.
+    """
+    state, fees, swapper_history, swapper_intent = pool
+    for i in range(pressures.shape[0]):
+        block = first_block + i
+        if block > 1:
+            end_block(state, swapper_history, swapper_intent)
+        begin_block(state, block - 1, pressures[i])
+        price = prices[i]
+        next_price = prices[i + 1]
+        for swap in range(offsets[i], offsets[i + 1]):
+            if informed[swap]:
+                x0, y0, f = trade_to_price_with_gas_fee(state, params, fees, swapper_history,
+                                                        swapper_intent, price, submitted_fees[swap],
+                                                        swapper_ids[swap], block - 1, gas_cost, True)
+                totals[0] += -x0 * next_price - y0
+                if x0 != 0.0:
+                    totals[1] += x0 * next_price + y0 - gas_cost
+            else:
+                x0, y0, f = trade_to_price_with_gas_fee(state, params, fees, swapper_history, swapper_intent,
+                                                        noise_trade_price(state, params, trade_sizes[swap]),
+                                                        submitted_fees[swap], swapper_ids[swap], block - 1,
+                                                        gas_cost, False)
+                totals[3] += -x0 * next_price - y0
+            if x0 != 0.0:
+                totals[2] += gas_cost
+
+
+@njit(cache=True)
+def simulate_path(rng,
+                  initial_price: float,
+                  sigma: float,
+                  total_number_of_blocks: int,
+                  params: np.ndarray,
+                  gas_cost: float,
+                  number_of_swaps_in_block: int=100,
+                  number_of_swappers: int=1000) -> np.ndarray:
+    """
+    One path of `Simulation.do_simulation`, drawing each block from `rng`
+    as it goes so memory does not grow with the horizon.
+    Returns:
+        lvr, arbitrage gain and gas of the path (not yet divided by days).
+    """
+    pool = new_pool(initial_price, params, number_of_swappers, number_of_swaps_in_block)
+    swapper_ids = np.arange(1, number_of_swappers + 1)
+    submitted_fees = np.empty(number_of_swaps_in_block)
+    swappers = np.empty(number_of_swaps_in_block, dtype=np.int64)
+    totals = np.zeros(3)
+    price = initial_price
+    for block in range(1, total_number_of_blocks):
+        increment, pressure = _draw_block(rng, initial_price, sigma, params[BASE_FEE],
+                                          swapper_ids, submitted_fees, swappers)
+        next_price = price * math.exp(increment)
+        if block > 1:
+            end_block(pool[0], pool[2], pool[3])
+        begin_block(pool[0], block - 1, pressure)
+        _run_block(pool, params, block - 1, price, next_price, submitted_fees, swappers, gas_cost, totals)
+        price = next_price
+    return totals
+
+
+@njit(cache=True)
+def draw_path(rng,
+              initial_price: float,
+              sigma: float,
+              total_number_of_blocks: int,
+              max_submitted_fee: float=0.003,
+              number_of_swaps_in_block: int=100,
+              number_of_swappers: int=1000):
+    """
+    Materialises the draws `simulate_path` would make from the same `rng`.
+    Returns:
+        prices, submitted_fees, swappers, pressures
+    """
+    number_of_blocks = total_number_of_blocks - 1
+    prices = np.empty(total_number_of_blocks)
+    submitted_fees = np.empty((number_of_blocks, number_of_swaps_in_block))
+    swappers = np.empty((number_of_blocks, number_of_swaps_in_block), dtype=np.int64)
+    pressures = np.empty(number_of_blocks)
+    swapper_ids = np.arange(1, number_of_swappers + 1)
+    prices[0] = initial_price
+    for block in range(number_of_blocks):
+        increment, pressures[block] = _draw_block(rng, initial_price, sigma, max_submitted_fee,
+                                                  swapper_ids, submitted_fees[block], swappers[block])
+        prices[block + 1] = prices[block] * math.exp(increment)
+    return prices, submitted_fees, swappers, pressures
+
+
+@njit(cache=True)
+def run_path(prices: np.ndarray,
+             submitted_fees: np.ndarray,
+             swappers: np.ndarray,
+             pressures: np.ndarray,
+             params: np.ndarray,
+             gas_cost: float,
+             number_of_swappers: int=1000) -> np.ndarray:
+    """
+    One path over recorded inputs, e.g. from `draw_path`.
+    Returns:
+        lvr, arbitrage gain and gas of the path (not yet divided by days).
+    """
+    pool = new_pool(prices[0], params, number_of_swappers, submitted_fees.shape[1])
+    totals = np.zeros(3)
+    for block in range(1, prices.shape[0]):
+        if block > 1:
+            end_block(pool[0], pool[2], pool[3])
+        begin_block(pool[0], block - 1, pressures[block - 1])
+        _run_block(pool, params, block - 1, prices[block - 1], prices[block],
+                   submitted_fees[block - 1], swappers[block - 1], gas_cost, totals)
+    return totals
@@ -0,0 +1,13 @@
+"""
+Parameters of the vectorized AMM shared by the sweep and multi-pool
+runners, with the values used by `Simulation`.
+"""
+
+DEFAULT_PARAMETERS = {'L': 166_666.67,
+                      'base_fee': 0.003,
+                      'm': 0.5,
+                      'n': 2,
+                      'alpha': 0.5,
+                      'intent_threshold': 0.95,
+                      'cut_off_percentile': 0.85,
+                      'cut_off_percentile_step': 0.05}
@@ -0,0 +1,318 @@
+"""
+Benchmarks of the AMM hot paths and of simulation throughput.
+
+    python benchmark.py --output benchmarks.json
+    python benchmark.py --output current.json --baseline benchmarks.json --threshold 0.1
+    python benchmark.py --skip-simulations --startup-target 1.0
+
+Runs offline and headless: the models are driven with pre-drawn prices,
+submitted fees and swappers, and nothing is plotted or fetched. Every
+benchmark reports a single number with its unit and whether higher is
+better. With `--baseline` the run is compared against an earlier JSON
+file and the command exits with status 1 if any benchmark got worse by
+more than `--threshold` or has no value in the baseline, or if a startup
+benchmark (a fresh interpreter running `cli.py --help` or a small run)
+takes longer than `--startup-target` seconds.
+
+Timings are machine dependent, so a baseline is only meaningful when it
+was recorded on the same machine; no baseline is checked in. The baseline
+must exist, it is read before anything runs, and cannot be the output.
+"""
+import importlib
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+import tracemalloc
+import click
+import numpy as np
+
+# same market and pool as `Simulation` and `ParameterSweep`
+SCENARIO = {'initial_price': 2000.0,
+            'daily_sigma': 0.05,
+            'gas_cost': 1.0,
+            'L': 166_666.67,
+            'base_fee': 0.003}
+NUMBER_OF_SWAPS_IN_BLOCK = 100
+NUMBER_OF_SWAPPERS = 1000
+SUBMITTED_FEE_COUNTS = (10, 100, 1_000, 10_000)
+# startup benchmark -> arguments of a fresh interpreter
+STARTUP_COMMANDS = {'cli_help': ['cli.py', '--help'],
+                    'import_simulation': ['-c', 'import simulation'],
+                    'cli_run_small': ['cli.py', 'run', '--days', '0.01', '--paths', '2', '--seed', '0']}
+# variant -> module, all three define `AMM`
+VARIANTS = {'amm_modified': 'amm_modified',
+            'amm_v2': 'amm_v2',
+            'naik_lewandro_amm': 'naik_lewandro_amm'}
+
+
+def time_per_call(function, repeat: int=5) -> float:
+    """Best of `repeat` timings of `function()`, in seconds per call."""
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+
+def result(value: float, unit: str, higher_is_better: bool) -> dict:
+    return {'value': float(value), 'unit': unit, 'higher_is_better': higher_is_better}
+
+
+def draw_blocks(blocks: int, seed: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Returns:
+        prices (blocks,), submitted fees and swappers (blocks, swaps per block).
+    """
+    rng = np.random.default_rng(seed)
+    sigma = SCENARIO['daily_sigma'] / np.sqrt(60 * 60 * 24 / 13.2)
+    prices = SCENARIO['initial_price'] * np.exp(np.cumsum(rng.normal(0.0, sigma, blocks)))
+    submitted_fees = rng.uniform(0.0, SCENARIO['base_fee'], (blocks, NUMBER_OF_SWAPS_IN_BLOCK))
+    swappers = np.argsort(rng.random((blocks, NUMBER_OF_SWAPPERS)), axis=1)[:, :NUMBER_OF_SWAPS_IN_BLOCK] + 1
+    return prices, submitted_fees, swappers
+
+
+def new_amm(variant: str, module):
+    price = SCENARIO['initial_price']
+    if variant == 'naik_lewandro_amm':
+        amm = module.AMM(np.sqrt(price), SCENARIO['base_fee'], SCENARIO['L'], base_fee=SCENARIO['base_fee'])
+        # NOTE: reserves are not set by the constructor, the ones of L at `price`
+        amm.x = SCENARIO['L'] / np.sqrt(price)
+        amm.y = SCENARIO['L'] * np.sqrt(price)
+        return amm
+    return module.AMM(price, L=SCENARIO['L'], base_fee=SCENARIO['base_fee'])
+
+
+def replay(variant: str, amm, prices: np.ndarray, submitted_fees: np.ndarray, swappers: np.ndarray) -> None:
+    """Runs the swaps of every block against `amm`, as `Simulation.do_simulation` does."""
+    gas = SCENARIO['gas_cost']
+    for block in range(prices.shape[0]):
+        price = float(prices[block])
+        fees = submitted_fees[block].tolist()
+        ids = swappers[block].tolist()
+        for swap in range(NUMBER_OF_SWAPS_IN_BLOCK):
+            if variant == 'naik_lewandro_amm':
+                amm.submitted_fees.append(fees[swap])
+                amm.swapper_registry.record(ids[swap])
+                amm.trade_to_price_with_gas_fee(price, gas)
+            else:
+                amm.trade_to_price_with_gas_fee(efficient_off_chain_price=price,
+                                                submitted_fee=fees[swap],
+                                                swapper_id=ids[swap],
+                                                block_id=block,
+                                                gas=gas)
+        if variant == 'naik_lewandro_amm':
+            # NOTE: `end_block` also fetches the CEX order book, only its bookkeeping is run
+            amm.submitted_fees.clear()
+            amm.swapper_registry.end_block()
+            amm.total_blocks += 1
+            amm.first_transaction = True
+
+
+def benchmark_variant(variant: str, blocks: int, seed: int) -> dict:
+    """Per-call cost of the AMM methods of `variant`, on a pool warmed up over `blocks` blocks."""
+    module = importlib.import_module(VARIANTS[variant])
+    prices, submitted_fees, swappers = draw_blocks(blocks + 1, seed)
+    amm = new_amm(variant, module)
+    replay(variant, amm, prices[:-1], submitted_fees[:-1], swappers[:-1])
+    # mid-block state of the last block, so that fees depend on submitted fees and swappers
+    swapper_id = int(swappers[-1, 0])
+    naik = variant == 'naik_lewandro_amm'
+    block_id = blocks
+    if not naik:
+        amm.trade_to_price_with_gas_fee(float(prices[-1]), float(submitted_fees[-1, 0]), swapper_id, block_id)
+    amm.submitted_fees.clear()
+    for fee in submitted_fees[-1].tolist():
+        amm.submitted_fees.append(fee)
+    amm.swapper_registry.record(swapper_id)
+    price = amm.sqrt_price**2
+
+    results = {}
+    def record(method: str, function) -> None:
+        results[f'{variant}.{method}'] = result(time_per_call(function) * 1e6, 'us/call', False)
+
+    record('exogenous_dynamic_fee', lambda: amm.exogenous_dynamic_fee(swapper_id))
+    if naik:
+        record('endogenous_dynamic_fee', lambda: amm.endogenous_dynamic_fee(price, price * 1.001))
+        record('calculate_combined_fee', lambda: amm.calculate_combined_fee(swapper_id, 1.0, 'x'))
+    else:
+        record('endogenous_dynamic_fee', lambda: amm.endogenous_dynamic_fee(block_id=block_id))
+        record('calculate_combined_fee', lambda: amm.calculate_combined_fee(block_id, swapper_id))
+        record('get_bid_and_ask_of_amm', lambda: amm.get_bid_and_ask_of_amm(price))
+
+    # full swap, including block transitions, per swap of a fresh pool
+    replay_prices, replay_fees, replay_swappers = draw_blocks(blocks, seed + 1)
+    def run():
+        replay(variant, new_amm(variant, module), replay_prices, replay_fees, replay_swappers)
+    swaps = blocks * NUMBER_OF_SWAPS_IN_BLOCK
+    results[f'{variant}.trade_to_price_with_gas_fee'] = result(min(timeit.repeat(run, number=1, repeat=3)) / swaps * 1e6,
+                                                               'us/call', False)
+
+    # exogenous fee against the number of fees submitted in the block
+    rng = np.random.default_rng(seed)
+    for count in SUBMITTED_FEE_COUNTS:
+        amm.submitted_fees.clear()
+        for fee in rng.uniform(0.0, SCENARIO['base_fee'], count).tolist():
+            amm.submitted_fees.append(fee)
+        record(f'exogenous_dynamic_fee[submitted_fees={count}]', lambda: amm.exogenous_dynamic_fee(swapper_id))
+    return results
+
+
+def benchmark_simulations(days: float, paths: int, seed: int) -> dict:
+    """Swaps and blocks per second of the scalar, JIT and vectorized simulations, and peak memory per path."""
+    from simulation import Simulation
+    from vectorized_simulation import VectorizedSimulation
+    from amm_kernel import amm_params, simulate_path
+    from price_paths import path_rng
+
+    arguments = (SCENARIO['initial_price'], SCENARIO['daily_sigma'], days, SCENARIO['gas_cost'],
+                 SCENARIO['L'], SCENARIO['base_fee'])
+    results = {}
+    def throughput(name: str, seconds: float, blocks: float, swaps: float) -> None:
+        results[f'simulation.{name}.blocks_per_second'] = result(blocks / seconds, 'blocks/s', True)
+        results[f'simulation.{name}.swaps_per_second'] = result(swaps / seconds, 'swaps/s', True)
+
+    # scalar: blocks 1.. of the path, swaps 1.. of each block
+    scalar = Simulation(*arguments, paths=1)
+    blocks = int(days * scalar.blocks_per_day) - 1
+    random.seed(seed)
+    np.random.seed(seed)
+    start = time.perf_counter()
+    scalar.do_simulation()
+    throughput('scalar', time.perf_counter() - start, blocks, blocks * (NUMBER_OF_SWAPS_IN_BLOCK - 1))
+
+    # JIT kernel, after compilation
+    params = amm_params(L=SCENARIO['L'], base_fee=SCENARIO['base_fee'], m=0.5, n=2, alpha=0.5, intent_threshold=0.95)
+    sigma = SCENARIO['daily_sigma'] / np.sqrt(scalar.blocks_per_day)
+    def run_kernel():
+        simulate_path(path_rng(seed, 0), SCENARIO['initial_price'], sigma, blocks + 1, params, SCENARIO['gas_cost'])
+    run_kernel()
+    throughput('kernel', min(timeit.repeat(run_kernel, number=1, repeat=3)), blocks,
+               blocks * (NUMBER_OF_SWAPS_IN_BLOCK - 1))
+
+    # vectorized, over all paths at once
+    vectorized = VectorizedSimulation(*arguments, paths=paths)
+    start = time.perf_counter()
+    vectorized.do_simulation(seed)
+    throughput('vectorized', time.perf_counter() - start, paths * blocks,
+               paths * blocks * (NUMBER_OF_SWAPS_IN_BLOCK - 1))
+
+    # peak traced memory, in separate runs since tracing slows them down
+    for name, simulation, run in (('scalar', scalar, scalar.do_simulation),
+                                  ('vectorized', vectorized, lambda: vectorized.do_simulation(seed))):
+        tracemalloc.start()
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[f'simulation.{name}.peak_memory_per_path'] = result(peak / simulation.paths, 'bytes', False)
+    return results
+
+
+def benchmark_startup(repeat: int=5) -> dict:
+    """Median wall time of each of `STARTUP_COMMANDS` in a new process, imports included."""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for name, arguments in STARTUP_COMMANDS.items():
+        seconds = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, *arguments], cwd=directory, check=True, stdout=subprocess.DEVNULL)
+            seconds.append(time.perf_counter() - start)
+        results[f'startup.{name}'] = result(statistics.median(seconds), 's', False)
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    Prints the relative change of every benchmark also in `baseline`.
+    Returns:
+        The names of the benchmarks that got worse by more than `threshold`
+        or have no value in `baseline`.
+    """
+    regressions = []
+    for name, current in results['benchmarks'].items():
+        previous = baseline['benchmarks'].get(name)
+        if previous is None:
+            regressions.append(name)
+            click.echo(f"{name:<60} {'missing from the baseline':>33}  REGRESSION")
+            continue
+        if previous['value'] == 0:
+            continue
+        change = current['value'] / previous['value'] - 1
+        worse = -change if current['higher_is_better'] else change
+        flag = ''
+        if worse > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        click.echo(f"{name:<60} {previous['value']:>14.4g} -> {current['value']:>14.4g} {current['unit']:<9} {change:+8.1%}{flag}")
+    return regressions
+
+
+@click.command()
+@click.option('--output', type=click.Path(dir_okay=False), default='benchmarks.json', show_default=True)
+@click.option('--baseline', type=click.Path(exists=True, dir_okay=False), default=None,
+              help='Earlier output to compare against.')
+@click.option('--threshold', type=float, default=0.10, show_default=True,
+              help='Relative change counted as a regression.')
+@click.option('--variant', 'variants', type=click.Choice(list(VARIANTS)), multiple=True,
+              help='AMM variants to benchmark, all by default.')
+@click.option('--blocks', type=int, default=50, show_default=True, help='Blocks replayed per AMM benchmark.')
+@click.option('--days', type=float, default=0.05, show_default=True, help='Length of the simulated paths.')
+@click.option('--paths', type=int, default=100, show_default=True, help='Paths of the vectorized simulation.')
+@click.option('--seed', type=int, default=0, show_default=True)
+@click.option('--skip-simulations', is_flag=True, help='Only run the AMM method benchmarks.')
+@click.option('--skip-startup', is_flag=True, help='Do not time the startup of fresh processes.')
+@click.option('--startup-target', type=float, default=1.0, show_default=True,
+              help='Seconds a startup benchmark may take at most.')
+def main(output, baseline, threshold, variants, blocks, days, paths, seed, skip_simulations, skip_startup,
+         startup_target):
+    """Benchmarks the AMM variants and the simulations, and writes the results as JSON."""
+    if baseline is not None:
+        if os.path.abspath(baseline) == os.path.abspath(output):
+            raise click.BadParameter('the baseline would be overwritten by this run, choose another --output.',
+                                     param_hint='--baseline')
+        with open(baseline) as f:
+            baseline = json.load(f)
+    results = {'metadata': {'python': platform.python_version(),
+                            'numpy': np.__version__,
+                            'machine': platform.machine(),
+                            'platform': platform.platform(),
+                            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z')},
+               'settings': {'blocks': blocks, 'days': days, 'paths': paths, 'seed': seed, **SCENARIO},
+               'benchmarks': {},
+               'skipped': {}}
+    for variant in variants or VARIANTS:
+        try:
+            results['benchmarks'].update(benchmark_variant(variant, blocks, seed))
+        except ImportError as e:
+            # e.g. a missing optional dependency of one variant
+            results['skipped'][variant] = f"{type(e).__name__}: {e}"
+            click.echo(f"skipping {variant}: {e}", err=True)
+    if not skip_simulations:
+        results['benchmarks'].update(benchmark_simulations(days, paths, seed))
+    if not skip_startup:
+        results['benchmarks'].update(benchmark_startup())
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    click.echo(f"{len(results['benchmarks'])} benchmarks -> {output}")
+
+    slow = [name for name, value in results['benchmarks'].items()
+            if name.startswith('startup.') and value['value'] > startup_target]
+    for name in slow:
+        click.echo(f"{name} took {results['benchmarks'][name]['value']:.3f}s, above {startup_target}s", err=True)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, threshold)
+        if regressions:
+            click.echo(f"{len(regressions)} regressions above {threshold:.0%} or without a baseline: "
+                       f"{', '.join(regressions)}", err=True)
+            sys.exit(1)
+    if slow:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+from collections import OrderedDict, namedtuple
+from functools import wraps
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+_MISSING = object()
+
+
+class BlockCache:
+    """
+    Bounded LRU cache owned by a single AMM.
+
+    The AMM clears it at every block boundary, so cached values never
+    outlive the block state they were computed from, and nothing outside
+    the instance holds a reference to it.
+    """
+    def __init__(self, maxsize: int=128) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, key, default=None):
+        value = self._entries.get(key, _MISSING)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, value) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._entries))
+
+
+def block_cached(method):
+    """
+    Caches `method` in the `block_cache` of the instance it is called on.
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        key = (method.__name__, args, tuple(sorted(kwargs.items())))
+        value = self.block_cache.get(key, _MISSING)
+        if value is _MISSING:
+            value = method(self, *args, **kwargs)
+            self.block_cache.put(key, value)
+        return value
+    return wrapper
@@ -0,0 +1,154 @@
+"""
+Checkpoints of `Simulation.do_simulation`, to resume a long run after a
+crash or preemption with bit-identical results.
+
+A checkpoint directory holds
+
+    results.npy  (3, paths) per-day results, one column written per finished path
+    state.pkl    the run's parameters, the finished path count and the path in flight
+
+`state.pkl` is replaced atomically (written next to it, then renamed), so
+a crash while writing leaves the previous checkpoint. The path in flight
+is the pickled `AMM` (pool price, fee state, cut-off percentile, swapper
+registry, ...), the running totals, the next block and the states of the
+global `random` and `np.random` generators at that block and at the start
+of the path. The prices are not stored: on resume they are drawn again
+from the path's start state (or replayed).
+
+    checkpoint = SimulationCheckpoint('run', every_blocks=5000)
+    Simulation(...).do_simulation(checkpoint=checkpoint)
+
+Rerunning the same line after an interruption picks up at the last
+checkpoint. A checkpoint costs one pickle of a few tens of kB.
+"""
+import math
+import os
+import pickle
+import random
+import zlib
+import numpy as np
+
+STATE_FILENAME = 'state.pkl'
+RESULTS_FILENAME = 'results.npy'
+
+
+def _rng_states() -> tuple:
+    return np.random.get_state(), random.getstate()
+
+
+def _set_rng_states(states: tuple) -> None:
+    np.random.set_state(states[0])
+    random.setstate(states[1])
+
+
+class SimulationCheckpoint:
+    def __init__(self, directory: str, every_blocks: int=5000) -> None:
+        """
+        Args:
+            directory: created if missing, resumed from if it holds a checkpoint.
+            every_blocks: blocks between two checkpoints of the path in flight.
+        """
+        if every_blocks < 1:
+            raise ValueError("`every_blocks` must be positive.")
+        self.directory = directory
+        self.every_blocks = every_blocks
+        self.results = None
+        self._state = None
+        # path in flight, restored once by `restore_path`
+        self._resumed_path = None
+        self._path_start = None
+
+    @staticmethod
+    def config(simulation) -> dict:
+        """Parameters a checkpoint is only valid for."""
+        gas_model = simulation.gas_model
+        # replayed prices, identified by their checksum
+        prices = getattr(simulation, 'prices', None)
+        return {'simulation': type(simulation).__name__,
+                'initial_price': simulation.initial_price,
+                # NaN for replays, and NaN != NaN
+                'daily_sigma': None if math.isnan(simulation.daily_sigma) else simulation.daily_sigma,
+                'prices': None if prices is None else
+                    (len(prices), zlib.crc32(np.ascontiguousarray(prices, dtype=np.float64).tobytes())),
+                'blocks_per_day': simulation.blocks_per_day,
+                'days': simulation.days,
+                'gas_cost': simulation.gas_cost,
+                'liquidity_per_basis_point': simulation.liquidty_per_basis_point,
+                'base_pool_fee': simulation.base_pool_fee,
+                'paths': simulation.paths,
+                'gas_model': None if gas_model is None else (gas_model.coefficients, gas_model.fee_in_swap)}
+
+    def _write_state(self) -> None:
+        filename = os.path.join(self.directory, STATE_FILENAME)
+        with open(filename + '.tmp', 'wb') as f:
+            pickle.dump(self._state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(filename + '.tmp', filename)
+
+    def resume(self, simulation) -> int:
+        """
+        Opens the checkpoint of `simulation`, or starts a new one, and
+        restores the generators.
+        Returns:
+            first path to run, the earlier ones are in `results`.
+        """
+        config = self.config(simulation)
+        filename = os.path.join(self.directory, STATE_FILENAME)
+        if os.path.exists(filename):
+            with open(filename, 'rb') as f:
+                self._state = pickle.load(f)
+            if self._state['config'] != config:
+                raise ValueError(f"Checkpoint in {self.directory} is of another run: {self._state['config']}.")
+            self.results = np.load(os.path.join(self.directory, RESULTS_FILENAME), mmap_mode='r+')
+            if self._state['path_start'] is not None:
+                self._resumed_path = self._state['completed_paths']
+                _set_rng_states(self._state['path_start'])
+            else:
+                _set_rng_states(self._state['rng'])
+            return self._state['completed_paths']
+        os.makedirs(self.directory, exist_ok=True)
+        self.results = np.lib.format.open_memmap(os.path.join(self.directory, RESULTS_FILENAME),
+                                                 mode='w+', dtype=np.float64, shape=(3, simulation.paths))
+        self._state = {'config': config,
+                       'completed_paths': 0,
+                       'path_start': None,
+                       'rng': _rng_states(),
+                       'path': None}
+        self._write_state()
+        return 0
+
+    def begin_path(self, path: int) -> None:
+        """Keeps the generator states the prices of `path` are drawn from."""
+        if path == self._resumed_path:
+            self._path_start = self._state['path_start']
+        else:
+            self._path_start = _rng_states()
+
+    def restore_path(self, path: int) -> tuple|None:
+        """
+        Restores the generators of the checkpointed `path`, once.
+        Returns:
+            the AMM, the next block and the lvr, arb gain and gas so far,
+            None if `path` was not in flight.
+        """
+        if path != self._resumed_path:
+            return None
+        self._resumed_path = None
+        amm, block, totals, rng = pickle.loads(self._state['path'])
+        _set_rng_states(rng)
+        return amm, block, totals
+
+    def due(self, block: int) -> bool:
+        return block % self.every_blocks == 0
+
+    def save_path(self, path: int, block: int, amm, totals: tuple[float, float, float]) -> None:
+        """Checkpoints `path` in flight, `block` being the next block to run."""
+        self._state['path_start'] = self._path_start
+        self._state['path'] = pickle.dumps((amm, block, totals, _rng_states()), protocol=pickle.HIGHEST_PROTOCOL)
+        self._write_state()
+
+    def end_path(self, path: int, results: np.ndarray) -> None:
+        """Writes the per-day results of the finished `path`."""
+        self.results[:, path] = results
+        self.results.flush()
+        self._state.update(completed_paths=path + 1, path_start=None, rng=_rng_states(), path=None)
+        self._write_state()
@@ -0,0 +1,230 @@
+"""
+Command line entry point of the simulations.
+
+    python cli.py run --days 1 --paths 100 --engine jit --output results.npy
+    python cli.py report results.npy --plot results.png
+    python cli.py run --days 30 --paths 1000 --engine parallel --summary summary.pkl
+    python cli.py report summary.pkl
+    python cli.py sweep -p base_fee=0.001,0.003 --initial-price 2000 --daily-sigma 0.05 --gas-cost 1
+
+Batch schedulers launch many short processes, so startup is kept to the
+imports a command needs: subcommands living in other modules are imported
+when invoked (`--help` lists them without importing them), numba is only
+loaded by the JIT engines, whose kernels are cached on disk, and
+matplotlib only by `report --plot`. `benchmark.py --startup-target`
+checks the startup time.
+"""
+import importlib
+import click
+
+# name -> (module:command, short help), imported when invoked
+LAZY_COMMANDS = {'sweep': ('parameter_sweep:main', 'Simulates every configuration of a parameter grid.'),
+                 'adaptive': ('adaptive_simulation:main', 'Simulates until a target confidence interval.'),
+                 'estimate': ('lvr_estimator:main', 'Validates the analytic LVR estimator.'),
+                 'gas': ('gas_report:main', 'Prints the gas of a swap through DammHook.'),
+                 'fuzz': ('damm_reference:main', 'Fuzzes the DammHook fee math against floats.')}
+ENGINES = ('scalar', 'jit', 'parallel', 'vectorized')
+METRICS = ('lvr', 'arbitrage_gain', 'gas')
+
+
+class LazyGroup(click.Group):
+    """`click.Group` importing the commands of `lazy_commands` on first use."""
+    def __init__(self, *args, lazy_commands: dict[str, tuple[str, str]]|None=None, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = lazy_commands or {}
+
+    def list_commands(self, ctx) -> list[str]:
+        return sorted([*super().list_commands(ctx), *self.lazy_commands])
+
+    def get_command(self, ctx, name):
+        if name in self.lazy_commands:
+            module, command = self.lazy_commands[name][0].split(':')
+            return getattr(importlib.import_module(module), command)
+        return super().get_command(ctx, name)
+
+    def format_commands(self, ctx, formatter) -> None:
+        limit = formatter.width - 6 - max(len(name) for name in self.list_commands(ctx))
+        rows = [(name, self.lazy_commands[name][1] if name in self.lazy_commands
+                 else click.Group.get_command(self, ctx, name).get_short_help_str(limit))
+                for name in self.list_commands(ctx)]
+        with formatter.section('Commands'):
+            formatter.write_dl(rows)
+
+
+@click.group(cls=LazyGroup, lazy_commands=LAZY_COMMANDS)
+def cli():
+    """Monte-Carlo simulations of the dynamic fee AMM."""
+
+
+@cli.command()
+@click.option('--initial-price', type=float, default=2000.0, show_default=True)
+@click.option('--daily-sigma', type=float, default=0.05, show_default=True)
+@click.option('--days', type=float, default=1.0, show_default=True)
+@click.option('--gas-cost', type=float, default=1.0, show_default=True)
+@click.option('--paths', type=int, default=100, show_default=True)
+@click.option('--engine', type=click.Choice(ENGINES), default='scalar', show_default=True,
+              help='Python AMM, compiled kernel, compiled kernel over a process pool, or numpy over all paths.')
+@click.option('--workers', type=int, default=None, help='Processes of the parallel engine, all CPUs by default.')
+@click.option('--seed', type=int, default=None)
+@click.option('--gas-snapshots', type=click.Path(exists=True, file_okay=False), default=None,
+              help='forge-snapshots directory to price gas per swap with (scalar engine).')
+@click.option('--checkpoint', type=click.Path(file_okay=False), default=None,
+              help='Directory to checkpoint to and resume from (scalar engine).')
+@click.option('--every-blocks', type=int, default=5000, show_default=True, help='Blocks between checkpoints.')
+@click.option('--record', type=click.Path(file_okay=False), default=None,
+              help='Directory to record per-block results to (scalar engine).')
+@click.option('--output', type=click.Path(dir_okay=False), default=None, help='.npy file of the (3, paths) results.')
+@click.option('--summary', 'summary_file', type=click.Path(dir_okay=False), default=None,
+              help='.pkl file of the distributions of the per-block lvr, arb gain and per-swap fees.')
+def run(initial_price, daily_sigma, days, gas_cost, paths, engine, workers, seed, gas_snapshots, checkpoint,
+        every_blocks, record, output, summary_file):
+    """Simulates GBM paths and prints lvr, arb gain and gas per day."""
+    import numpy as np
+    if engine != 'scalar' and (gas_snapshots or checkpoint or record):
+        raise click.UsageError("--gas-snapshots, --checkpoint and --record need --engine scalar.")
+    if checkpoint is not None and summary_file is not None:
+        raise click.UsageError("--summary cannot be resumed from a --checkpoint.")
+    summary = None
+    if summary_file is not None:
+        from sketches import ResultsSummary
+        summary = ResultsSummary(seed=seed)
+    arguments = (initial_price, daily_sigma, days, gas_cost, 166_666.67, 0.003, paths)
+    if engine == 'scalar':
+        import random
+        from simulation import Simulation
+        gas_model = None
+        if gas_snapshots is not None:
+            from gas_model import GasModel
+            gas_model = GasModel.from_snapshots(gas_snapshots)
+        if seed is not None:
+            random.seed(seed)
+            np.random.seed(seed)
+        simulation = Simulation(*arguments, gas_model=gas_model)
+        if record is not None:
+            from results_store import ResultsRecorder
+            with ResultsRecorder(record) as recorder:
+                results = simulation.do_simulation(recorder=recorder, summary=summary)
+        elif checkpoint is not None:
+            from checkpoint import SimulationCheckpoint
+            results = simulation.do_simulation(checkpoint=SimulationCheckpoint(checkpoint, every_blocks))
+        else:
+            results = simulation.do_simulation(summary=summary)
+    elif engine == 'jit':
+        from simulation import Simulation
+        results = Simulation(*arguments).do_simulation_jit(seed, summary=summary)
+    elif engine == 'parallel':
+        from parallel_simulation import ParallelSimulation
+        results = ParallelSimulation(*arguments).do_simulation(seed, max_workers=workers, summary=summary)
+    else:
+        from vectorized_simulation import VectorizedSimulation
+        results = VectorizedSimulation(*arguments).do_simulation(seed, summary=summary)
+    if output is not None:
+        np.save(output, results)
+    click.echo("per day:")
+    _echo_summary(results)
+    if summary is not None:
+        summary.save(summary_file)
+        _echo_distributions(summary)
+        click.echo(f"-> {summary_file}")
+
+
+def _echo_summary(results, metrics: tuple[str, ...]=METRICS) -> None:
+    import numpy as np
+    paths = results.shape[1]
+    click.echo(f"{'per path':<15} {'mean':>14} {'std err':>12} {'p5':>14} {'p50':>14} {'p95':>14}  ({paths} paths)")
+    for metric, values in zip(metrics, results):
+        standard_error = values.std(ddof=1) / np.sqrt(paths) if paths > 1 else float('nan')
+        p5, p50, p95 = np.percentile(values, [5, 50, 95])
+        click.echo(f"{metric:<15} {values.mean():>14.4f} {standard_error:>12.4f} {p5:>14.4f} {p50:>14.4f} {p95:>14.4f}")
+
+
+def _echo_distributions(summary, bins: int=20, width: int=40) -> None:
+    import numpy as np
+    quantiles = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+    click.echo(f"{'per block/swap':<15} {'count':>10} {'mean':>12} {'std':>12} {'min':>12} "
+               + ' '.join(f"{'p' + format(100 * q, 'g'):>12}" for q in quantiles) + f" {'max':>12}")
+    for name in summary.names:
+        moments = summary.moments[name]
+        click.echo(f"{name:<15} {moments.count:>10} {moments.mean:>12.6g} {moments.std:>12.6g} {moments.min:>12.6g} "
+                   + ' '.join(f"{value:>12.6g}" for value in summary.quantiles(name, quantiles))
+                   + f" {moments.max:>12.6g}")
+    for name in summary.names:
+        counts, edges = summary.histogram(name, bins)
+        click.echo(f"{name} (outer bins open-ended):")
+        scale = width / max(counts.max(), 1.0)
+        for count, low, high in zip(counts, edges[:-1], edges[1:]):
+            click.echo(f"  [{low:>12.6g}, {high:>12.6g}) {count:>12.0f} {'#' * int(np.round(count * scale))}")
+
+
+def _report_summaries(filenames: tuple[str, ...], bins: int, plot: str|None) -> None:
+    from sketches import ResultsSummary
+    summary = ResultsSummary.load(filenames[0])
+    for filename in filenames[1:]:
+        summary.merge(ResultsSummary.load(filename))
+    _echo_distributions(summary, bins)
+    if plot is not None:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        names = summary.names
+        figure, axes = plt.subplots(1, len(names), figsize=(4 * len(names), 3), squeeze=False)
+        for axis, name in zip(axes[0], names):
+            counts, edges = summary.histogram(name, bins)
+            axis.stairs(counts, edges, fill=True)
+            axis.set_title(name)
+        figure.tight_layout()
+        figure.savefig(plot)
+        click.echo(f"-> {plot}")
+
+
+@cli.command()
+@click.argument('results', nargs=-1, required=True, type=click.Path(exists=True))
+@click.option('--bins', type=int, default=20, show_default=True, help='Histogram bins of summaries.')
+@click.option('--plot', type=click.Path(dir_okay=False), default=None,
+              help='Image file of the per-path distributions (needs matplotlib).')
+def report(results, bins, plot):
+    """
+    Summarises the results of `run`. RESULTS is a .npy file written by
+    `run --output`, a directory written by `run --record`, or .pkl files
+    written by `run --summary`, merged (e.g. of runs on several machines).
+    """
+    import numpy as np
+    if all(filename.endswith('.pkl') for filename in results):
+        _report_summaries(results, bins, plot)
+        return
+    if len(results) > 1:
+        raise click.UsageError("Only .pkl summaries can be reported together.")
+    results = results[0]
+    metrics = METRICS
+    if results.endswith('.npy'):
+        click.echo("per day:")
+        results = np.load(results)
+    else:
+        from results_store import ResultsReader
+        reader = ResultsReader(results)
+        for name in ('pool_price', 'combined_fee', 'endogenous_fee', 'exogenous_fee', 'cut_off_percentile'):
+            column = reader.column(name)
+            click.echo(f"{name:<20} mean {column.mean():>14.6g}  min {column.min():>14.6g}  max {column.max():>14.6g}")
+        table = reader.select(['path', 'fee', 'gas'])
+        paths, index = np.unique(table['path'], return_inverse=True)
+        click.echo(f"{len(reader)} blocks over {paths.shape[0]} paths, totals per path:")
+        metrics = ('fee', 'gas')
+        results = np.zeros((len(metrics), paths.shape[0]))
+        for row, metric in enumerate(metrics):
+            np.add.at(results[row], index, table[metric])
+    _echo_summary(results, metrics)
+    if plot is not None:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        figure, axes = plt.subplots(1, len(metrics), figsize=(4 * len(metrics), 3))
+        for axis, metric, values in zip(axes, metrics, results):
+            axis.hist(values, bins=min(50, max(10, values.shape[0] // 5)))
+            axis.set_title(metric)
+        figure.tight_layout()
+        figure.savefig(plot)
+        click.echo(f"-> {plot}")
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,83 @@
+"""
+Append-only columnar files.
+
+A table is a directory with one raw binary file per column,
+`<column>.bin`, plus `columns.json` with the column names and dtypes.
+Rows are buffered in memory and appended column by column, and
+`read_columns` maps the files back as read-only numpy arrays without
+loading them.
+"""
+import json
+import os
+import numpy as np
+
+
+class ColumnarSink:
+    def __init__(self,
+                 directory: str,
+                 columns: dict[str, str],
+                 buffer_rows: int=4096) -> None:
+        """
+        Args:
+            directory: created if missing, existing columns are overwritten.
+            columns: column name -> numpy dtype, in row order.
+            buffer_rows: rows held in memory between writes.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.columns = {name: np.dtype(dtype) for name, dtype in columns.items()}
+        self._buffers = [np.empty(buffer_rows, dtype=dtype) for dtype in self.columns.values()]
+        self._files = [open(os.path.join(directory, f"{name}.bin"), 'wb') for name in self.columns]
+        self._rows = 0
+        self.rows_written = 0
+        with open(os.path.join(directory, 'columns.json'), 'w') as f:
+            json.dump({name: dtype.str for name, dtype in self.columns.items()}, f)
+
+    def append(self, *row) -> None:
+        """Appends one row, a value per column."""
+        for buffer, value in zip(self._buffers, row):
+            buffer[self._rows] = value
+        self._rows += 1
+        if self._rows == self._buffers[0].shape[0]:
+            self.flush()
+
+    def append_rows(self, *columns: np.ndarray) -> None:
+        """Appends many rows at once, an array per column."""
+        self.flush()
+        for f, dtype, column in zip(self._files, self.columns.values(), columns):
+            np.ascontiguousarray(column, dtype=dtype).tofile(f)
+        self.rows_written += len(columns[0])
+
+    def flush(self) -> None:
+        for f, buffer in zip(self._files, self._buffers):
+            buffer[:self._rows].tofile(f)
+            f.flush()
+        self.rows_written += self._rows
+        self._rows = 0
+
+    def close(self) -> None:
+        if not self._files[0].closed:
+            self.flush()
+            for f in self._files:
+                f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def read_columns(directory: str) -> dict[str, np.ndarray]:
+    """Read-only, memory-mapped columns of a table written by `ColumnarSink`."""
+    with open(os.path.join(directory, 'columns.json')) as f:
+        columns = json.load(f)
+    table = {}
+    for name, dtype in columns.items():
+        filename = os.path.join(directory, f"{name}.bin")
+        if os.path.getsize(filename) == 0:
+            # an empty file cannot be mapped
+            table[name] = np.empty(0, dtype=dtype)
+        else:
+            table[name] = np.memmap(filename, dtype=dtype, mode='r')
+    return table
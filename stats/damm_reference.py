@@ -0,0 +1,355 @@
+"""
+Fixed-point reference of the DammHook fee math, for differential fuzzing.
+
+Reproduces over numpy batches the uint256 arithmetic of
+`damm/src/DammHook.sol` (`endogenousDynamicFee`, `exogenousDynamicFee`,
+`calculateCombinedFee`, `getSubmittedDeltaFeeForBlock`) and
+`FeeQuantizer.getquantizedFee`: fees in millionths (3000 = 0.3%),
+percent-scaled `alpha` and cut-off percentile, truncating divisions, the
+Babylonian integer `sqrt` and Solidity 0.8's checked arithmetic, where an
+underflow or a division by zero reverts the call. Functions return their
+values together with a `reverted` mask; reverted entries are 0.
+
+Inputs are limited to a domain in which every intermediate value of the
+contract fits in 64 bits (`check_domain`), so the batches run in numpy
+integer arithmetic with exactly the uint256 results.
+
+`fuzz` draws random inputs and evaluates every function with the
+reference and with the float formulas of `amm_modified.AMM`, both on the
+same inputs, and returns each case where they differ by more than a
+tolerance.
+
+    python damm_reference.py --samples 1000000 --output divergences.csv
+"""
+import csv
+import time
+import click
+import numpy as np
+
+BASE_FEE = 3000
+# fees are integers in millionths
+FEE_SCALE = 1_000_000
+CUT_OFF_PERCENTILE = 85
+N = 2
+# constructor values of DammHook
+ALPHA = 50
+M = 10
+N_HOOK = 5
+SCALING_FACTOR = 10**18
+# bounds of `check_domain`
+MAX_PRICE = 2**32
+MAX_SUBMITTED_FEES = 1024
+
+UINT = np.uint64
+
+
+def check_domain(prices=(), fees=()) -> None:
+    """Raises ValueError for inputs whose intermediate values could exceed 64 bits."""
+    for price in prices:
+        if np.any(np.asarray(price) >= MAX_PRICE):
+            raise ValueError(f"Prices must be below {MAX_PRICE}.")
+    for fee in fees:
+        fee = np.asarray(fee)
+        if fee.ndim == 2 and fee.shape[1] > MAX_SUBMITTED_FEES:
+            raise ValueError(f"At most {MAX_SUBMITTED_FEES} submitted fees per block.")
+        if np.any(fee >= BASE_FEE * 5 + 1):
+            raise ValueError(f"Fees must be at most {BASE_FEE * 5}.")
+
+
+def quantized_fee(fee: np.ndarray) -> np.ndarray:
+    """`FeeQuantizer.getquantizedFee`."""
+    fee = np.asarray(fee, dtype=UINT)
+    return np.where(fee >= 2000, UINT(0), fee // UINT(50) * UINT(50))
+
+
+def isqrt(x: np.ndarray) -> np.ndarray:
+    """`DammHook.sqrt`, the Babylonian method from (x + 1) / 2, i.e. floor(sqrt(x))."""
+    x = np.asarray(x, dtype=UINT)
+    y = np.sqrt(x.astype(np.float64)).astype(UINT)
+    # float rounding is off by at most one for x < 2**62
+    y = np.where(y * y > x, y - UINT(1), y)
+    return np.where((y + UINT(1)) * (y + UINT(1)) <= x, y + UINT(1), y)
+
+
+def _mul_div(a: np.ndarray, numerator: int, b: np.ndarray) -> np.ndarray:
+    """a * numerator / b, truncated, without the 64-bit overflow of a * numerator."""
+    quotient, remainder = np.divmod(UINT(numerator), b)
+    return a * quotient + a * remainder // b
+
+
+def endogenous_dynamic_fee(block_id: np.ndarray,
+                           price_before: np.ndarray,
+                           price_after: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    `DammHook.endogenousDynamicFee` for the prices the oracle returns.
+    Returns:
+        fee, reverted (division by a zero price before the previous block).
+    """
+    block_id = np.asarray(block_id, dtype=UINT)
+    price_before = np.asarray(price_before, dtype=UINT)
+    price_after = np.asarray(price_after, dtype=UINT)
+    reverted = (block_id != 0) & (price_before == 0)
+    # block 0 returns the base fee before dividing
+    before = np.where(price_before == 0, UINT(1), price_before)
+    difference = np.where(price_after > before, price_after - before, before - price_after)
+    # priceImpact = whole * 1e18 + fraction with difference = whole * before + remainder,
+    # so BASE_FEE * priceImpact / 1e18 = BASE_FEE * whole + BASE_FEE * fraction / 1e18
+    whole, remainder = np.divmod(difference, before)
+    fraction = _mul_div(remainder, SCALING_FACTOR, before)
+    # BASE_FEE * fraction / 1e18, split at 1e9 to stay within 64 bits
+    high, low = np.divmod(fraction, UINT(10**9))
+    dynamic_part_of_fee = UINT(BASE_FEE) * whole + \
+        (UINT(BASE_FEE) * high + UINT(BASE_FEE) * low // UINT(10**9)) // UINT(10**9)
+    fee = UINT(BASE_FEE) + dynamic_part_of_fee * UINT(10) // UINT(100)
+    fee = np.where(block_id == 0, UINT(BASE_FEE), fee)
+    return np.where(reverted, UINT(0), fee), reverted
+
+
+def _trimmed_mean_and_sigma(fees: np.ndarray,
+                            count: np.ndarray,
+                            cut_off_percentile) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Integer mean and sqrt of the integer variance of the lowest
+    `count * cut_off_percentile / 100` of the first `count` fees of each
+    row, and whether `fee - mean` underflowed for one of them.
+    """
+    k = fees.shape[1]
+    columns = np.arange(k)
+    # unused slots sort last
+    padded = np.where(columns < count[:, None], fees, np.iinfo(UINT).max).astype(UINT)
+    padded.sort(axis=1)
+    cutoff_index = count * np.asarray(cut_off_percentile, dtype=UINT) // UINT(100)
+    kept = columns < cutoff_index[:, None]
+    divisor = np.maximum(cutoff_index, UINT(1))
+    mean = np.where(kept, padded, UINT(0)).sum(axis=1, dtype=UINT) // divisor
+    underflow = np.any(kept & (padded < mean[:, None]), axis=1)
+    deviation = np.where(kept & ~underflow[:, None], padded - mean[:, None], UINT(0))
+    variance = (deviation * deviation).sum(axis=1, dtype=UINT) // divisor
+    return mean, isqrt(variance), underflow | (cutoff_index == 0)
+
+
+def exogenous_dynamic_fee(fees: np.ndarray,
+                          count: np.ndarray,
+                          cut_off_percentile: np.ndarray,
+                          in_senders: np.ndarray,
+                          first_trx: np.ndarray|bool=False,
+                          m: int=M,
+                          n: int=N_HOOK) -> tuple[np.ndarray, np.ndarray]:
+    """
+    `DammHook.exogenousDynamicFee`.
+    Args:
+        fees: (batch, max senders) submitted delta fee of each sender of the block.
+        count: number of senders, i.e. of valid fees in each row.
+        cut_off_percentile: in percent.
+        in_senders: whether the swapper submitted a fee in this block.
+        first_trx: the hook's `first_trx` flag.
+    Returns:
+        fee, reverted (`sortedFees[i] - meanFee` underflowed).
+    """
+    fees = np.asarray(fees, dtype=UINT)
+    count = np.asarray(count, dtype=UINT)
+    mean, sigma, reverted = _trimmed_mean_and_sigma(fees, count, cut_off_percentile)
+    fee = np.where(in_senders, mean + UINT(m) * sigma, UINT(n) * sigma)
+    # early returns of the contract
+    early = np.asarray(first_trx) | (count < 2)
+    fee = np.where(count < 2, UINT(BASE_FEE), fee)
+    fee = np.where(first_trx, UINT(BASE_FEE * 5), fee)
+    reverted = reverted & ~early
+    return np.where(reverted, UINT(0), fee), reverted
+
+
+def combined_fee(endogenous_fee: np.ndarray,
+                 exogenous_fee: np.ndarray,
+                 alpha: np.ndarray,
+                 cut_off_percentile: np.ndarray,
+                 first_transaction: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    `DammHook.calculateCombinedFee` given its two components.
+    Returns:
+        fee, the updated cut-off percentile and reverted (`100 - alpha` underflowed).
+    """
+    endogenous_fee = np.asarray(endogenous_fee, dtype=UINT)
+    exogenous_fee = np.asarray(exogenous_fee, dtype=UINT)
+    alpha = np.asarray(alpha, dtype=UINT)
+    cut_off_percentile = np.asarray(cut_off_percentile, dtype=UINT)
+    reverted = alpha > 100
+    weight = np.where(reverted, UINT(0), UINT(100) - alpha)
+    fee = (alpha * endogenous_fee + weight * exogenous_fee) // UINT(100)
+    fee = np.maximum(fee, endogenous_fee)
+    cut_off_percentile = np.where(fee <= UINT(BASE_FEE * 125 // 100),
+                                  np.minimum(cut_off_percentile + UINT(5), UINT(100)),
+                                  cut_off_percentile)
+    # `cutOffPercentile - 5 < 50` stays within the [50, 100] the contract keeps it in
+    cut_off_percentile = np.where(fee > UINT(BASE_FEE * 2),
+                                  np.maximum(cut_off_percentile, UINT(55)) - UINT(5),
+                                  cut_off_percentile)
+    fee = np.where(first_transaction, fee * UINT(5), fee)
+    return np.where(reverted, UINT(0), fee), cut_off_percentile, reverted
+
+
+def submitted_delta_fee_for_block(fees: np.ndarray, count: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    `DammHook.getSubmittedDeltaFeeForBlock`: N times the sigma of the
+    lowest CUT_OFF_PERCENTILE percent of the block's submitted fees.
+    Returns:
+        fee, reverted (`data[i] - mean` underflowed in `calculateStdDev`).
+    """
+    fees = np.asarray(fees, dtype=UINT)
+    count = np.asarray(count, dtype=UINT)
+    _, sigma, reverted = _trimmed_mean_and_sigma(fees, count, CUT_OFF_PERCENTILE)
+    fee = np.where(count < 2, UINT(BASE_FEE), UINT(N) * sigma)
+    reverted = reverted & (count >= 2)
+    return np.where(reverted, UINT(0), fee), reverted
+
+
+# float formulas of `amm_modified.AMM`, as fee rates
+
+def float_endogenous_dynamic_fee(block_id, price_before, price_after, base_fee: float=BASE_FEE / FEE_SCALE):
+    """`AMM.endogenous_dynamic_fee` for the given previous block prices."""
+    price_before = np.asarray(price_before, dtype=np.float64)
+    price_impact = np.abs(np.asarray(price_after, dtype=np.float64) - price_before) / price_before
+    return np.where(np.asarray(block_id) == 0, base_fee, base_fee + price_impact * 0.01)
+
+
+def float_exogenous_dynamic_fee(fees, count, cut_off_percentile, in_current_block, m: float, n: float,
+                                base_fee: float=BASE_FEE / FEE_SCALE):
+    """`AMM.exogenous_dynamic_fee`, with `cut_off_percentile` as a fraction."""
+    fees = np.asarray(fees, dtype=np.float64)
+    count = np.asarray(count)
+    columns = np.arange(fees.shape[1])
+    padded = np.sort(np.where(columns < count[:, None], fees, np.inf), axis=1)
+    cutoff_index = (count * np.asarray(cut_off_percentile)).astype(np.int64)
+    kept = columns < cutoff_index[:, None]
+    divisor = np.maximum(cutoff_index, 1)
+    mean = np.where(kept, padded, 0.0).sum(axis=1) / divisor
+    deviation = np.where(kept, padded - mean[:, None], 0.0)
+    sigma = np.sqrt((deviation * deviation).sum(axis=1) / divisor)
+    fee = np.where(in_current_block, mean + m * sigma, n * sigma)
+    return np.where(count < 2, base_fee, fee)
+
+
+def float_combined_fee(endogenous_fee, exogenous_fee, alpha, cut_off_percentile, first_transaction,
+                       cut_off_percentile_step: float=0.05, base_fee: float=BASE_FEE / FEE_SCALE):
+    """
+    `AMM.calculate_combined_fee` given its two components, without the
+    loyalty discount, which the hook does not have.
+    Returns:
+        fee and the updated cut-off percentile (fraction).
+    """
+    fee = alpha * endogenous_fee + (1 - alpha) * exogenous_fee
+    fee = np.maximum(fee, endogenous_fee)
+    cut_off_percentile = np.where(fee <= base_fee * 1.25,
+                                  np.minimum(cut_off_percentile + cut_off_percentile_step, 1.0),
+                                  cut_off_percentile)
+    cut_off_percentile = np.where(fee > base_fee * 2,
+                                  np.maximum(cut_off_percentile - cut_off_percentile_step, 0.5),
+                                  cut_off_percentile)
+    return np.where(first_transaction, fee * 5, fee), cut_off_percentile
+
+
+def draw_inputs(rng: np.random.Generator, samples: int, max_senders: int=16) -> dict[str, np.ndarray]:
+    """Random hook inputs, with prices as `DammOracle.getPrices` returns them."""
+    volatility = rng.integers(0, 2000, samples)
+    return {'block_id': np.where(rng.random(samples) < 0.01, 0, rng.integers(1, 2**32, samples)),
+            'price_before': 1000 + (rng.random(samples) * (volatility + 1)).astype(np.int64),
+            'price_after': 1000 + (rng.random(samples) * (volatility + 1)).astype(np.int64),
+            'fees': rng.integers(1, BASE_FEE, (samples, max_senders)),
+            'count': rng.integers(0, max_senders + 1, samples),
+            'in_senders': rng.random(samples) < 0.5,
+            'first_trx': rng.random(samples) < 0.01,
+            'cut_off_percentile': 50 + 5 * rng.integers(0, 11, samples),
+            'alpha': rng.integers(0, 101, samples),
+            'first_transaction': rng.random(samples) < 0.1}
+
+
+def fuzz(samples: int, seed: int|None=None, tolerance: float=1e-6, max_senders: int=16,
+         m: int=M, n: int=N_HOOK) -> dict[str, dict]:
+    """
+    Evaluates every function on the same random inputs with the reference
+    and the float model, the latter on fee rates (fee / FEE_SCALE).
+    Returns:
+        Function name -> columns (inputs, both outputs, difference and
+        `reverted`) of every case where the outputs differ by more than
+        `tolerance` or the contract reverted.
+    """
+    inputs = draw_inputs(np.random.default_rng(seed), samples, max_senders)
+    check_domain(prices=(inputs['price_before'], inputs['price_after']), fees=(inputs['fees'],))
+    divergences = {}
+
+    def report(name: str, reference: np.ndarray, reverted: np.ndarray, model: np.ndarray, columns: dict) -> None:
+        difference = np.abs(reference / FEE_SCALE - model)
+        diverged = np.flatnonzero((difference > tolerance) | reverted)
+        divergences[name] = {**{key: np.asarray(value)[diverged] for key, value in columns.items()},
+                             'reference': reference[diverged] / FEE_SCALE,
+                             'model': model[diverged],
+                             'difference': difference[diverged],
+                             'reverted': reverted[diverged],
+                             'sample': diverged}
+
+    endogenous, reverted = endogenous_dynamic_fee(inputs['block_id'], inputs['price_before'], inputs['price_after'])
+    report('endogenous_dynamic_fee', endogenous, reverted,
+           float_endogenous_dynamic_fee(inputs['block_id'], inputs['price_before'], inputs['price_after']),
+           {key: inputs[key] for key in ('block_id', 'price_before', 'price_after')})
+
+    # the hook's early `first_trx` return has no float counterpart
+    exogenous, reverted = exogenous_dynamic_fee(inputs['fees'], inputs['count'], inputs['cut_off_percentile'],
+                                                inputs['in_senders'], False, m, n)
+    report('exogenous_dynamic_fee', exogenous, reverted,
+           float_exogenous_dynamic_fee(inputs['fees'] / FEE_SCALE, inputs['count'],
+                                       inputs['cut_off_percentile'] / 100, inputs['in_senders'], m, n),
+           {'count': inputs['count'], 'cut_off_percentile': inputs['cut_off_percentile'],
+            'in_senders': inputs['in_senders']})
+
+    # combined fee of the reference components, so that only this step is compared
+    combined, cut_off_percentile, reverted = combined_fee(endogenous, exogenous, inputs['alpha'],
+                                                          inputs['cut_off_percentile'],
+                                                          inputs['first_transaction'])
+    model, model_cut_off_percentile = float_combined_fee(endogenous / FEE_SCALE, exogenous / FEE_SCALE,
+                                                         inputs['alpha'] / 100, inputs['cut_off_percentile'] / 100,
+                                                         inputs['first_transaction'])
+    report('calculate_combined_fee', combined, reverted, model,
+           {'endogenous_fee': endogenous, 'exogenous_fee': exogenous, 'alpha': inputs['alpha'],
+            'first_transaction': inputs['first_transaction']})
+    report('cut_off_percentile', cut_off_percentile * (FEE_SCALE // 100), reverted, model_cut_off_percentile,
+           {'combined_fee': combined, 'cut_off_percentile': inputs['cut_off_percentile']})
+    return divergences
+
+
+def write_divergences(divergences: dict[str, dict], filename: str) -> None:
+    """One row per divergence, function name first, inputs as `key=value`."""
+    with open(filename, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['function', 'sample', 'reference', 'model', 'difference', 'reverted', 'inputs'])
+        for name, columns in divergences.items():
+            inputs = [key for key in columns if key not in ('sample', 'reference', 'model', 'difference', 'reverted')]
+            for i in range(len(columns['sample'])):
+                writer.writerow([name, columns['sample'][i], columns['reference'][i], columns['model'][i],
+                                 columns['difference'][i], columns['reverted'][i],
+                                 ' '.join(f"{key}={columns[key][i]}" for key in inputs)])
+
+
+@click.command()
+@click.option('--samples', type=int, default=1_000_000, show_default=True)
+@click.option('--seed', type=int, default=None)
+@click.option('--tolerance', type=float, default=1e-6, show_default=True,
+              help='Largest fee difference (as a rate) not reported, 1e-6 is the resolution of the hook.')
+@click.option('--max-senders', type=int, default=16, show_default=True)
+@click.option('--output', type=click.Path(dir_okay=False), default=None, help='CSV of every divergence.')
+def main(samples, seed, tolerance, max_senders, output):
+    """Diffs the hook's fixed-point fee math against the float model."""
+    start = time.perf_counter()
+    divergences = fuzz(samples, seed, tolerance, max_senders)
+    seconds = time.perf_counter() - start
+    click.echo(f"{samples} samples in {seconds:.2f}s ({samples / seconds:,.0f}/s)")
+    for name, columns in divergences.items():
+        diverged = len(columns['sample'])
+        reverted = int(np.count_nonzero(columns['reverted']))
+        largest = columns['difference'][~columns['reverted']].max(initial=0.0)
+        click.echo(f"{name:<24} {diverged:>10} divergences ({diverged / samples:.2%}), "
+                   f"{reverted} reverted, largest difference {largest:.3g}")
+    if output is not None:
+        write_divergences(divergences, output)
+
+
+if __name__ == '__main__':
+    main()
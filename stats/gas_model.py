@@ -0,0 +1,172 @@
+"""
+Gas used by a swap through DammHook.
+
+The hook's gas grows with the number of fee submitters stored for the
+block (`senders`): `_storeSubmittedDeltaFee` pushes new senders to
+storage, the first swap of a block deletes the previous block's list, and
+`calculateCombinedFee` copies every sender's fee out of storage, bubble
+sorts them (O(senders²) comparisons) and scans `senders` again in
+`isSwapperInSenders`. `GasModel` prices a swap as
+
+    swap + new_sender + existing_sender + first_in_block + cleared_sender * previous senders
+    + fee_in_swap * (combined_fee + per_sender * senders + per_comparison * senders * (senders - 1) / 2)
+
+in gas units. `beforeSwap` currently has the `calculateCombinedFee` call
+commented out, so by default the `fee_in_swap` terms are left out, as in
+the deployed hook. The storage coefficients follow the EVM gas schedule
+(Cancun); `swap`, `combined_fee` and `per_comparison` are order of
+magnitude guesses. `from_snapshots` fits them to the snapshots written by
+`damm/test/DammHookGas.t.sol`, and `GasModel()` starts from the fit to
+the snapshots committed in `damm/forge-snapshots` when there are any:
+
+    cd damm && forge test --match-contract TestDammHookGas
+    python gas_report.py --snapshots ../damm/forge-snapshots
+
+`cost` turns gas into the simulation's cost unit by scaling a constant
+per-swap cost, taken as the cost of a swap with no senders.
+"""
+import functools
+import os
+import re
+import numpy as np
+
+# EVM gas schedule (EIP-2929, EIP-2200, EIP-3529)
+COLD_SLOAD = 2100
+WARM_SLOAD = 100
+SSTORE_SET = 20_000
+SSTORE_RESET = 2900
+
+DEFAULT_COEFFICIENTS = {
+    # NOTE: order of magnitude of a v4 swap through the test router, calibrate with `from_snapshots`
+    'swap': 120_000,
+    # mapping slot and array slot set from zero, array length updated
+    'new_sender': 2 * (COLD_SLOAD + SSTORE_SET) + SSTORE_RESET,
+    # max of the old and new fee written back
+    'existing_sender': COLD_SLOAD + SSTORE_RESET,
+    # both `blockNumbersStored` slots rotated
+    'first_in_block': 2 * (COLD_SLOAD + SSTORE_RESET),
+    # `delete senders` zeroes every slot, refunds ignored
+    'cleared_sender': COLD_SLOAD + SSTORE_RESET,
+    # oracle calls of the three `endogenousDynamicFee` evaluations and the fee arithmetic
+    'combined_fee': 15_000,
+    # copy (array slot and mapping slot), mean and variance loops, `isSwapperInSenders`
+    'per_sender': 2 * COLD_SLOAD + WARM_SLOAD + 200,
+    # one iteration of the bubble sort's inner loop in memory
+    'per_comparison': 60,
+}
+
+SWAP_COEFFICIENTS = ('swap', 'new_sender', 'existing_sender', 'first_in_block', 'cleared_sender')
+FEE_COEFFICIENTS = ('combined_fee', 'per_sender', 'per_comparison')
+
+# written by `forge test --match-contract TestDammHookGas` run in damm/
+SNAPSHOT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'damm', 'forge-snapshots')
+
+SNAPSHOT_NAMES = re.compile(r'^(swap_first_in_block_cleared|swap_new_sender_senders|'
+                            r'swap_existing_sender_senders|swap_no_fee_senders|combined_fee_senders)_(\d+)$')
+
+
+class GasModel:
+    def __init__(self, coefficients: dict[str, float]|None=None, fee_in_swap: bool=False) -> None:
+        """
+        Args:
+            coefficients: gas per term, the fit to the snapshots of
+                `SNAPSHOT_DIRECTORY` or else `DEFAULT_COEFFICIENTS` for the
+                missing ones.
+            fee_in_swap: whether swaps compute the combined fee. The hook's
+                `beforeSwap` currently leaves it out (commented), set it to
+                model a hook that calls it.
+        """
+        unknown = set(coefficients or ()) - set(DEFAULT_COEFFICIENTS)
+        if unknown:
+            raise ValueError(f"Unknown gas coefficients {sorted(unknown)}, choose from {list(DEFAULT_COEFFICIENTS)}.")
+        self.coefficients = {**DEFAULT_COEFFICIENTS, **repo_coefficients(), **(coefficients or {})}
+        self.fee_in_swap = fee_in_swap
+
+    def gas(self,
+            senders: int,
+            new_sender: bool=False,
+            existing_sender: bool=False,
+            first_in_block: bool=False,
+            previous_senders: int=0) -> float:
+        """
+        Gas of one swap.
+        Args:
+            senders: fee submitters stored for the block before the swap.
+            new_sender: the swap submits a fee and its swapper has not yet in this block.
+            existing_sender: the swap submits a fee and its swapper already has.
+            first_in_block: first swap of the block, clearing `previous_senders`.
+        """
+        c = self.coefficients
+        gas = c['swap']
+        if new_sender:
+            gas += c['new_sender']
+            senders += 1
+        elif existing_sender:
+            gas += c['existing_sender']
+        if first_in_block:
+            gas += c['first_in_block'] + c['cleared_sender'] * previous_senders
+        if self.fee_in_swap:
+            gas += c['combined_fee'] + c['per_sender'] * senders + c['per_comparison'] * senders * (senders - 1) / 2
+        return gas
+
+    def cost(self, gas_cost: float, *args, **kwargs) -> float:
+        """`gas_cost`, the cost of a swap with no senders, scaled to the gas of this swap (see `gas`)."""
+        return gas_cost * self.gas(*args, **kwargs) / self.gas(0)
+
+    @classmethod
+    def from_snapshots(cls, directory: str, fee_in_swap: bool=False) -> 'GasModel':
+        """
+        Least-squares fit of the coefficients to the `.snap` files of
+        `forge-gas-snapshot` named as in `DammHookGas.t.sol` (see
+        `fit_snapshots`). Coefficients without snapshots keep their defaults.
+        """
+        coefficients = fit_snapshots(directory)
+        if not coefficients:
+            raise ValueError(f"No DammHook gas snapshots in {directory}.")
+        return cls(coefficients, fee_in_swap)
+
+
+def fit_snapshots(directory: str) -> dict[str, float]:
+    """
+    Gas per term identified by the `.snap` files of `directory`, none if
+    it has no DammHook gas snapshots.
+    """
+    swap_rows, swap_gas, fee_rows, fee_gas = [], [], [], []
+    for filename in sorted(os.listdir(directory)):
+        match = SNAPSHOT_NAMES.match(os.path.splitext(filename)[0])
+        if match is None or not filename.endswith('.snap'):
+            continue
+        with open(os.path.join(directory, filename)) as f:
+            gas = float(f.read().strip())
+        kind, k = match.group(1), int(match.group(2))
+        if kind == 'combined_fee_senders':
+            # below two senders the hook returns before sorting
+            if k >= 2:
+                fee_rows.append([1, k, k * (k - 1) / 2])
+                fee_gas.append(gas)
+            continue
+        # swap, new_sender, existing_sender, first_in_block, cleared_sender
+        row = {'swap_first_in_block_cleared': [1, 1, 0, 1, k],
+               'swap_new_sender_senders': [1, 1, 0, 0, 0],
+               'swap_existing_sender_senders': [1, 0, 1, 0, 0],
+               'swap_no_fee_senders': [1, 0, 0, 0, 0]}[kind]
+        swap_rows.append(row)
+        swap_gas.append(gas)
+    coefficients = {}
+    for names, rows, gas in ((SWAP_COEFFICIENTS, swap_rows, swap_gas), (FEE_COEFFICIENTS, fee_rows, fee_gas)):
+        if not rows:
+            continue
+        rows = np.array(rows, dtype=np.float64)
+        # only the terms the snapshots vary are identified
+        identified = np.flatnonzero(np.any(rows != 0, axis=0))
+        solution = np.linalg.lstsq(rows[:, identified], np.array(gas), rcond=None)[0]
+        coefficients.update({names[i]: float(value) for i, value in zip(identified, solution)})
+    return coefficients
+
+
+@functools.cache
+def repo_coefficients() -> dict[str, float]:
+    """`fit_snapshots` of `SNAPSHOT_DIRECTORY`, none if it was not written."""
+    if not os.path.isdir(SNAPSHOT_DIRECTORY):
+        return {}
+    return fit_snapshots(SNAPSHOT_DIRECTORY)
@@ -0,0 +1,29 @@
+"""
+Command line report of the gas of a swap through DammHook, kept apart from
+`gas_model` so that the AMMs importing `GasModel` do not load click.
+
+    python gas_report.py --snapshots ../damm/forge-snapshots --with-fee
+"""
+import click
+from gas_model import GasModel
+
+
+@click.command()
+@click.option('--snapshots', type=click.Path(exists=True, file_okay=False), default=None,
+              help='forge-snapshots directory to calibrate from, estimates from the gas schedule otherwise.')
+@click.option('--senders', type=int, multiple=True, default=(0, 1, 2, 4, 8, 16, 32, 64, 100), show_default=True)
+@click.option('--with-fee', is_flag=True, help='Swaps compute the combined fee, unlike `beforeSwap` now.')
+def main(snapshots, senders, with_fee):
+    """Prints the coefficients and the gas of a swap by a new fee submitter per number of senders."""
+    model = GasModel(fee_in_swap=with_fee) if snapshots is None else \
+        GasModel.from_snapshots(snapshots, fee_in_swap=with_fee)
+    for name, value in model.coefficients.items():
+        click.echo(f"{name:<16} {value:>12,.0f}")
+    click.echo(f"{'senders':>8} {'gas':>12} {'x no senders':>13}")
+    for k in senders:
+        gas = model.gas(k, new_sender=True)
+        click.echo(f"{k:>8} {gas:>12,.0f} {gas / model.gas(0):>13.2f}")
+
+
+if __name__ == '__main__':
+    main()
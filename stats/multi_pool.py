@@ -0,0 +1,116 @@
+"""
+Many pools simulated together.
+
+Every pool is a lane of one `VectorizedAMM`: the state of all pools
+(price, fees, cut-off percentile, first-transaction flag, submitted fees,
+swapper intent) lives in contiguous arrays indexed by pool id, and all
+pools are stepped together per block, so the cost grows with the length
+of those arrays rather than with a number of Python objects.
+
+Pools differ in their parameters (`L`, `base_fee`, `alpha`, ...) and in
+the asset they trade. Assets follow correlated martingale GBMs; pools on
+the same asset see the same prices and the same CEX order book pressure
+but have their own swappers and submitted fees.
+"""
+import numpy as np
+from amm_parameters import DEFAULT_PARAMETERS
+from vectorized_simulation import VectorizedAMM, l1_order_book_pressure
+
+
+class MultiPoolSimulation:
+    number_of_swaps_in_block = 100
+    number_of_swappers = 1000
+
+    def __init__(self,
+                 initial_prices: np.ndarray,
+                 daily_sigmas: np.ndarray,
+                 correlation: np.ndarray,
+                 days: float,
+                 gas_cost: float,
+                 asset: np.ndarray,
+                 **parameters) -> None:
+        """
+        Args:
+            initial_prices, daily_sigmas: one per asset.
+            correlation: (assets, assets) correlation of the log-price increments.
+            asset: asset traded by each pool, defines the number of pools.
+            parameters: AMM parameters of `DEFAULT_PARAMETERS`, per pool or
+                one for all, the defaults for the others.
+        """
+        unknown = set(parameters) - set(DEFAULT_PARAMETERS)
+        if unknown:
+            raise ValueError(f"Unknown pool parameters {sorted(unknown)}, choose from {list(DEFAULT_PARAMETERS)}.")
+        self.initial_prices = np.asarray(initial_prices, dtype=np.float64)
+        self.blocks_per_day = 60 * 60 * 24 / 13.2
+        self.sigmas = np.asarray(daily_sigmas, dtype=np.float64) / np.sqrt(self.blocks_per_day)
+        self.correlation = np.asarray(correlation, dtype=np.float64)
+        # raises LinAlgError if `correlation` is not positive definite
+        self.cholesky = np.linalg.cholesky(self.correlation)
+        self.days = days
+        self.gas_cost = gas_cost
+        self.asset = np.asarray(asset, dtype=np.int64)
+        self.pools = self.asset.shape[0]
+        self.parameters = {name: np.broadcast_to(np.asarray(parameters.get(name, default), dtype=np.float64),
+                                                 (self.pools,))
+                           for name, default in DEFAULT_PARAMETERS.items()}
+
+    def amm(self, prices: np.ndarray) -> VectorizedAMM:
+        return VectorizedAMM(prices,
+                             **self.parameters,
+                             number_of_swappers=self.number_of_swappers,
+                             max_swaps_per_block=self.number_of_swaps_in_block)
+
+    def price_increments(self, rng: np.random.Generator) -> np.ndarray:
+        """Correlated, martingale-corrected log-price increments of all assets for one block."""
+        return self.sigmas * (self.cholesky @ rng.standard_normal(self.initial_prices.shape[0])) - self.sigmas**2 / 2
+
+    def do_simulation(self, seed: int|None=None) -> dict[str, np.ndarray]:
+        """
+        Returns:
+            Per pool and per day: lvr (as a positive number), arb's gain
+            (negative), gas burned and fee revenue (in Y tokens).
+        """
+        rng = np.random.default_rng(seed)
+        total_number_of_blocks = int(self.days * self.blocks_per_day)
+        asset_price = self.initial_prices.copy()
+        price = asset_price[self.asset]
+        amm = self.amm(price)
+        base_fee = self.parameters['base_fee'][:, None]
+        swapper_ids = np.broadcast_to(np.arange(1, self.number_of_swappers + 1),
+                                      (self.pools, self.number_of_swappers))
+        assets = asset_price.shape[0]
+        loss_versus_rebalancing = np.zeros(self.pools)
+        arbitrage_gain = np.zeros(self.pools)
+        gas = np.zeros(self.pools)
+        fee_revenue = np.zeros(self.pools)
+        for block in range(1, total_number_of_blocks):
+            asset_price = asset_price * np.exp(self.price_increments(rng))
+            next_price = asset_price[self.asset]
+            submitted_fees = rng.uniform(0.0, 1.0, (self.pools, self.number_of_swaps_in_block)) * base_fee
+            swappers = rng.permuted(swapper_ids, axis=1)[:, :self.number_of_swaps_in_block]
+            # one order book per asset
+            bid_size = rng.integers(1, 1001, assets)
+            ask_size = rng.integers(1, 1001, assets)
+            while np.any(equal := ask_size == bid_size):
+                ask_size[equal] = rng.integers(1, 1001, np.count_nonzero(equal))
+            pressure = l1_order_book_pressure(1.0, bid_size, ask_size)[self.asset]
+            if block > 1:
+                amm.end_block()
+            amm.begin_block(block - 1, pressure)
+            for swap in range(1, self.number_of_swaps_in_block):
+                x0, y0, f = amm.trade_to_price_with_gas_fee(
+                    efficient_off_chain_price=price,
+                    submitted_fee=submitted_fees[:, swap],
+                    swapper_id=swappers[:, swap],
+                    block_id=block-1,
+                    gas=self.gas_cost)
+                loss_versus_rebalancing += -x0 * next_price - y0
+                traded = x0 != 0.0
+                arbitrage_gain += np.where(traded, x0 * next_price + y0 - self.gas_cost, 0.0)
+                gas += np.where(traded, self.gas_cost, 0.0)
+                fee_revenue += f
+            price = next_price
+        return {'lvr': loss_versus_rebalancing / self.days,
+                'arbitrage_gain': arbitrage_gain / self.days,
+                'gas': gas / self.days,
+                'fee_revenue': fee_revenue / self.days}
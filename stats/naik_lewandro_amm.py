@@ -1,6 +1,8 @@
-import numpy as np
-import requests
 import math
+import logging
+from order_book_fetcher import OrderBookFetcher
+from order_statistics import SortedFees
+from swapper_registry import SwapperRegistry
 
 class AMM:
     def __init__(self, 
@@ -9,7 +11,9 @@ class AMM:
                  L, 
                  base_fee=0.003, 
                  m=0.5, 
-                 n=2, alpha=0.5, liquidity_threshold=100, intent_threshold=0.95, cex_api_url="https://api.cex.io/api/order_book/BTC/USD/"):
+                 n=2, alpha=0.5, liquidity_threshold=100, intent_threshold=0.95, intent_window=256, cex_api_url="https://api.cex.io/api/order_book/BTC/USD/",
+                 order_book_poll_interval=1.0, order_book_timeout=2.0):
+        self.logger = logging.getLogger(__class__.__name__)
         self.sqrt_price = sqrt_price
         self.pool_fee = pool_fee
         self.L = L
@@ -21,12 +25,14 @@ class AMM:
         self.liquidity_threshold = liquidity_threshold  # Threshold for low liquidity
         self.intent_threshold = intent_threshold  # Threshold for intent to trade
         self.cex_api_url = cex_api_url  # URL to fetch order book data from CEX
-        self.submitted_fees = []  # List to store submitted fees from swappers
-        self.previous_block_swappers = set()  # Set to store swappers who submitted a delta in the previous block
+        self.submitted_fees = SortedFees()  # Sorted submitted fees from swappers
         self.first_transaction = True  # Flag to track the first transaction
-        self.swapper_intent = {}  # Dictionary to track intent to trade
+        self.swapper_registry = SwapperRegistry(window=intent_window)  # Swappers per block over the last intent_window blocks
         self.total_blocks = 0  # Total number of blocks
         self.order_book_data = None  # Store order book data
+        # polls the CEX in a background thread, started by the first fetch
+        self.order_book_fetcher = OrderBookFetcher(cex_api_url, poll_interval=order_book_poll_interval,
+                                                   timeout=order_book_timeout)
 
     def x_price(self):
         return self.sqrt_price**2
@@ -42,10 +48,7 @@ class AMM:
         if submitted_fee is not None:
             self.submitted_fees.append(submitted_fee)
         if swapper_id is not None:
-            self.previous_block_swappers.add(swapper_id)
-            if swapper_id not in self.swapper_intent:
-                self.swapper_intent[swapper_id] = 0
-            self.swapper_intent[swapper_id] += 1
+            self.swapper_registry.record(swapper_id)
         if dx is not None:
             fee_percentage = self.calculate_combined_fee(swapper_id, dx, 'x')
             fee_adjusted_dx = dx * (1 - fee_percentage)
@@ -63,10 +66,7 @@ class AMM:
         if submitted_fee is not None:
             self.submitted_fees.append(submitted_fee)
         if swapper_id is not None:
-            self.previous_block_swappers.add(swapper_id)
-            if swapper_id not in self.swapper_intent:
-                self.swapper_intent[swapper_id] = 0
-            self.swapper_intent[swapper_id] += 1
+            self.swapper_registry.record(swapper_id)
         if dy is not None:
             fee_percentage = self.calculate_combined_fee(swapper_id, dy, 'y')
             fee_adjusted_dy = dy * (1 - fee_percentage)
@@ -88,12 +88,9 @@ class AMM:
     def exogenous_dynamic_fee(self, swapper_id):
         if len(self.submitted_fees) < 2:
             return self.base_fee
-        sorted_fees = sorted(self.submitted_fees)
-        cutoff_index = int(len(sorted_fees) * self.cut_off_percentile) # constant set in constructor to 0.85 - first time, will be amended top 15% will be discarded
-        filtered_fees = sorted_fees[:cutoff_index]
-        mean_fee = np.mean(filtered_fees)
-        sigma_fee = np.std(filtered_fees)
-        if swapper_id in self.previous_block_swappers: # identifies if former intent also led to swap loyal LT - to be improved by LaaS
+        # constant set in constructor to 0.85 - first time, will be amended top 15% will be discarded
+        mean_fee, sigma_fee = self.submitted_fees.trimmed_mean_and_std(self.cut_off_percentile)
+        if self.swapper_registry.in_current_block(swapper_id): # identifies if former intent also led to swap loyal LT - to be improved by LaaS
             dynamic_fee = mean_fee + self.m * sigma_fee  # Discounted fee
         else:
             dynamic_fee = self.n * sigma_fee  # Regular fee
@@ -134,8 +131,8 @@ class AMM:
         # Check for continuous intent to trade
         # might include pool_id to identify other types of pools for instance meme pools
         # swapper intent -> laas 
-        if swapper_id in self.swapper_intent:
-            intent_rate = self.swapper_intent[swapper_id] / self.total_blocks
+        if swapper_id in self.swapper_registry:
+            intent_rate = self.swapper_registry.intent_rate(swapper_id)
             if intent_rate >= self.intent_threshold:
                 combined_fee *= 0.9  # Apply additional discount for loyal swapper addresses in dict
        
@@ -149,20 +146,22 @@ class AMM:
         dx = self.trade_y(dy, submitted_fee, swapper_id)
         return dx
 
+    # non-blocking: takes the latest snapshot of the background fetcher,
+    # keeps the last good one while the CEX is slow or failing
     def fetch_order_book_data(self):
-        try:
-            response = requests.get(self.cex_api_url)
-            if response.status_code == 200:
-                self.order_book_data = response.json()
-            else:
-                print(f"Failed to fetch order book data: {response.status_code}")
-        except Exception as e:
-            print(f"Error fetching order book data: {e}")
+        if not self.order_book_fetcher.running:
+            self.order_book_fetcher.start()
+        if self.order_book_fetcher.latest() is not None:
+            self.order_book_data = self.order_book_fetcher.latest()
+        elif self.order_book_fetcher.last_error is not None:
+            self.logger.debug("No order book data yet: %s", self.order_book_fetcher.last_error)
 
     # where is the emm price on the cex going
     # chainlink or via own oracle
     # increasing protocol feels and share part with chainlink for getting data
     def process_order_book_data(self):
+        if self.order_book_fetcher.latest() is not None:
+            self.order_book_data = self.order_book_fetcher.latest()
         if self.order_book_data:
             # Example processing: Calculate L1 and L2 pressure
             bids = self.order_book_data['bids']
@@ -179,18 +178,22 @@ class AMM:
         # Fetch and process order book data at the beginning of each block
         self.fetch_order_book_data()
         l1_bid_pressure, l1_ask_pressure, l2_bid_pressure, l2_ask_pressure = self.process_order_book_data()
-        print(f"L1 Bid Pressure: {l1_bid_pressure}, L1 Ask Pressure: {l1_ask_pressure}")
-        print(f"L2 Bid Pressure: {l2_bid_pressure}, L2 Ask Pressure: {l2_ask_pressure}")
+        self.logger.debug("L1 Bid Pressure: %s, L1 Ask Pressure: %s", l1_bid_pressure, l1_ask_pressure)
+        self.logger.debug("L2 Bid Pressure: %s, L2 Ask Pressure: %s", l2_bid_pressure, l2_ask_pressure)
 
         # Clear the submitted fees at the end of each block
-        self.submitted_fees = []
-        # Clear the previous block swappers list
-        self.previous_block_swappers = set()
+        self.submitted_fees.clear()
+        # Close the block in the swapper registry, forgetting blocks outside the window
+        self.swapper_registry.end_block()
         # Increment the total number of blocks
         self.total_blocks += 1
         # Reset the first transaction flag
         self.first_transaction = True
 
+    def close(self):
+        # stops the background order book fetcher
+        self.order_book_fetcher.close()
+
     # difference between arbitrage and non-arbitrage swapper - nezlobin
     def trade_to_price_with_gas_fee(self, efficient_price: float, gas: float = 0.0) -> tuple[float, float, float]:
         """
@@ -0,0 +1,114 @@
+"""
+Background CEX order book fetcher.
+
+A daemon thread polls the order book endpoint through one pooled
+`requests.Session`, at most once per `poll_interval` seconds, and keeps the last
+good snapshot. Readers call `latest()`, which never waits on the network:
+a slow or failing endpoint only makes the snapshot older, and
+`last_error` tells why.
+"""
+import logging
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class OrderBookFetcher:
+    def __init__(self,
+                 url: str,
+                 poll_interval: float=1.0,
+                 timeout: float=2.0,
+                 session: requests.Session|None=None) -> None:
+        """
+        Args:
+            url: order book endpoint returning JSON with `bids` and `asks`.
+            poll_interval: seconds between the starts of two requests.
+            timeout: connect and read timeout of one request, in seconds.
+            session: shared session, a pooled one is created by default.
+        """
+        self.logger = logging.getLogger(__class__.__name__)
+        self.url = url
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        if session is None:
+            session = requests.Session()
+            session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+            session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self.session = session
+        self._snapshot = None
+        self.fetched_at = None
+        self.last_error = None
+        self.fetches = 0
+        self.errors = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def fetch(self) -> dict|None:
+        """
+        Fetches one snapshot in the calling thread.
+        Returns:
+            The snapshot, or None if the request failed; the last good
+            snapshot is kept either way.
+        """
+        self.fetches += 1
+        try:
+            response = self.session.get(self.url, timeout=self.timeout)
+            response.raise_for_status()
+            snapshot = response.json()
+        except (requests.RequestException, ValueError) as e:
+            self.errors += 1
+            self.last_error = e
+            self.logger.debug("Failed to fetch order book data: %s", e)
+            return None
+        # a single assignment, readers see either the old or the new snapshot
+        self._snapshot, self.fetched_at = snapshot, time.monotonic()
+        self.last_error = None
+        return snapshot
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            started = time.monotonic()
+            self.fetch()
+            self._stop.wait(max(0.0, self.poll_interval - (time.monotonic() - started)))
+
+    def start(self) -> 'OrderBookFetcher':
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='order-book-fetcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            # an in-flight request finishes within `timeout`
+            self._thread.join(self.timeout + self.poll_interval)
+            self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def latest(self) -> dict|None:
+        """Last good snapshot, None until the first fetch succeeded."""
+        return self._snapshot
+
+    def age(self) -> float|None:
+        """Seconds since the last good snapshot."""
+        return None if self.fetched_at is None else time.monotonic() - self.fetched_at
+
+    def is_fresh(self, max_age: float|None=None) -> bool:
+        """Whether the last good snapshot is at most `max_age` seconds old, one `poll_interval` by default."""
+        age = self.age()
+        return age is not None and age <= (self.poll_interval if max_age is None else max_age)
+
+    def close(self) -> None:
+        self.stop()
+        self.session.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
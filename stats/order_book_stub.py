@@ -0,0 +1,96 @@
+"""
+Local HTTP server replaying recorded order books, to run
+`OrderBookFetcher` and `naik_lewandro_amm.AMM` offline.
+
+    python order_book_stub.py recorded.json --latency 0.2 --port 8000
+
+The recorded file holds a JSON list of order book snapshots (or a single
+one), served in turn, one per request. `latency` and `status` can be
+changed while the server runs to inject slow responses and failures.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import click
+
+
+class StubOrderBookServer:
+    def __init__(self,
+                 snapshots: list[dict],
+                 latency: float=0.0,
+                 status: int=200,
+                 host: str='127.0.0.1',
+                 port: int=0) -> None:
+        """`port=0` picks a free port, see `url`."""
+        self.snapshots = snapshots
+        self.latency = latency
+        self.status = status
+        self.requests = 0
+        # handlers run on one thread per request
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                time.sleep(stub.latency)
+                with stub._lock:
+                    snapshot = stub.snapshots[stub.requests % len(stub.snapshots)]
+                    stub.requests += 1
+                body = json.dumps(snapshot).encode() if stub.status == 200 else b'{}'
+                self.send_response(stub.status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args) -> None:
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self) -> 'StubOrderBookServer':
+        self._thread = threading.Thread(target=self.server.serve_forever, name='order-book-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def load_snapshots(filename: str) -> list[dict]:
+    with open(filename) as f:
+        snapshots = json.load(f)
+    return snapshots if isinstance(snapshots, list) else [snapshots]
+
+
+@click.command()
+@click.argument('recorded', type=click.Path(exists=True, dir_okay=False))
+@click.option('--latency', type=float, default=0.0, show_default=True, help='Seconds added to every response.')
+@click.option('--port', type=int, default=8000, show_default=True)
+def main(recorded, latency, port):
+    """Serves the recorded order books in turn until interrupted."""
+    server = StubOrderBookServer(load_snapshots(recorded), latency=latency, port=port)
+    click.echo(f"serving {recorded} at {server.url}")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        server.server.server_close()
+
+
+if __name__ == '__main__':
+    main()
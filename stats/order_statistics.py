@@ -0,0 +1,82 @@
+import numpy as np
+
+
+class SortedFees:
+    """
+    Submitted fees of a block, kept sorted with prefix sums of x and x**2.
+    The sums are taken around the first fee of the block, which keeps the
+    variance from cancelling out when the fees are close together.
+
+    `append` is a binary search plus one memmove/cumsum of the tail in C,
+    `trimmed_mean_and_std` is O(1) for any cut-off percentile, so the cut-off
+    may move between swaps without re-sorting anything.
+    """
+    def __init__(self, capacity: int=128) -> None:
+        self._fees = np.empty(capacity)
+        # _sum[i] and _sum_of_squares[i] hold the sums of the i smallest fees
+        self._sum = np.zeros(capacity + 1)
+        self._sum_of_squares = np.zeros(capacity + 1)
+        self._size = 0
+        self._shift = 0.0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self):
+        return iter(self._fees[:self._size].tolist())
+
+    def _grow(self) -> None:
+        capacity = 2 * self._fees.shape[0]
+        self._fees = np.resize(self._fees, capacity)
+        self._sum = np.resize(self._sum, capacity + 1)
+        self._sum_of_squares = np.resize(self._sum_of_squares, capacity + 1)
+
+    def append(self, fee: float) -> None:
+        if self._size == self._fees.shape[0]:
+            self._grow()
+        n = self._size
+        if n == 0:
+            self._shift = fee
+        position = int(np.searchsorted(self._fees[:n], fee, side='right'))
+        self._fees[position + 1:n + 1] = self._fees[position:n]
+        self._fees[position] = fee
+        tail = self._fees[position:n + 1] - self._shift
+        np.cumsum(tail, out=self._sum[position + 1:n + 2])
+        self._sum[position + 1:n + 2] += self._sum[position]
+        np.cumsum(tail * tail, out=self._sum_of_squares[position + 1:n + 2])
+        self._sum_of_squares[position + 1:n + 2] += self._sum_of_squares[position]
+        self._size = n + 1
+
+    def clear(self) -> None:
+        self._size = 0
+
+    def snapshot(self) -> tuple:
+        """Copy of the fees and their sums, for `restore`."""
+        n = self._size
+        return (self._fees[:n].copy(), self._sum[:n + 1].copy(), self._sum_of_squares[:n + 1].copy(), self._shift)
+
+    def restore(self, snapshot: tuple) -> None:
+        fees, sums, sums_of_squares, self._shift = snapshot
+        n = fees.shape[0]
+        while self._fees.shape[0] < n:
+            self._grow()
+        self._fees[:n] = fees
+        self._sum[:n + 1] = sums
+        self._sum_of_squares[:n + 1] = sums_of_squares
+        self._size = n
+
+    def trimmed_mean_and_std(self, cut_off_percentile: float) -> tuple[float, float]:
+        """
+        Mean and (population) standard deviation of the lowest
+        `int(len(self) * cut_off_percentile)` fees: np.mean/np.std of
+        `sorted(fees)[:cutoff_index]` within 1e-13 of the largest fee for the
+        mean and within sqrt(len(self) * 2.2e-16) of the largest distance to
+        the first fee of the block for the std, whose variance cancels out
+        when the trimmed fees are nearly equal (4.7e-7 of it for 1000 fees).
+        """
+        cutoff_index = int(self._size * cut_off_percentile)
+        if cutoff_index == 0:
+            return float('nan'), float('nan')
+        mean_shifted_fee = self._sum[cutoff_index] / cutoff_index
+        variance = self._sum_of_squares[cutoff_index] / cutoff_index - mean_shifted_fee * mean_shifted_fee
+        return float(self._shift + mean_shifted_fee), float(np.sqrt(max(variance, 0.0)))
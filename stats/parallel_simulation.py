@@ -0,0 +1,107 @@
+"""
+Process-pool runner for `Simulation`.
+
+Path `i` always draws from `Generator(PCG64(root.spawn(paths)[i]))` of a
+single root `SeedSequence`, so the result only depends on the seed and
+not on how many workers ran it or in which order shards finished.
+With a `summary`, every shard keeps its own `ResultsSummary`, sent back
+with its totals (a few kB whatever the number of blocks) and merged in
+shard order.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from simulation import Simulation
+from amm_kernel import amm_params, simulate_path, simulate_path_summary
+from sketches import ResultsSummary
+from price_paths import path_rng
+
+
+def simulate_paths(entropy: int,
+                   first_path: int,
+                   last_path: int,
+                   initial_price: float,
+                   sigma: float,
+                   total_number_of_blocks: int,
+                   params: np.ndarray,
+                   gas_cost: float,
+                   summary_k: int|None=None) -> tuple[int, int, np.ndarray, ResultsSummary|None]:
+    """
+    Runs paths `first_path`..`last_path - 1`, each on its own stream.
+    Args:
+        summary_k: `k` of the shard's `ResultsSummary`, None for no summary.
+    Returns:
+        first_path, last_path, the (3, last_path - first_path) totals and
+        the summary of the shard.
+    """
+    results = np.zeros((3, last_path - first_path))
+    summary = None if summary_k is None else ResultsSummary(summary_k, seed=[entropy, first_path])
+    for i, path in enumerate(range(first_path, last_path)):
+        if summary is None:
+            results[:, i] = simulate_path(path_rng(entropy, path),
+                                          initial_price,
+                                          sigma,
+                                          total_number_of_blocks,
+                                          params,
+                                          gas_cost)
+        else:
+            results[:, i] = simulate_path_summary(path_rng(entropy, path),
+                                                  initial_price,
+                                                  sigma,
+                                                  total_number_of_blocks,
+                                                  params,
+                                                  gas_cost,
+                                                  summary)
+    return first_path, last_path, results, summary
+
+
+class ParallelSimulation(Simulation):
+    """
+    `Simulation` sharded over a process pool.
+    """
+    def do_simulation(self,
+                      seed: int|None=None,
+                      max_workers: int|None=None,
+                      paths_per_task: int|None=None,
+                      summary: ResultsSummary|None=None) -> np.ndarray:
+        """
+        Same (3, paths) layout as `Simulation.do_simulation`. The root
+        entropy is kept in `self.entropy`, so a run with `seed=None`
+        can be reproduced. The shard summaries are merged into `summary`,
+        if given.
+        """
+        self.entropy = np.random.SeedSequence(seed).entropy
+        max_workers = max_workers or os.cpu_count() or 1
+        # a few tasks per worker so stragglers do not hold up the pool
+        paths_per_task = paths_per_task or max(1, self.paths // (4 * max_workers))
+        sigma = self.daily_sigma/np.sqrt(self.blocks_per_day)
+        total_number_of_blocks = int(self.days * self.blocks_per_day)
+        params = amm_params(L=166_666.67,
+                            base_fee=0.003,
+                            m=0.5,
+                            n=2,
+                            alpha=0.5,
+                            intent_threshold=0.95)
+        results = np.zeros((3, self.paths))
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(simulate_paths,
+                                       self.entropy,
+                                       first_path,
+                                       min(first_path + paths_per_task, self.paths),
+                                       float(self.initial_price),
+                                       sigma,
+                                       total_number_of_blocks,
+                                       params,
+                                       self.gas_cost,
+                                       None if summary is None else summary.k)
+                       for first_path in range(0, self.paths, paths_per_task)]
+            # merge shards as they finish
+            shard_summaries = {}
+            for future in as_completed(futures):
+                first_path, last_path, totals, shard_summaries[first_path] = future.result()
+                results[:, first_path:last_path] = totals / self.days
+        if summary is not None:
+            # in shard order, the compactions of a merge depend on the order
+            for first_path in sorted(shard_summaries):
+                summary.merge(shard_summaries[first_path])
+        return results
@@ -0,0 +1,141 @@
+"""
+Parameter sweeps with common random numbers.
+
+Every configuration of the grid is evaluated against the same price
+paths, submitted fees, swappers and order book pressures: the draws of
+each path are made once per block and tiled over all configurations,
+which are then stepped together by the vectorized engine. Submitted fees
+are drawn as a fraction of the base fee, so configurations with another
+`base_fee` still share them.
+"""
+import csv
+import itertools
+import click
+import numpy as np
+from amm_parameters import DEFAULT_PARAMETERS
+from vectorized_simulation import VectorizedAMM, VectorizedSimulation
+
+
+def configurations(grid: dict[str, list]) -> list[dict]:
+    """Cartesian product of `grid`, filled up with `DEFAULT_PARAMETERS`."""
+    unknown = set(grid) - set(DEFAULT_PARAMETERS)
+    if unknown:
+        raise ValueError(f"Cannot sweep {sorted(unknown)}, choose from {list(DEFAULT_PARAMETERS)}.")
+    names = list(grid)
+    return [{**DEFAULT_PARAMETERS, **dict(zip(names, values))}
+            for values in itertools.product(*(grid[name] for name in names))]
+
+
+class ParameterSweep(VectorizedSimulation):
+    """
+    Runs `paths` paths for every configuration of `grid`, as
+    `len(configurations) * paths` lanes of one vectorized simulation.
+    """
+    def __init__(self,
+                 initial_price: float,
+                 daily_sigma: float,
+                 days: int,
+                 gas_cost: float,
+                 liquidity_per_basis_point: float,
+                 base_pool_fee: float,
+                 paths: int,
+                 grid: dict[str, list]) -> None:
+        self.configurations = configurations(grid)
+        self.paths_per_configuration = paths
+        super().__init__(initial_price,
+                         daily_sigma,
+                         days,
+                         gas_cost,
+                         liquidity_per_basis_point,
+                         base_pool_fee,
+                         len(self.configurations) * paths)
+
+    def lanes(self, name: str) -> np.ndarray:
+        """Value of parameter `name` for every lane."""
+        return np.repeat([configuration[name] for configuration in self.configurations],
+                         self.paths_per_configuration).astype(np.float64)
+
+    def amm(self, prices: np.ndarray) -> VectorizedAMM:
+        return VectorizedAMM(prices,
+                             **{name: self.lanes(name) for name in DEFAULT_PARAMETERS},
+                             number_of_swappers=self.number_of_swappers,
+                             max_swaps_per_block=self.number_of_swaps_in_block)
+
+    def draw_blocks(self, rng: np.random.Generator, paths: int|None=None):
+        """
+        Draws each block once for `paths_per_configuration` paths and
+        repeats it for every configuration.
+        """
+        repeats = len(self.configurations)
+        submitted_fee_scale = (self.lanes('base_fee') / 0.003)[:, None]
+        for increment, submitted_fees, swappers, pressure in super().draw_blocks(rng, self.paths_per_configuration):
+            yield (np.tile(increment, repeats),
+                   np.tile(submitted_fees, (repeats, 1)) * submitted_fee_scale,
+                   np.tile(swappers, (repeats, 1)),
+                   np.tile(pressure, repeats))
+
+    def do_simulation(self, seed: int|None=None) -> np.ndarray:
+        """
+        Returns:
+            (3, configurations, paths) array of lvr, arb's gain and gas per day.
+        """
+        return super().do_simulation(seed).reshape(3, len(self.configurations), self.paths_per_configuration)
+
+    def results_table(self, results: np.ndarray) -> list[dict]:
+        """One row per configuration and path."""
+        return [{'configuration': i,
+                 **configuration,
+                 'path': path,
+                 'lvr': results[0, i, path],
+                 'arbitrage_gain': results[1, i, path],
+                 'gas': results[2, i, path]}
+                for i, configuration in enumerate(self.configurations)
+                for path in range(self.paths_per_configuration)]
+
+
+def write_results_table(rows: list[dict], filename: str) -> None:
+    with open(filename, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def parse_grid(parameters: tuple[str]) -> dict[str, list]:
+    """`("alpha=0.3,0.5", "m=0.5")` -> `{"alpha": [0.3, 0.5], "m": [0.5]}`"""
+    grid = {}
+    for parameter in parameters:
+        name, _, values = parameter.partition('=')
+        if not values:
+            raise click.BadParameter(f"expected name=value[,value...], got {parameter!r}")
+        if name.strip() not in DEFAULT_PARAMETERS:
+            raise click.BadParameter(f"cannot sweep {name.strip()!r}, choose from {list(DEFAULT_PARAMETERS)}")
+        grid[name.strip()] = [float(value) for value in values.split(',')]
+    return grid
+
+
+@click.command()
+@click.option('--parameter', '-p', 'parameters', multiple=True,
+              help='Swept parameter as name=value[,value...], e.g. -p alpha=0.3,0.5 -p base_fee=0.003,0.005.')
+@click.option('--initial-price', type=float, required=True)
+@click.option('--daily-sigma', type=float, required=True)
+@click.option('--days', type=float, default=1.0, show_default=True)
+@click.option('--gas-cost', type=float, required=True)
+@click.option('--paths', type=int, default=100, show_default=True, help='Paths per configuration.')
+@click.option('--seed', type=int, default=None)
+@click.option('--output', type=click.Path(dir_okay=False), default='sweep.csv', show_default=True)
+def main(parameters, initial_price, daily_sigma, days, gas_cost, paths, seed, output):
+    """Evaluates every configuration of the grid on the same random draws."""
+    sweep = ParameterSweep(initial_price,
+                           daily_sigma,
+                           days,
+                           gas_cost,
+                           liquidity_per_basis_point=DEFAULT_PARAMETERS['L'],
+                           base_pool_fee=DEFAULT_PARAMETERS['base_fee'],
+                           paths=paths,
+                           grid=parse_grid(parameters))
+    write_results_table(sweep.results_table(sweep.do_simulation(seed)), output)
+    click.echo(f"{len(sweep.configurations)} configurations x {paths} paths -> {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Snapshot of the mutable state of an `AMM`, for what-if searches:
+
+    state = amm.snapshot()
+    for split in splits:
+        ...  # trades on amm
+        amm.restore(state)
+
+A snapshot can be restored any number of times. Static parameters (L,
+base fee, m, n, alpha, ...) and the price feed are not part of it, nor
+the block cache, which `restore` clears. To price a single swap without
+trading, `AMM.quote` needs no snapshot.
+"""
+
+SCALARS = ('sqrt_price',
+           'current_block_id',
+           'total_blocks',
+           'price_before_previous_block',
+           'price_after_previous_block',
+           'pool_fee',
+           'pool_fee_in_market_direction',
+           'pool_fee_in_opposite_direction',
+           'endogenous_fee',
+           'exogenous_fee',
+           'combined_fee',
+           'cut_off_percentile',
+           'first_transaction',
+           'order_bool_pressure',
+           'price_x_before_swap',
+           'price_x_after_swap',
+           'gas_charged',
+           'previous_block_senders',
+           'first_swap_in_block')
+
+
+class PoolState:
+    __slots__ = (*SCALARS, 'submitted_fees', 'swapper_registry', 'hook_senders')
+
+    @classmethod
+    def capture(cls, amm) -> 'PoolState':
+        state = cls()
+        for name in SCALARS:
+            setattr(state, name, getattr(amm, name))
+        state.submitted_fees = amm.submitted_fees.snapshot()
+        state.swapper_registry = amm.swapper_registry.snapshot()
+        state.hook_senders = frozenset(amm.hook_senders)
+        return state
+
+    def restore(self, amm) -> None:
+        for name in SCALARS:
+            setattr(amm, name, getattr(self, name))
+        amm.submitted_fees.restore(self.submitted_fees)
+        amm.swapper_registry.restore(self.swapper_registry)
+        amm.hook_senders = set(self.hook_senders)
+        amm.block_cache.clear()
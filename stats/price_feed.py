@@ -1,11 +1,30 @@
+"""
+Order book pressure feeds.
+
+`PriceFeed` draws a fresh L1 order book from `random` at every block.
+`PressureSeries` holds the pressure of every block of a path in one
+array, either simulated in one vectorized draw or computed from recorded
+order book snapshots, so that a block's pressure is an array lookup and
+a run can be replayed. Both feeds are used through `pressure(block_id)`.
+"""
+import csv
+import os
 import random
+import numpy as np
+
+
+def l1_order_book_pressure(bid_price, bid_size, ask_price, ask_size):
+    """Ask minus bid notional over their sum, for floats or arrays."""
+    return (ask_size * ask_price - bid_size * bid_price) /\
+        (ask_size * ask_price + bid_size * bid_price)
+
 
 class PriceFeed:
     def __init__(self,
                  efficient_off_chain_price: float) -> None:
         self.efficient_off_chain_price = efficient_off_chain_price
         self.half_spread = 0.005
-   
+
     def simulate_l1_order_book(self) -> None:
         self.bid_size = random.randint(1, 1000)
         self.bid_price = self.efficient_off_chain_price * (1 - self.half_spread)
@@ -15,5 +34,111 @@ class PriceFeed:
             self.ask_size = random.randint(1, 1000)
 
     def l1_order_book_pressure(self) -> float:
-        return (self.ask_size * self.ask_price - self.bid_size * self.bid_price) /\
-            (self.ask_size * self.ask_price + self.bid_size * self.bid_price)
+        return l1_order_book_pressure(self.bid_price, self.bid_size, self.ask_price, self.ask_size)
+
+    def pressure(self, block_id: int) -> float:
+        """Pressure of a freshly simulated order book, `block_id` is ignored."""
+        self.simulate_l1_order_book()
+        return self.l1_order_book_pressure()
+
+
+class PressureSeries:
+    """
+    Order book pressure of blocks `first_block`, `first_block + 1`, ...
+    """
+    # columns of recorded snapshots, one row per block
+    L1_COLUMNS = ('bid_price', 'bid_size', 'ask_price', 'ask_size')
+    L2_COLUMNS = ('bid_price_2', 'bid_size_2', 'ask_price_2', 'ask_size_2')
+
+    def __init__(self, pressures: np.ndarray, first_block: int=0) -> None:
+        self.pressures = pressures
+        self.first_block = first_block
+
+    def __len__(self) -> int:
+        return self.pressures.shape[0]
+
+    def pressure(self, block_id: int) -> float:
+        if block_id < self.first_block:
+            raise IndexError(f"Block {block_id} is before the first block {self.first_block} of the series.")
+        return float(self.pressures[block_id - self.first_block])
+
+    @classmethod
+    def simulate(cls,
+                 rng: np.random.Generator,
+                 blocks: int,
+                 half_spread: float=0.005,
+                 first_block: int=0) -> 'PressureSeries':
+        """
+        Draws the L1 order books of all blocks at once, with the
+        distribution of `PriceFeed`: bid and ask sizes uniform in 1..1000
+        and never equal.
+        """
+        bid_size = rng.integers(1, 1001, blocks)
+        ask_size = rng.integers(1, 1001, blocks)
+        while np.any(equal := ask_size == bid_size):
+            ask_size[equal] = rng.integers(1, 1001, np.count_nonzero(equal))
+        # the pressure does not depend on the price level
+        return cls(l1_order_book_pressure(1 - half_spread, bid_size, 1 + half_spread, ask_size), first_block)
+
+    @classmethod
+    def from_snapshots(cls, snapshots: dict, levels: int=1, first_block: int=0) -> 'PressureSeries':
+        """
+        Pressure of recorded order books, given as columns `L1_COLUMNS`
+        (and `L2_COLUMNS` for `levels=2`) with one row per block.
+        """
+        if levels not in (1, 2):
+            raise ValueError(f"levels must be 1 or 2, got {levels}.")
+        columns = cls.L1_COLUMNS + (cls.L2_COLUMNS if levels == 2 else ())
+        missing = [name for name in columns if name not in snapshots]
+        if missing:
+            raise ValueError(f"Order book snapshots are missing the columns {missing}.")
+        bid_price, bid_size, ask_price, ask_size = (np.asarray(snapshots[name], dtype=np.float64)
+                                                    for name in cls.L1_COLUMNS)
+        bid = bid_size * bid_price
+        ask = ask_size * ask_price
+        if levels == 2:
+            bid_price, bid_size, ask_price, ask_size = (np.asarray(snapshots[name], dtype=np.float64)
+                                                        for name in cls.L2_COLUMNS)
+            bid = bid + bid_size * bid_price
+            ask = ask + ask_size * ask_price
+        return cls((ask - bid) / (ask + bid), first_block)
+
+    @classmethod
+    def load(cls, filename: str, levels: int=1, first_block: int=0) -> 'PressureSeries':
+        """
+        Memory-maps the pressures of a recorded file.
+
+        A `.npy` file is taken as the pressure series itself. Snapshots in
+        `.npz`, `.csv` or `.parquet` files are converted once to a
+        `<filename>.l<levels>.npy` cache next to them, which is mapped on
+        later loads until the source file changes.
+        """
+        if filename.endswith('.npy'):
+            return cls(np.load(filename, mmap_mode='r'), first_block)
+        cache = f"{filename}.l{levels}.npy"
+        if not os.path.exists(cache) or os.path.getmtime(cache) < os.path.getmtime(filename):
+            np.save(cache, cls.from_snapshots(read_snapshots(filename), levels).pressures)
+        return cls(np.load(cache, mmap_mode='r'), first_block)
+
+    def save(self, filename: str) -> None:
+        np.save(filename, np.asarray(self.pressures, dtype=np.float64))
+
+
+def read_snapshots(filename: str) -> dict[str, np.ndarray]:
+    """Columns of an `.npz`, `.csv` (with a header row) or `.parquet` file."""
+    if filename.endswith('.npz'):
+        with np.load(filename) as data:
+            return {name: data[name] for name in data.files}
+    if filename.endswith('.csv'):
+        with open(filename, newline='') as f:
+            reader = csv.reader(f)
+            header = [name.strip() for name in next(reader)]
+            values = np.array([[float(value) for value in row] for row in reader if row], dtype=np.float64)
+        values = values.reshape(-1, len(header))
+        return {name: values[:, i] for i, name in enumerate(header)}
+    if filename.endswith('.parquet'):
+        # optional dependency, only needed for parquet files
+        import pyarrow.parquet as pq
+        table = pq.read_table(filename)
+        return {name: table.column(name).to_numpy() for name in table.column_names}
+    raise ValueError(f"Unsupported order book file {filename}, expected .npy, .npz, .csv or .parquet.")
@@ -0,0 +1,130 @@
+"""
+Chunked GBM price paths.
+
+`GBMPricePaths.chunks` yields a path in fixed-size block chunks, carrying
+the running log-price across chunk boundaries. For the same random
+stream it returns exactly (bit for bit) the martingale-corrected path of
+`Simulation.do_simulation`:
+
+    z = np.cumsum(rng.normal(0.0, sigma, total_number_of_blocks))
+    prices = np.exp(z - (np.arange(total_number_of_blocks) * sigma**2)/2)
+    prices = (prices / prices[0]) * p0
+
+but only ever holds one chunk in memory. Paths can be written to a
+memory-mapped `.npy` file and reused between runs, and mirrored by
+`antithetic` for variance reduction.
+"""
+import json
+import os
+import numpy as np
+
+
+def path_rng(entropy: int, path: int) -> np.random.Generator:
+    """The generator of `path`, same as `SeedSequence(entropy).spawn(...)[path]`."""
+    return np.random.default_rng(np.random.SeedSequence(entropy, spawn_key=(path,)))
+
+
+class GBMPricePaths:
+    def __init__(self,
+                 initial_price: float,
+                 daily_sigma: float,
+                 days: float,
+                 blocks_per_day: float=60 * 60 * 24 / 13.2,
+                 chunk_size: int=65_536) -> None:
+        self.initial_price = initial_price
+        self.daily_sigma = daily_sigma
+        self.days = days
+        self.blocks_per_day = blocks_per_day
+        self.chunk_size = chunk_size
+        # volatility @ block level
+        self.sigma = daily_sigma/np.sqrt(blocks_per_day)
+        self.total_number_of_blocks = int(days * blocks_per_day)
+
+    def chunks(self, rng):
+        """
+        Yields the prices of one path, `chunk_size` blocks at a time.
+        `rng` is a numpy Generator, RandomState or the `np.random` module.
+        """
+        sigma = self.sigma
+        log_price = 0.0
+        first_price = None
+        for start in range(0, self.total_number_of_blocks, self.chunk_size):
+            stop = min(start + self.chunk_size, self.total_number_of_blocks)
+            z = rng.normal(0.0, sigma, stop - start)
+            # continue the cumulative sum of the previous chunks
+            z[0] += log_price
+            np.cumsum(z, out=z)
+            log_price = z[-1]
+            # adding a risk-neutral drift, so that the price process is a martingale
+            z -= (np.arange(start, stop) * sigma**2)/2
+            prices = np.exp(z, out=z)
+            if first_price is None:
+                first_price = prices[0]
+            prices /= first_price
+            prices *= self.initial_price
+            yield prices
+
+    def path(self, rng) -> np.ndarray:
+        prices = np.empty(self.total_number_of_blocks)
+        start = 0
+        for chunk in self.chunks(rng):
+            prices[start:start + chunk.shape[0]] = chunk
+            start += chunk.shape[0]
+        return prices
+
+    def antithetic(self, prices: np.ndarray) -> np.ndarray:
+        """
+        The mirror image of a path drawn with this `sigma`: every normal
+        draw negated, so the pair has equal law and negatively correlated
+        log-returns. The martingale drift is kept.
+        """
+        increments = -np.diff(np.log(prices)) - self.sigma**2
+        mirrored = np.empty_like(prices)
+        mirrored[0] = prices[0]
+        mirrored[1:] = prices[0] * np.exp(np.cumsum(increments))
+        return mirrored
+
+    def _metadata(self, paths: int, entropy: int) -> dict:
+        return {'initial_price': self.initial_price,
+                'daily_sigma': self.daily_sigma,
+                'days': self.days,
+                'blocks_per_day': self.blocks_per_day,
+                'paths': paths,
+                'entropy': entropy}
+
+    def write_memmap(self, filename: str, paths: int, seed: int|None=None) -> np.memmap:
+        """
+        Writes `paths` paths, path `i` drawn from `path_rng(entropy, i)`, to a
+        (paths, total_number_of_blocks) `.npy` file chunk by chunk, plus a
+        `.json` file next to it with the parameters and the root entropy.
+        """
+        entropy = np.random.SeedSequence(seed).entropy
+        # NOTE: the old sidecar goes first and the paths are written aside,
+        # so an interrupted write never leaves a sidecar matching other data
+        if os.path.exists(filename + '.json'):
+            os.remove(filename + '.json')
+        prices = np.lib.format.open_memmap(filename + '.tmp', mode='w+', dtype=np.float64,
+                                           shape=(paths, self.total_number_of_blocks))
+        for path in range(paths):
+            start = 0
+            for chunk in self.chunks(path_rng(entropy, path)):
+                prices[path, start:start + chunk.shape[0]] = chunk
+                start += chunk.shape[0]
+        prices.flush()
+        del prices
+        os.replace(filename + '.tmp', filename)
+        with open(filename + '.json', 'w') as f:
+            json.dump(self._metadata(paths, entropy), f)
+        return np.load(filename, mmap_mode='r+')
+
+    def open_memmap(self, filename: str, paths: int, seed: int|None=None) -> np.memmap:
+        """
+        Read-only paths from `filename`, written first if the file is missing
+        or was generated with other parameters or another seed.
+        """
+        if seed is not None and os.path.exists(filename + '.json'):
+            with open(filename + '.json') as f:
+                if json.load(f) == self._metadata(paths, np.random.SeedSequence(seed).entropy):
+                    return np.load(filename, mmap_mode='r')
+        self.write_memmap(filename, paths, seed)
+        return np.load(filename, mmap_mode='r')
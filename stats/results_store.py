@@ -0,0 +1,115 @@
+"""
+Per-block simulation results on disk.
+
+`ResultsRecorder` streams one row per path and block to a columnar table
+(see `columnar`), written in chunks of `chunk_rows` rows so that memory
+stays flat however long the run. `ResultsReader` maps the table back and
+loads only the requested columns and paths.
+
+    with ResultsRecorder('results') as recorder:
+        Simulation(...).do_simulation(recorder=recorder)
+    ResultsReader('results').select(['block', 'combined_fee'], paths=range(3, 5))
+"""
+import numpy as np
+from columnar import ColumnarSink, read_columns
+
+# column -> dtype, in row order
+COLUMNS = {'path': 'i4',
+           'block': 'i8',
+           # pool price after the block's swaps
+           'pool_price': 'f8',
+           # off-chain price the block's swaps trade against
+           'efficient_price': 'f8',
+           # fee components of the block's last swap
+           'combined_fee': 'f8',
+           'endogenous_fee': 'f8',
+           'exogenous_fee': 'f8',
+           'cut_off_percentile': 'f8',
+           # sums over the block's swaps
+           'x': 'f8',
+           'y': 'f8',
+           'fee': 'f8',
+           'gas': 'f8'}
+
+
+class ResultsRecorder:
+    def __init__(self, directory: str, chunk_rows: int=65_536) -> None:
+        self.sink = ColumnarSink(directory, COLUMNS, buffer_rows=chunk_rows)
+
+    def record_block(self,
+                     path: int,
+                     block: int,
+                     pool_price: float,
+                     efficient_price: float,
+                     combined_fee: float,
+                     endogenous_fee: float,
+                     exogenous_fee: float,
+                     cut_off_percentile: float,
+                     x: float,
+                     y: float,
+                     fee: float,
+                     gas: float) -> None:
+        self.sink.append(path, block, pool_price, efficient_price, combined_fee, endogenous_fee,
+                         exogenous_fee, cut_off_percentile, x, y, fee, gas)
+
+    def record_blocks(self, **columns: np.ndarray) -> None:
+        """One block of many paths, or many blocks, as arrays named after `COLUMNS`."""
+        rows = max(np.size(value) for value in columns.values())
+        self.sink.append_rows(*(np.broadcast_to(columns[name], (rows,)) for name in COLUMNS))
+
+    def close(self) -> None:
+        self.sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class ResultsReader:
+    def __init__(self, directory: str) -> None:
+        # memory-mapped, nothing is read until a column is indexed
+        self.table = read_columns(directory)
+
+    @property
+    def columns(self) -> list[str]:
+        return list(self.table)
+
+    def __len__(self) -> int:
+        return self.table['path'].shape[0]
+
+    def column(self, name: str) -> np.ndarray:
+        return self.table[name]
+
+    def paths(self, chunk_rows: int=1 << 20) -> np.ndarray:
+        """Sorted distinct path ids, scanning the path column chunk by chunk."""
+        path_column = self.table['path']
+        paths = np.empty(0, dtype=path_column.dtype)
+        for start in range(0, len(self), chunk_rows):
+            paths = np.union1d(paths, path_column[start:start + chunk_rows])
+        return paths
+
+    def rows(self, paths, chunk_rows: int=1 << 20) -> np.ndarray:
+        """Indices of the rows of `paths`, scanning the path column chunk by chunk."""
+        paths = np.asarray(list(paths) if isinstance(paths, range) else paths)
+        path_column = self.table['path']
+        return np.concatenate([np.flatnonzero(np.isin(path_column[start:start + chunk_rows], paths)) + start
+                               for start in range(0, max(len(self), 1), chunk_rows)])
+
+    def select(self, columns: list[str]|None=None, paths=None) -> dict[str, np.ndarray]:
+        """
+        Args:
+            columns: names of the columns to load, all by default.
+            paths: path ids (e.g. a range) to load, all by default.
+        Returns:
+            Column name -> array, in recording order.
+        """
+        columns = columns or self.columns
+        unknown = set(columns) - set(self.table)
+        if unknown:
+            raise ValueError(f"Unknown columns {sorted(unknown)}, choose from {self.columns}.")
+        if paths is None:
+            return {name: np.asarray(self.table[name]) for name in columns}
+        rows = self.rows(paths)
+        return {name: self.table[name][rows] for name in columns}
@@ -1,13 +1,12 @@
-mport random
+import random
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib import ticker as mticker
-import seaborn as sns
 from math import sqrt
-from numba import njit, float64
-from numba.experimental import jitclass
-from amm import AMM
-import click
+from amm_modified import AMM
+from price_paths import GBMPricePaths
+from results_store import ResultsRecorder
+from gas_model import GasModel
+from checkpoint import SimulationCheckpoint
+from sketches import ResultsSummary
 
 
 class Simulation:
@@ -18,7 +17,13 @@ class Simulation:
                  gas_cost: float,
                  liquidity_per_basis_point: float,
                  base_pool_fee: float,
-                 paths: int) -> None:
+                 paths: int,
+                 gas_model: GasModel|None=None) -> None:
+        """
+        Args:
+            gas_cost: cost of an arbitrage swap, scaled per swap by
+                `gas_model`, if given, to the hook's fee submitters in the block.
+        """
         self.initial_price = initial_price
         self.daily_sigma = daily_sigma
         self.blocks_per_day = 60 * 60 * 24 / 13.2
@@ -27,57 +32,181 @@ class Simulation:
         self.liquidty_per_basis_point = liquidity_per_basis_point
         self.base_pool_fee = base_pool_fee
         self.paths = paths
+        self.gas_model = gas_model
        
-    @njit
-    def do_simulation(self) -> np.ndarray:
+    def do_simulation(self,
+                      recorder: ResultsRecorder|None=None,
+                      checkpoint: SimulationCheckpoint|None=None,
+                      summary: ResultsSummary|None=None) -> np.ndarray:
         """
         # This array will store three values for each simulated price path:
         (0) lvr (as a positive number),
         (1) arb's gain (negative),
         (2) total gas burned
+        Per-block metrics are streamed to `recorder`, if given, and their
+        distributions kept in `summary`, if given. With a `checkpoint`, the run resumes from it, if any, and is
+        checkpointed every `checkpoint.every_blocks` blocks.
         """
         #TODO: simulat order_book_press
+        if recorder is not None and checkpoint is not None:
+            raise ValueError("`recorder` cannot be resumed from a `checkpoint`.")
+        if summary is not None and checkpoint is not None:
+            raise ValueError("`summary` cannot be resumed from a `checkpoint`.")
         results = np.zeros((3, self.paths))
+        first_path = 0
+        if checkpoint is not None:
+            first_path = checkpoint.resume(self)
+            results[:, :first_path] = checkpoint.results[:, :first_path]
+        for path in range(first_path, self.paths):
+            if checkpoint is not None:
+                checkpoint.begin_path(path)
+            prices = self.path_prices(path)
+            results[:, path] = self.run_path(prices, path, recorder, checkpoint, summary) / self.days
+            if checkpoint is not None:
+                checkpoint.end_path(path, results[:, path])
+        return results
+
+    def path_prices(self, path: int) -> np.ndarray:
+        """Prices of `path`, drawn from the global `np.random`."""
+        # martingale GBM path, built chunk by chunk without full-length temporaries
+        return GBMPricePaths(self.initial_price,
+                             self.daily_sigma,
+                             self.days,
+                             self.blocks_per_day).path(np.random)
+
+    def run_path(self,
+                 prices,
+                 path: int=0,
+                 recorder: ResultsRecorder|None=None,
+                 checkpoint: SimulationCheckpoint|None=None,
+                 summary: ResultsSummary|None=None) -> np.ndarray:
+        """
+        Runs a fresh AMM over one price per block, e.g. a GBM path or a
+        memory-mapped replay of historical prices, recording every block
+        as `path` to `recorder`, if given. With a `checkpoint`, the AMM
+        and the totals of a checkpointed `path` are restored from it.
+        Every block adds its lvr and arb gain, and the combined fee and fee
+        of its swaps, to `summary`, if given.
+        Returns:
+            lvr, arb's gain and gas burned over the path (not per day).
+        """
         list_swapper_ids = list(np.arange(1, 1001))
-        for path in range(self.paths):
-            # save the initial price
-            p0 = self.initial_price
-            # volatility @ block level
-            sigma = self.daily_std/np.sqrt(self.blocks_per_day)
-            total_number_of_blocks = int(self.days * self.blocks_per_day)
-            z = np.cumsum(np.random.normal(0.0, sigma, total_number_of_blocks))
-            # adding a risk-neutral drift, so that the price process is a martingale
-            prices = np.exp(z - (np.arange(total_number_of_blocks) * sigma**2)/2)
-            prices = (prices / prices[0]) * p0
-           
-            _base_fee = 0.003
+        total_number_of_blocks = len(prices)
+       
+        _base_fee = 0.003
+        restored = None if checkpoint is None else checkpoint.restore_path(path)
+        if restored is None:
             amm = AMM(prices[0],
                       L=166_666.67,
                       base_fee=_base_fee,
                       m=0.5,
                       n=2,  
                       alpha=0.5,
-                      intent_threshold=0.95)
+                      intent_threshold=0.95,
+                      gas_model=self.gas_model)
+            first_block = 1
             loss_versus_rebalancing = 0.0
             arbitrage_gain = 0.0
             gas = 0.0
-            for block in range(1, total_number_of_blocks):
-                number_of_swaps_in_block_k = 100
-                randomized_submitted_fee = np.random.uniform(0.0, _base_fee, number_of_swaps_in_block_k)
-                # NOTE: adapt for not submitting any fee
-                random_swappers = random.sample(list_swapper_ids, number_of_swaps_in_block_k)
-                for swap in range(1, number_of_swaps_in_block_k):
-                    x0, y0, f = amm.trade_to_price_with_gas_fee(
-                        efficient_off_chain_price=prices[block-1],
-                        submitted_fee=randomized_submitted_fee[swap],
-                        swapper_id=random_swappers[swap],
-                        block_id=block-1,
-                        gas=gas)
-                    loss_versus_rebalancing += -x0 * prices[block] - y0
+        else:
+            amm, first_block, (loss_versus_rebalancing, arbitrage_gain, gas) = restored
+        for block in range(first_block, total_number_of_blocks):
+            number_of_swaps_in_block_k = 100
+            randomized_submitted_fee = np.random.uniform(0.0, _base_fee, number_of_swaps_in_block_k)
+            # NOTE: adapt for not submitting any fee
+            random_swappers = random.sample(list_swapper_ids, number_of_swaps_in_block_k)
+            block_x = block_y = block_fee = block_gas = 0.0
+            block_lvr = block_arbitrage_gain = 0.0
+            combined_fees = []
+            fees = []
+            for swap in range(1, number_of_swaps_in_block_k):
+                x0, y0, f = amm.trade_to_price_with_gas_fee(
+                    efficient_off_chain_price=prices[block-1],
+                    submitted_fee=randomized_submitted_fee[swap],
+                    swapper_id=random_swappers[swap],
+                    block_id=block-1,
+                    gas=self.gas_cost)
+                swap_gas = self.gas_cost if self.gas_model is None else amm.gas_charged
+                loss_versus_rebalancing += -x0 * prices[block] - y0
+                if x0 != 0.0:
+                    arbitrage_gain += x0 * prices[block] + y0 - swap_gas
+                    gas += swap_gas
+                if recorder is not None:
+                    block_x += x0
+                    block_y += y0
+                    block_fee += f
+                    block_gas += swap_gas if x0 != 0.0 else 0.0
+                if summary is not None:
+                    block_lvr += -x0 * prices[block] - y0
+                    combined_fees.append(amm.combined_fee)
                     if x0 != 0.0:
-                        arbitrage_gain += x0 * prices[block] + y0 - self.gas_cost
-                        gas += self.gas_cost
-            results[:, path] = [loss_versus_rebalancing/self.days,
-                             arbitrage_gain/self.days,
-                             gas/self.days]
+                        block_arbitrage_gain += x0 * prices[block] + y0 - swap_gas
+                        fees.append(f)
+            if recorder is not None:
+                recorder.record_block(path,
+                                      block-1,
+                                      amm.sqrt_price**2,
+                                      prices[block-1],
+                                      amm.combined_fee,
+                                      amm.endogenous_fee,
+                                      amm.exogenous_fee,
+                                      amm.cut_off_percentile,
+                                      block_x,
+                                      block_y,
+                                      block_fee,
+                                      block_gas)
+            if summary is not None:
+                summary.update('lvr', block_lvr)
+                summary.update('arbitrage_gain', block_arbitrage_gain)
+                summary.update('combined_fee', combined_fees)
+                summary.update('fee', fees)
+            if checkpoint is not None and checkpoint.due(block):
+                checkpoint.save_path(path, block + 1, amm, (loss_versus_rebalancing, arbitrage_gain, gas))
+        amm.finish()
+        return np.array([loss_versus_rebalancing,
+                         arbitrage_gain,
+                         gas])
+
+    def do_simulation_jit(self,
+                          seed: int|None=None,
+                          summary: ResultsSummary|None=None,
+                          population=None) -> np.ndarray:
+        """
+        `do_simulation` with each path run by the compiled `amm_kernel`,
+        drawing from one numpy Generator per path instead of the global RNGs,
+        keeping the distributions of the per-block metrics in `summary`, if given.
+        With a `trader_population.TraderPopulation`, its order flow replaces
+        the 99 informed swaps per block (see `simulate_population_path`):
+        lvr and arbitrage gain are those of its informed swaps, and a fourth
+        row holds the lvr of its uninformed swaps.
+        """
+        if self.gas_model is not None:
+            raise ValueError("`gas_model` is only supported by `do_simulation`.")
+        if summary is not None and population is not None:
+            raise ValueError("`summary` is not supported with a `population`.")
+        # NOTE: imported here, numba is only loaded by the runs that compile
+        from amm_kernel import amm_params, simulate_path, simulate_path_summary
+        results = np.zeros((3 if population is None else 4, self.paths))
+        path_seeds = np.random.SeedSequence(seed).spawn(self.paths)
+        price_paths = GBMPricePaths(self.initial_price, self.daily_sigma, self.days, self.blocks_per_day)
+        sigma = self.daily_sigma/np.sqrt(self.blocks_per_day)
+        total_number_of_blocks = int(self.days * self.blocks_per_day)
+        params = amm_params(L=166_666.67,
+                            base_fee=0.003,
+                            m=0.5,
+                            n=2,
+                            alpha=0.5,
+                            intent_threshold=0.95)
+        for path in range(self.paths):
+            rng = np.random.default_rng(path_seeds[path])
+            if population is not None:
+                from trader_population import simulate_population_path
+                totals = simulate_population_path(rng, population, price_paths, params, self.gas_cost)
+            elif summary is None:
+                totals = simulate_path(rng, float(self.initial_price), sigma, total_number_of_blocks,
+                                       params, self.gas_cost)
+            else:
+                totals = simulate_path_summary(rng, float(self.initial_price), sigma, total_number_of_blocks,
+                                               params, self.gas_cost, summary)
+            results[:, path] = totals / self.days
         return results
@@ -0,0 +1,219 @@
+"""
+Mergeable streaming summaries of simulation metrics in fixed memory.
+
+`RunningMoments` keeps count, mean, variance, min and max exactly (Chan et
+al.'s parallel update). `KLLSketch` is the quantile sketch of Karnin,
+Lang and Liberty, "Optimal quantile approximation in streams": levels of
+sorted compactors, level h holding items of weight 2**h. A full level is
+sorted and every other item, from a random offset, is promoted to the next
+level. Memory is about 3 k items whatever the stream length. The rank
+error is about 1.7 / k of the count with high probability (1% at the
+default k = 200), and sketches of separate streams merge into the sketch of
+the combined stream.
+
+`ResultsSummary` holds both per metric name. Engines update it once per
+block with arrays (lvr and arb gain of the block, combined fee and fee of
+every swap). Workers summarise their paths separately, and `merge` combines
+the partial summaries:
+
+    summary = ResultsSummary()
+    ParallelSimulation(...).do_simulation(seed, summary=summary)
+    summary.quantiles('lvr', [0.05, 0.5, 0.95])
+    summary.save('summary.pkl')
+"""
+import math
+import pickle
+import numpy as np
+
+# metrics the simulation engines record, per block or per swap
+BLOCK_METRICS = ('lvr', 'arbitrage_gain')
+SWAP_METRICS = ('combined_fee', 'fee')
+
+
+class RunningMoments:
+    def __init__(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        # sum of squared deviations from the mean
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _combine(self, count: int, mean: float, m2: float, minimum: float, maximum: float) -> None:
+        if count == 0:
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.mean += delta * count / total
+        self.count = total
+        self.min = min(self.min, minimum)
+        self.max = max(self.max, maximum)
+
+    def update(self, values: np.ndarray) -> None:
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if values.size == 0:
+            return
+        mean = values.mean()
+        self._combine(values.size, float(mean), float(np.sum((values - mean)**2)),
+                      float(values.min()), float(values.max()))
+
+    def merge(self, other: 'RunningMoments') -> None:
+        self._combine(other.count, other.mean, other.m2, other.min, other.max)
+
+    @property
+    def variance(self) -> float:
+        """Sample variance."""
+        return self.m2 / (self.count - 1) if self.count > 1 else math.nan
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+
+class KLLSketch:
+    def __init__(self, k: int=200, seed=None) -> None:
+        """
+        Args:
+            k: capacity of the top level, accuracy grows as 1 / k.
+            seed: of the compaction offsets.
+        """
+        if k < 8:
+            raise ValueError("`k` must be at least 8.")
+        self.k = k
+        self.count = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        # lower levels shrink geometrically, by 2/3 per level below the top
+        return max(2, math.ceil(self.k * (2 / 3)**(len(self.levels) - level - 1)))
+
+    def _compress(self) -> None:
+        while sum(items.shape[0] for items in self.levels) > sum(map(self._capacity, range(len(self.levels)))):
+            # the lowest full level
+            level = next(level for level, items in enumerate(self.levels) if items.shape[0] >= self._capacity(level))
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            items = np.sort(self.levels[level])
+            # an odd item stays behind
+            even = items.shape[0] - items.shape[0] % 2
+            promoted = items[self._rng.integers(2):even:2]
+            self.levels[level] = items[even:]
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+
+    def update(self, values: np.ndarray) -> None:
+        """Adds `values`, NaNs ignored."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+        self.count += values.size
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other: 'KLLSketch') -> None:
+        if other.k != self.k:
+            raise ValueError(f"Cannot merge sketches of k={self.k} and k={other.k}.")
+        self.levels.extend(np.empty(0) for _ in range(len(other.levels) - len(self.levels)))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self._compress()
+
+    def _weighted_items(self) -> tuple[np.ndarray, np.ndarray]:
+        """Items in increasing order and their cumulative weights."""
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(level_items.shape[0], 2.0**level)
+                                  for level, level_items in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        return items[order], np.cumsum(weights[order])
+
+    def quantiles(self, q) -> np.ndarray:
+        """Approximate `q` quantiles, NaN for an empty sketch."""
+        q = np.asarray(q, dtype=np.float64)
+        if self.count == 0:
+            return np.full(q.shape, math.nan)
+        items, cumulative_weights = self._weighted_items()
+        ranks = np.searchsorted(cumulative_weights, q * cumulative_weights[-1], side='left')
+        return items[np.minimum(ranks, items.shape[0] - 1)]
+
+    def cdf(self, x) -> np.ndarray:
+        """Approximate fraction of the values <= `x`."""
+        x = np.asarray(x, dtype=np.float64)
+        if self.count == 0:
+            return np.full(x.shape, math.nan)
+        items, cumulative_weights = self._weighted_items()
+        ranks = np.searchsorted(items, x, side='right')
+        return np.where(ranks > 0, cumulative_weights[np.maximum(ranks - 1, 0)], 0.0) / cumulative_weights[-1]
+
+
+class ResultsSummary:
+    def __init__(self, k: int=200, seed=None) -> None:
+        self.k = k
+        self.seed = seed
+        self.moments = {}
+        self.sketches = {}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.moments
+
+    @property
+    def names(self) -> list[str]:
+        return list(self.moments)
+
+    def _add(self, name: str) -> None:
+        self.moments[name] = RunningMoments()
+        # one stream per metric, also when several summaries share a seed
+        seed = None if self.seed is None else [*np.atleast_1d(self.seed).tolist(), len(self.sketches)]
+        self.sketches[name] = KLLSketch(self.k, seed)
+
+    def update(self, name: str, values) -> None:
+        """Adds `values` of metric `name`, NaNs ignored."""
+        if name not in self.moments:
+            self._add(name)
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        self.moments[name].update(values)
+        self.sketches[name].update(values)
+
+    def merge(self, other: 'ResultsSummary') -> 'ResultsSummary':
+        for name in other.moments:
+            if name not in self.moments:
+                self._add(name)
+            self.moments[name].merge(other.moments[name])
+            self.sketches[name].merge(other.sketches[name])
+        return self
+
+    def quantiles(self, name: str, q) -> np.ndarray:
+        return self.sketches[name].quantiles(q)
+
+    def histogram(self, name: str, bins: int=20, range: tuple[float, float]|None=None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Approximate counts over `bins` equal bins of `range`, by default
+        from the 1st to the 99th percentile (or the minimum to the maximum
+        if they are equal), the outer bins open-ended.
+        Returns:
+            counts and bin edges, as np.histogram.
+        """
+        low, high = range or tuple(self.quantiles(name, [0.01, 0.99]))
+        if not high > low and range is None:
+            low, high = self.moments[name].min, self.moments[name].max
+        if not high > low:
+            high = low + 1.0
+        edges = np.linspace(low, high, bins + 1)
+        cdf = self.sketches[name].cdf(edges[1:-1])
+        counts = np.diff(np.concatenate([[0.0], cdf, [1.0]])) * self.moments[name].count
+        return counts, edges
+
+    def save(self, filename: str) -> None:
+        with open(filename, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, filename: str) -> 'ResultsSummary':
+        with open(filename, 'rb') as f:
+            summary = pickle.load(f)
+        if not isinstance(summary, cls):
+            raise ValueError(f"{filename} does not hold a {cls.__name__}.")
+        return summary
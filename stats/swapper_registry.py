@@ -0,0 +1,102 @@
+import numpy as np
+
+
+class SwapperRegistry:
+    """
+    Which swappers traded in each of the last `window` blocks.
+
+    Swapper ids (ints, addresses, ...) are mapped to dense integer slots.
+    A ring buffer of `window + 1` bitsets (the current block plus `window`
+    completed blocks) records which slots swapped in which block, and
+    `counts` holds, per slot, the number of those blocks with a swap, so
+    the intent rate is an O(1) lookup. A slot is released once its swapper
+    has dropped out of the window, which keeps memory bounded by the number
+    of swappers active within the window rather than by all ids ever seen.
+    """
+    def __init__(self, window: int=256, capacity: int=1024) -> None:
+        self.window = window
+        self.total_blocks = 0
+        capacity = max(8, -(-capacity // 8) * 8)
+        self._bits = np.zeros((window + 1, capacity // 8), dtype=np.uint8)
+        self.counts = np.zeros(capacity, dtype=np.int64)
+        self._slots = {}
+        self._slot_ids = [None] * capacity
+        self._free_slots = list(range(capacity - 1, -1, -1))
+
+    def __contains__(self, swapper_id) -> bool:
+        return swapper_id in self._slots
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    @property
+    def _current_row(self) -> np.ndarray:
+        return self._bits[self.total_blocks % (self.window + 1)]
+
+    def _grow(self) -> None:
+        capacity = self.counts.shape[0]
+        self._bits = np.concatenate([self._bits, np.zeros_like(self._bits)], axis=1)
+        self.counts = np.concatenate([self.counts, np.zeros_like(self.counts)])
+        self._slot_ids.extend([None] * capacity)
+        self._free_slots.extend(range(2 * capacity - 1, capacity - 1, -1))
+
+    def _slot(self, swapper_id) -> int:
+        slot = self._slots.get(swapper_id)
+        if slot is None:
+            if not self._free_slots:
+                self._grow()
+            slot = self._free_slots.pop()
+            self._slots[swapper_id] = slot
+            self._slot_ids[slot] = swapper_id
+        return slot
+
+    def record(self, swapper_id) -> None:
+        """Marks `swapper_id` as having swapped in the current block."""
+        slot = self._slot(swapper_id)
+        row = self._current_row
+        mask = 1 << (slot & 7)
+        if not row[slot >> 3] & mask:
+            row[slot >> 3] |= mask
+            self.counts[slot] += 1
+
+    def in_current_block(self, swapper_id) -> bool:
+        slot = self._slots.get(swapper_id)
+        return slot is not None and bool(self._current_row[slot >> 3] & (1 << (slot & 7)))
+
+    def intent_rate(self, swapper_id) -> float:
+        """
+        Completed blocks in the window with a swap of `swapper_id`, per
+        completed block in the window: the current block is left out of
+        both, so the rate is at most 1.
+        """
+        slot = self._slots.get(swapper_id)
+        if slot is None or self.total_blocks == 0:
+            return 0.0
+        return (self.counts[slot] - self.in_current_block(swapper_id)) / min(self.total_blocks, self.window)
+
+    def snapshot(self) -> tuple:
+        """Copy of the registry, for `restore`."""
+        return (self.total_blocks, self._bits.copy(), self.counts.copy(), self._slots.copy(),
+                self._slot_ids.copy(), self._free_slots.copy())
+
+    def restore(self, snapshot: tuple) -> None:
+        total_blocks, bits, counts, slots, slot_ids, free_slots = snapshot
+        self.total_blocks = total_blocks
+        self._bits = bits.copy()
+        self.counts = counts.copy()
+        self._slots = slots.copy()
+        self._slot_ids = slot_ids.copy()
+        self._free_slots = free_slots.copy()
+
+    def end_block(self) -> None:
+        """Closes the current block and drops the block that leaves the window."""
+        self.total_blocks += 1
+        row = self._current_row
+        if self.total_blocks > self.window:
+            expired = np.flatnonzero(np.unpackbits(row, bitorder='little'))
+            self.counts[expired] -= 1
+            for slot in expired[self.counts[expired] == 0].tolist():
+                del self._slots[self._slot_ids[slot]]
+                self._slot_ids[slot] = None
+                self._free_slots.append(slot)
+        row[:] = 0
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from adaptive_simulation import (AdaptiveSimulation,
+                                 expected_frictionless_arbitrage,
+                                 frictionless_arbitrage,
+                                 mean_and_half_width)
+from price_paths import GBMPricePaths
+
+L = 166_666.67
+
+
+def test_expected_frictionless_arbitrage_is_the_monte_carlo_mean():
+    price_paths = GBMPricePaths(2000.0, 0.2, 1.0, blocks_per_day=500)
+    rng = np.random.default_rng(0)
+    samples = np.array([frictionless_arbitrage(price_paths.path(rng), L) for _ in range(4000)])
+    expected = expected_frictionless_arbitrage(2000.0, price_paths.sigma, price_paths.total_number_of_blocks, L)
+    standard_error = samples.std(ddof=1) / np.sqrt(samples.shape[0])
+    assert abs(samples.mean() - expected) < 4 * standard_error
+    # the bias of a wrong horizon would be visible
+    assert standard_error < 0.01 * expected
+
+
+def test_antithetic_keeps_the_law_of_the_path():
+    price_paths = GBMPricePaths(2000.0, 0.2, 1.0, blocks_per_day=200)
+    rng = np.random.default_rng(1)
+    paths = np.array([price_paths.path(rng) for _ in range(3000)])
+    mirrored = np.array([price_paths.antithetic(prices) for prices in paths])
+    sigma = price_paths.sigma
+    for sample in (paths, mirrored):
+        returns = np.diff(np.log(sample), axis=1)
+        n = returns.size
+        # normal log-returns of mean -sigma^2 / 2 and variance sigma^2
+        assert abs(returns.mean() + sigma**2 / 2) < 4 * sigma / np.sqrt(n)
+        assert abs(returns.var() / sigma**2 - 1) < 4 * np.sqrt(2 / n)
+        # a martingale started at the initial price
+        terminal = sample[:, -1]
+        assert abs(terminal.mean() - 2000.0) < 4 * terminal.std(ddof=1) / np.sqrt(terminal.shape[0])
+    # mirrored, so the pair is negatively correlated
+    assert np.corrcoef(paths[:, -1], mirrored[:, -1])[0, 1] < -0.9
+
+
+def test_control_variate_with_a_known_mean():
+    rng = np.random.default_rng(2)
+    controls = rng.normal(5.0, 1.0, 500)
+    samples = 3.0 * controls + rng.normal(0.0, 0.1, 500)
+    mean, half_width, _ = mean_and_half_width(samples, controls, expected_control=5.0)
+    plain_mean, plain_half_width, _ = mean_and_half_width(samples)
+    assert abs(mean - 15.0) < half_width
+    assert half_width < plain_half_width / 10
+
+
+def test_run_until_keeps_the_simulation_interface():
+    simulation = AdaptiveSimulation(2000.0, 0.05, 0.01, 1.0, L, 0.003, 8)
+    summary = simulation.run_until(1e9, batch_size=4, min_paths=4, seed=1)
+    # at least 3 antithetic pairs before the first check
+    assert summary['converged'] and summary['paths'] == 8
+    assert summary['results'].shape == (3, 8)
+    results = simulation.do_simulation()
+    assert isinstance(results, np.ndarray) and results.shape == (3, 8)
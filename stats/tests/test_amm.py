@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+import amm_modified
+import amm_v2
+from instrumentation import Instrumentation, SWAPS_REJECTED
+from price_feed import PressureSeries
+
+
+@pytest.mark.parametrize('AMM', [amm_modified.AMM, amm_v2.AMM])
+def test_uninformed_swap_inside_the_spread_is_rejected(AMM):
+    instrumentation = Instrumentation()
+    amm = AMM(2000.0, instrumentation=instrumentation)
+    amm.trade_to_price_with_gas_fee(2010.0, 0.001, 1, block_id=0)
+    sqrt_price = amm.sqrt_price
+    bid, ask = amm.get_bid_and_ask_of_amm(sqrt_price**2)
+    inside = (bid + ask) / 2
+    assert amm.quote(inside, informed=False) == (0, 0, 0, amm.base_fee)
+    assert amm.trade_to_price_with_gas_fee(inside, 0.001, 2, block_id=0, informed=False) == (0, 0, 0)
+    x, y, fee, _ = amm.trade_batch([inside, bid], None, None, [0, 0], informed=False)
+    assert x.tolist() == y.tolist() == fee.tolist() == [0.0, 0.0]
+    assert amm.sqrt_price == sqrt_price
+    assert instrumentation.counters[SWAPS_REJECTED] == 3
+
+
+def test_v2_swaps_the_fee_directions():
+    rng = np.random.default_rng(0)
+    pressures = rng.choice([-0.4, 0.0, 0.6], 40)
+    prices = 2000.0 * np.exp(np.cumsum(rng.normal(0.0, 0.005, 40 * 20)))
+    fees = rng.uniform(0.0, 0.003, prices.shape[0])
+    swappers = rng.integers(1, 30, prices.shape[0])
+    block_ids = np.repeat(np.arange(40), 20)
+    modified = amm_modified.AMM(2000.0, price_feed=PressureSeries(-pressures))
+    v2 = amm_v2.AMM(2000.0, price_feed=PressureSeries(pressures))
+    expected = modified.trade_batch(prices, fees, swappers, block_ids)
+    results = v2.trade_batch(prices, fees, swappers, block_ids)
+    for result, value in zip(results[:3], expected[:3]):
+        assert np.array_equal(result, value)
+    assert results[3] == expected[3]
+    # and the pressure does matter
+    assert not np.array_equal(amm_v2.AMM(2000.0, price_feed=PressureSeries(-pressures)).trade_batch(
+        prices, fees, swappers, block_ids)[2], results[2])
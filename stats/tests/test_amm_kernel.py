@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+from amm_kernel import amm_params, draw_path, run_path, simulate_path
+from vectorized_simulation import scalar_reference_path
+
+SIGMA = 0.05 / np.sqrt(7200)
+
+
+@pytest.mark.parametrize('number_of_swappers', [1000, 100])
+@pytest.mark.parametrize('gas_cost', [0.0, 0.5])
+def test_run_path_equals_the_python_amm(number_of_swappers, gas_cost):
+    params = amm_params()
+    prices, submitted_fees, swappers, pressures = draw_path(np.random.default_rng(4), 3000.0, SIGMA, 150,
+                                                            number_of_swappers=number_of_swappers)
+    totals = run_path(prices, submitted_fees, swappers, pressures, params, gas_cost,
+                      number_of_swappers=number_of_swappers)
+    expected = scalar_reference_path(prices, submitted_fees, swappers, pressures, gas_cost)
+    assert np.array_equal(totals, expected)
+    # the pool did trade
+    assert expected[1] != 0.0
+    # drawing as it goes makes the same draws
+    assert np.array_equal(simulate_path(np.random.default_rng(4), 3000.0, SIGMA, 150, params, gas_cost,
+                                        number_of_swappers=number_of_swappers), totals)
@@ -0,0 +1,33 @@
+import pytest
+from amm_modified import AMM
+from amm_v2 import AMM as AMMv2
+
+
+class CountingFeed:
+    def __init__(self) -> None:
+        self.reads = 0
+
+    def pressure(self, block_id: int) -> float:
+        self.reads += 1
+        return 0.1 * self.reads
+
+
+@pytest.mark.parametrize('amm_class', [AMM, AMMv2])
+def test_begin_block_is_not_cached(amm_class):
+    feed = CountingFeed()
+    amm = amm_class(2000.0, price_feed=feed)
+    amm.begin_block(block_id=3)
+    amm.begin_block(block_id=3)
+    assert feed.reads == 2
+    assert amm.order_bool_pressure == pytest.approx(0.2)
+
+
+@pytest.mark.parametrize('amm_class', [AMM, AMMv2])
+def test_endogenous_fee_is_cached_within_a_block(amm_class):
+    amm = amm_class(2000.0)
+    amm.begin_block(block_id=1)
+    amm.endogenous_dynamic_fee(block_id=1)
+    amm.endogenous_dynamic_fee(block_id=1)
+    assert amm.block_cache.cache_info().hits == 1
+    amm.end_block()
+    assert amm.block_cache.cache_info().currsize == 0
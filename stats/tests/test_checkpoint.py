@@ -0,0 +1,85 @@
+import random
+import numpy as np
+import pytest
+from checkpoint import SimulationCheckpoint
+from gas_model import GasModel
+from sketches import ResultsSummary
+from simulation import Simulation
+from tick_replay import ReplaySimulation
+
+
+class Crash(Exception):
+    pass
+
+
+def simulation(gas_model=None) -> Simulation:
+    return Simulation(2000.0, 0.05, 0.01, 1.0, 166_666.67, 0.003, 3, gas_model=gas_model)
+
+
+def replay_simulation(gas_model=None) -> ReplaySimulation:
+    prices = 2000.0 * np.exp(np.cumsum(np.random.default_rng(3).normal(0.0, 0.001, 60)))
+    return ReplaySimulation(prices, 1.0, 166_666.67, 0.003, paths=3, gas_model=gas_model)
+
+
+def seeded_run(make_simulation, **kwargs) -> np.ndarray:
+    random.seed(5)
+    np.random.seed(5)
+    return make_simulation().do_simulation(**kwargs)
+
+
+def crash_after(monkeypatch, writes: tuple[int, ...]) -> None:
+    """Makes `save_path` raise right after its `writes`-th calls."""
+    save_path = SimulationCheckpoint.save_path
+    calls = [0]
+
+    def crashing_save_path(self, *args):
+        save_path(self, *args)
+        calls[0] += 1
+        if calls[0] in writes:
+            raise Crash()
+    monkeypatch.setattr(SimulationCheckpoint, 'save_path', crashing_save_path)
+
+
+@pytest.mark.parametrize('make_simulation', [simulation, replay_simulation])
+@pytest.mark.parametrize('gas_model', [None, GasModel()])
+def test_resume_is_bit_identical(tmp_path, monkeypatch, make_simulation, gas_model):
+    reference = seeded_run(lambda: make_simulation(gas_model))
+    crash_after(monkeypatch, (2, 5, 7))
+    crashes = 0
+    while True:
+        # resuming must not depend on the generators' state at restart
+        random.seed(100 + crashes)
+        np.random.seed(100 + crashes)
+        if crashes == 0:
+            random.seed(5)
+            np.random.seed(5)
+        try:
+            results = make_simulation(gas_model).do_simulation(
+                checkpoint=SimulationCheckpoint(str(tmp_path), every_blocks=10))
+            break
+        except Crash:
+            crashes += 1
+    assert crashes == 3
+    assert np.array_equal(results, reference)
+
+
+def test_checkpoint_of_another_run(tmp_path):
+    seeded_run(simulation, checkpoint=SimulationCheckpoint(str(tmp_path), every_blocks=10))
+    with pytest.raises(ValueError):
+        replay_simulation().do_simulation(checkpoint=SimulationCheckpoint(str(tmp_path)))
+
+
+def test_summary_cannot_be_checkpointed(tmp_path):
+    with pytest.raises(ValueError):
+        replay_simulation().do_simulation(checkpoint=SimulationCheckpoint(str(tmp_path)),
+                                          summary=ResultsSummary())
+
+
+def test_replay_summary():
+    summary = ResultsSummary()
+    results = seeded_run(replay_simulation, summary=summary)
+    # 59 blocks of 99 swaps per path
+    assert summary.moments['lvr'].count == 3 * 59
+    assert summary.moments['combined_fee'].count == 3 * 59 * 99
+    assert summary.moments['lvr'].mean * summary.moments['lvr'].count == \
+        pytest.approx(results[0].sum() * replay_simulation().days)
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+import damm_reference
+from damm_reference import (combined_fee,
+                            endogenous_dynamic_fee,
+                            exogenous_dynamic_fee,
+                            isqrt,
+                            quantized_fee,
+                            submitted_delta_fee_for_block)
+
+# lowest 10 of 12 senders at the cut-off of 85%: mean 1008 // 10 = 100,
+# no fee below it, variance 64 // 10 = 6, sigma isqrt(6) = 2
+LOYAL_BLOCK = [108] + [100] * 9 + [600, 500]
+# mean 200 of (100, 200, 300), so `100 - 200` underflows
+SPREAD_BLOCK = [400, 300, 200, 100]
+
+
+def block(*rows) -> tuple[np.ndarray, np.ndarray]:
+    """Rows of submitted fees padded with garbage, and their counts."""
+    fees = np.full((len(rows), 16), 14_999, dtype=np.uint64)
+    for i, row in enumerate(rows):
+        fees[i, :len(row)] = row
+    return fees, np.array([len(row) for row in rows])
+
+
+def test_quantized_fee():
+    fees = [0, 49, 50, 99, 1999, 2000, 3000]
+    assert quantized_fee(fees).tolist() == [0, 0, 50, 50, 1950, 0, 0]
+
+
+def test_isqrt_is_the_floor():
+    x = np.array([0, 1, 2, 3, 4, 15, 16, 6, 2**62 - 1, 2**62], dtype=np.uint64)
+    assert isqrt(x).tolist() == [0, 1, 1, 1, 2, 3, 4, 2, 2**31 - 1, 2**31]
+
+
+def test_endogenous_dynamic_fee():
+    block_id = [0, 5, 5, 5, 5, 5, 5]
+    before = [0, 2000, 2000, 2000, 3, 1, 0]
+    after = [7, 2000, 2100, 1900, 4, 3, 10]
+    fee, reverted = endogenous_dynamic_fee(block_id, before, after)
+    # 3000 + (3000 * impact / 1e18) * 10 / 100 with impact = |after - before| * 1e18 / before:
+    # 5e16 -> 150 -> 15, 333333333333333333 -> 999 -> 99, 2e18 -> 6000 -> 600
+    assert fee.tolist() == [3000, 3000, 3015, 3015, 3099, 3600, 0]
+    assert reverted.tolist() == [False] * 6 + [True]
+
+
+def test_exogenous_dynamic_fee():
+    fees, count = block(LOYAL_BLOCK, LOYAL_BLOCK, [300], SPREAD_BLOCK, SPREAD_BLOCK)
+    in_senders = np.array([True, False, True, True, False])
+    first_trx = np.array([False, False, False, False, True])
+    fee, reverted = exogenous_dynamic_fee(fees, count, 85, in_senders, first_trx)
+    # mean + M * sigma, N_HOOK * sigma, BASE_FEE for one sender, reverted, BASE_FEE * 5 before sorting
+    assert fee.tolist() == [100 + 10 * 2, 5 * 2, 3000, 0, 15_000]
+    assert reverted.tolist() == [False, False, False, True, False]
+    # a cut-off of 50% keeps six fees of 100: mean 100, sigma 0
+    fee, reverted = exogenous_dynamic_fee(*block(LOYAL_BLOCK), 50, True)
+    assert fee.tolist() == [100] and not reverted.any()
+
+
+def test_combined_fee():
+    endogenous = [3015, 3000, 3000, 3000, 3000, 3000]
+    exogenous = [1010, 10_000, 10_000, 10_000, 3001, 3000]
+    alpha = [50, 20, 20, 20, 50, 101]
+    cut_off = [85, 90, 50, 90, 100, 85]
+    first = [False, False, False, True, False, False]
+    fee, cut_off, reverted = combined_fee(endogenous, exogenous, alpha, cut_off, first)
+    # (50 * 3015 + 50 * 1010) // 100 = 2012 below the endogenous fee, which is at most
+    # BASE_FEE * 1.25: +5; 8600 above BASE_FEE * 2: -5 but not below 50; 300050 // 100 = 3000
+    assert fee.tolist() == [3015, 8600, 8600, 43_000, 3000, 0]
+    assert cut_off[:5].tolist() == [90, 85, 50, 85, 100]
+    assert reverted.tolist() == [False] * 5 + [True]
+
+
+def test_submitted_delta_fee_for_block():
+    fee, reverted = submitted_delta_fee_for_block(*block(LOYAL_BLOCK, [7], SPREAD_BLOCK, [100, 100]))
+    # N * sigma, BASE_FEE for one sender, reverted, one fee kept of 2 * 85 // 100
+    assert fee.tolist() == [2 * 2, 3000, 0, 0]
+    assert reverted.tolist() == [False, False, True, False]
+
+
+def test_check_domain():
+    damm_reference.check_domain(prices=([2**32 - 1],), fees=([[15_000] * 1024],))
+    with pytest.raises(ValueError):
+        damm_reference.check_domain(prices=([2**32],))
+    with pytest.raises(ValueError):
+        damm_reference.check_domain(fees=([15_001],))
+    with pytest.raises(ValueError):
+        damm_reference.check_domain(fees=(np.zeros((1, 1025)),))
@@ -0,0 +1,84 @@
+import os
+import numpy as np
+import pytest
+from amm_modified import AMM
+from amm_v2 import AMM as AMMv2
+import gas_model
+from gas_model import GasModel, DEFAULT_COEFFICIENTS, SWAP_COEFFICIENTS, FEE_COEFFICIENTS
+
+
+def write_snapshots(directory, model: GasModel, senders=(0, 1, 2, 3, 5, 8)) -> None:
+    """The snapshots `DammHookGas.t.sol` would write for a hook costing exactly `model`."""
+    without_fee = GasModel(model.coefficients, fee_in_swap=False)
+    c = model.coefficients
+    snapshots = {}
+    for k in senders:
+        snapshots[f'swap_first_in_block_cleared_{k}'] = without_fee.gas(0, new_sender=True, first_in_block=True,
+                                                                       previous_senders=k)
+        snapshots[f'swap_new_sender_senders_{k}'] = without_fee.gas(k, new_sender=True)
+        snapshots[f'swap_existing_sender_senders_{k}'] = without_fee.gas(k, existing_sender=True)
+        snapshots[f'swap_no_fee_senders_{k}'] = without_fee.gas(k)
+        snapshots[f'combined_fee_senders_{k}'] = \
+            c['combined_fee'] + c['per_sender'] * k + c['per_comparison'] * k * (k - 1) / 2
+    for name, gas in snapshots.items():
+        with open(os.path.join(directory, f'{name}.snap'), 'w') as f:
+            f.write(f'{int(gas)}\n')
+
+
+def test_from_snapshots_recovers_known_coefficients(tmp_path):
+    known = {'swap': 131_072, 'new_sender': 44_321, 'existing_sender': 5_003, 'first_in_block': 10_010,
+             'cleared_sender': 4_999, 'combined_fee': 17_500, 'per_sender': 4_412, 'per_comparison': 64}
+    write_snapshots(tmp_path, GasModel(known))
+    fitted = GasModel.from_snapshots(str(tmp_path))
+    for name in SWAP_COEFFICIENTS + FEE_COEFFICIENTS:
+        assert fitted.coefficients[name] == pytest.approx(known[name], rel=1e-9, abs=1e-6)
+
+
+def test_from_snapshots_without_snapshots(tmp_path):
+    with pytest.raises(ValueError):
+        GasModel.from_snapshots(str(tmp_path))
+
+
+def test_default_is_fitted_to_the_repo_snapshots(tmp_path, monkeypatch):
+    known = {**DEFAULT_COEFFICIENTS, 'swap': 98_765, 'new_sender': 47_000, 'combined_fee': 21_000}
+    write_snapshots(tmp_path, GasModel(known))
+    monkeypatch.setattr(gas_model, 'SNAPSHOT_DIRECTORY', str(tmp_path))
+    gas_model.repo_coefficients.cache_clear()
+    try:
+        model = GasModel()
+        for name in SWAP_COEFFICIENTS + FEE_COEFFICIENTS:
+            assert model.coefficients[name] == pytest.approx(known[name], rel=1e-9, abs=1e-6)
+        assert GasModel({'swap': 1.0}).coefficients['new_sender'] == pytest.approx(47_000)
+    finally:
+        gas_model.repo_coefficients.cache_clear()
+
+
+def test_default_leaves_out_the_combined_fee():
+    # `beforeSwap` does not call `calculateCombinedFee`
+    model = GasModel()
+    assert not model.fee_in_swap
+    assert model.gas(50) == model.gas(0) == model.coefficients['swap']
+    assert GasModel(fee_in_swap=True).gas(50) > GasModel(fee_in_swap=True).gas(0)
+
+
+@pytest.mark.parametrize('amm_class', [AMM, AMMv2])
+def test_only_executed_swaps_reach_the_hook(amm_class):
+    rng = np.random.default_rng(7)
+    prices = 2000.0 * np.exp(np.cumsum(rng.normal(0.0, 0.004, 60)))
+    amm = amm_class(prices[0], gas_model=GasModel())
+    executed = []
+    for block in range(1, prices.shape[0]):
+        fees = rng.uniform(0.0, 0.003, 20)
+        swappers = rng.permutation(np.arange(1, 101))[:20]
+        executed.append(0)
+        for swap, (fee, swapper) in enumerate(zip(fees, swappers)):
+            x, _, _ = amm.trade_to_price_with_gas_fee(prices[block - 1], float(fee), int(swapper),
+                                                      block - 1, gas=1.0)
+            if swap == 0 and block > 1:
+                # the first swap of the block has closed the previous one
+                assert amm.previous_block_senders == executed[-2]
+            executed[-1] += x != 0.0
+        assert len(amm.hook_senders) == executed[-1]
+        assert amm.first_swap_in_block == (executed[-1] == 0)
+    # some blocks trade, most do not
+    assert 0 < sum(executed) < len(executed) * 20
@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+from amm_modified import AMM
+from amm_v2 import AMM as AMMv2
+from columnar import read_columns
+from instrumentation import Instrumentation
+
+
+@pytest.mark.parametrize('amm_class', [AMM, AMMv2])
+def test_finish_records_the_last_block(tmp_path, amm_class):
+    instrumentation = Instrumentation.to_directory(str(tmp_path))
+    rng = np.random.default_rng(1)
+    prices = 2000.0 * np.exp(np.cumsum(rng.normal(0.0, 0.004, 6)))
+    amm = amm_class(prices[0], instrumentation=instrumentation)
+    for block in range(5):
+        for swap in range(10):
+            amm.trade_to_price_with_gas_fee(prices[block + 1], float(rng.uniform(0.0, 0.003)), swap + 1, block)
+    amm.finish()
+    instrumentation.close()
+    summary = instrumentation.summary()
+    assert summary['blocks'] == 5
+    assert summary['swaps_executed'] + summary['swaps_rejected'] + summary['swaps_gas_rejected'] == 50
+    table = read_columns(str(tmp_path))
+    assert table['block_id'].tolist() == [0, 1, 2, 3, 4]
+    # finishing twice records nothing more
+    amm.finish()
+    assert instrumentation.summary()['blocks'] == 5
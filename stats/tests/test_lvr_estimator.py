@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+from lvr_estimator import (BLOCKS_PER_DAY,
+                           block_factors,
+                           deterministic_block_factors,
+                           estimate,
+                           fee_band,
+                           frictionless_lvr,
+                           gas_threshold,
+                           poisson_block_factors)
+
+ETA = np.array([0.0, 0.1, 0.5, 1.0, 3.0, 10.0, 100.0])
+
+
+def chain(eta: float, d: float, poisson: bool, chains: int=10_000, blocks: int=1_100) -> tuple[float, float]:
+    """Trade probability and gross gain per block of the mispricing chain, simulated."""
+    rng = np.random.default_rng(0)
+    buy, sell = eta + d, eta + np.sqrt(4 * eta * eta + d * d)
+    x = np.full(chains, eta)
+    trades = gain = 0.0
+    for block in range(blocks):
+        step = rng.standard_normal(chains)
+        if poisson:
+            step *= np.sqrt(rng.exponential(1.0, chains))
+        x += step
+        bought, sold = x > buy, -x > sell
+        if block >= 100:
+            trades += np.count_nonzero(bought | sold)
+            gain += np.sum((x[bought] - eta)**2) + np.sum((eta - x[sold]) * (-x[sold] - 3 * eta))
+        x[bought | sold] = eta
+    samples = chains * (blocks - 100)
+    return trades / samples, gain / samples
+
+
+def test_frictionless_limit():
+    for factors in (poisson_block_factors(0.0, 0.0), deterministic_block_factors(0.0, 0.0)):
+        assert factors == pytest.approx((1.0, 1.0), rel=1e-12)
+    # without a fee band every trade takes the whole mispricing, gas only delays it
+    d = np.array([0.1, 1.0, 5.0])
+    assert poisson_block_factors(0.0, d)[1] == pytest.approx(np.ones(3), rel=1e-12)
+
+
+def test_poisson_trade_probability_without_gas():
+    # the paper's 1 / (1 + sqrt(2) eta) for the no-trade band [-3 eta, eta] of half-width 2 eta
+    probability, gain = poisson_block_factors(ETA)
+    assert probability == pytest.approx(1 / (1 + 2 * np.sqrt(2) * ETA), rel=1e-12)
+    # fewer trades, each of a larger mispricing
+    assert np.all(np.diff(gain) < 0) and np.all(gain >= probability)
+
+
+@pytest.mark.parametrize('eta, d', [(0.5, 0.0), (0.5, 0.3), (0.0, 1.0), (2.0, 0.5)])
+def test_factors_against_the_simulated_chain(eta, d):
+    assert chain(eta, d, poisson=True) == pytest.approx(poisson_block_factors(eta, d), rel=0.015)
+    assert chain(eta, d, poisson=False) == pytest.approx(deterministic_block_factors(eta, d), rel=0.015)
+
+
+def test_estimate_composes_the_factors():
+    price, daily_sigma, L = 2000.0, 0.05, 166_666.67
+    fee = np.array([0.0, 0.0005, 0.003, 0.01])
+    gas_cost = np.array([0.0, 1.0, 0.0, 10.0])
+    sigma = daily_sigma / np.sqrt(BLOCKS_PER_DAY)
+    eta, d = fee_band(fee) / sigma, gas_threshold(gas_cost, L, price, fee) / sigma
+    for blocks in ('poisson', 'deterministic'):
+        result = estimate(price, daily_sigma, fee, gas_cost, L, days=1e-9, blocks=blocks)
+        probability, gain = block_factors(eta, d, blocks)
+        assert -result['lvr'] == pytest.approx(frictionless_lvr(price, daily_sigma, L) * gain, rel=1e-9)
+        assert result['gas'] == pytest.approx(gas_cost * probability * BLOCKS_PER_DAY, rel=1e-12)
+        assert result['arbitrage_gain'] == pytest.approx(-result['lvr'] - result['gas'], rel=1e-12)
+        assert result['trade_probability'][0] == pytest.approx(1.0, rel=1e-12)
+    # E[sqrt(P)] decays over the horizon
+    assert estimate(price, daily_sigma, 0.003, 0.0, L, days=30)['lvr'] > result['lvr'][2]
+    with pytest.raises(ValueError):
+        block_factors(1.0, blocks='exponential')
+
+
+def test_interpolated_ratio_between_the_table_nodes():
+    # off the table nodes, in (t, u) = (eta / (1 + eta), d / (1 + d))
+    for eta, d in [(0.07, 0.0), (0.7, 0.2), (4.3, 1.9), (20.0, 7.0)]:
+        exact = deterministic_block_factors(eta, d)
+        assert block_factors(eta, d) == pytest.approx(exact, rel=1e-3)
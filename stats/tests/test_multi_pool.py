@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+from amm_modified import AMM
+from multi_pool import MultiPoolSimulation
+from price_feed import PressureSeries
+from vectorized_simulation import VectorizedAMM
+
+PARAMETERS = {'L': [166_666.67, 50_000.0, 166_666.67, 300_000.0],
+              'base_fee': [0.003, 0.003, 0.001, 0.005],
+              'alpha': [0.5, 0.2, 0.8, 0.5],
+              'intent_threshold': 0.5}
+
+
+class RecordingAMM(VectorizedAMM):
+    """Keeps the inputs and outputs of every call, to replay them lane by lane."""
+    def __init__(self, price, **kwargs) -> None:
+        super().__init__(price, **kwargs)
+        self.initial_price = np.array(price)
+        self.pressures = []
+        self.swaps = []
+
+    def begin_block(self, block_id, order_bool_pressure):
+        self.pressures.append(np.array(order_bool_pressure))
+        super().begin_block(block_id, order_bool_pressure)
+
+    def trade_to_price_with_gas_fee(self, efficient_off_chain_price, submitted_fee, swapper_id, block_id, gas):
+        outputs = super().trade_to_price_with_gas_fee(efficient_off_chain_price=efficient_off_chain_price,
+                                                      submitted_fee=submitted_fee,
+                                                      swapper_id=swapper_id,
+                                                      block_id=block_id,
+                                                      gas=gas)
+        self.swaps.append((np.array(efficient_off_chain_price), np.array(submitted_fee), np.array(swapper_id),
+                           block_id, gas, *(np.array(output) for output in outputs)))
+        return outputs
+
+
+class RecordingSimulation(MultiPoolSimulation):
+    # few swappers, so some pass the intent threshold
+    number_of_swappers = 120
+
+    def amm(self, prices: np.ndarray) -> VectorizedAMM:
+        self.recording = RecordingAMM(prices,
+                                      **self.parameters,
+                                      number_of_swappers=self.number_of_swappers,
+                                      max_swaps_per_block=self.number_of_swaps_in_block)
+        return self.recording
+
+
+def simulation(**parameters) -> RecordingSimulation:
+    return RecordingSimulation(initial_prices=[3000.0, 150.0],
+                               daily_sigmas=[0.05, 0.08],
+                               correlation=[[1.0, 0.6], [0.6, 1.0]],
+                               days=0.01,
+                               gas_cost=0.5,
+                               asset=[0, 0, 1, 1],
+                               **parameters)
+
+
+def test_every_lane_is_a_single_pool():
+    multi_pool = simulation(**PARAMETERS)
+    results = multi_pool.do_simulation(2)
+    recording = multi_pool.recording
+    pressures = np.stack(recording.pressures, axis=1)
+    for pool in range(multi_pool.pools):
+        parameters = {name: float(values[pool]) for name, values in multi_pool.parameters.items()}
+        amm = AMM(float(recording.initial_price[pool]), **parameters,
+                  price_feed=PressureSeries(pressures[pool]))
+        fee_revenue = 0.0
+        for price, submitted_fee, swapper_id, block_id, gas, x0, y0, f in recording.swaps:
+            outputs = amm.trade_to_price_with_gas_fee(efficient_off_chain_price=float(price[pool]),
+                                                      submitted_fee=float(submitted_fee[pool]),
+                                                      swapper_id=int(swapper_id[pool]),
+                                                      block_id=block_id,
+                                                      gas=gas)
+            assert outputs == pytest.approx((x0[pool], y0[pool], f[pool]), rel=1e-9, abs=1e-12)
+            fee_revenue += outputs[2]
+        assert fee_revenue / multi_pool.days == pytest.approx(results['fee_revenue'][pool], rel=1e-9)
+    # pools on the same asset see the same order book
+    assert np.array_equal(pressures[0], pressures[1]) and np.array_equal(pressures[2], pressures[3])
+    assert np.all(results['gas'] > 0)
+
+
+def test_parameters_are_per_pool():
+    multi_pool = simulation(**PARAMETERS)
+    assert multi_pool.parameters['alpha'].tolist() == PARAMETERS['alpha']
+    assert multi_pool.parameters['intent_threshold'].tolist() == [0.5] * 4
+    assert multi_pool.parameters['m'].tolist() == [0.5] * 4
+    with pytest.raises(ValueError):
+        simulation(gamma=1.0)
@@ -0,0 +1,113 @@
+import math
+import threading
+import time
+import pytest
+import requests
+from order_book_fetcher import OrderBookFetcher
+from order_book_stub import StubOrderBookServer
+
+SNAPSHOTS = [{'bids': [[1999.0, 1.0]], 'asks': [[2001.0, 2.0]]},
+             {'bids': [[1998.0, 3.0]], 'asks': [[2002.0, 4.0]]}]
+
+
+@pytest.fixture
+def stub():
+    with StubOrderBookServer(SNAPSHOTS, port=0) as server:
+        yield server
+
+
+def wait_until(condition, timeout: float=5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.01)
+
+
+def test_latest_is_served(stub):
+    with OrderBookFetcher(stub.url, poll_interval=0.05) as fetcher:
+        assert fetcher.running
+        wait_until(lambda: fetcher.latest() is not None)
+        assert fetcher.latest() in SNAPSHOTS
+        # polled again after `poll_interval`, the stub serving the snapshots in turn
+        wait_until(lambda: stub.requests >= 3)
+        wait_until(fetcher.is_fresh)
+    assert not fetcher.running
+
+
+def test_last_good_snapshot_is_kept_on_errors(stub):
+    fetcher = OrderBookFetcher(stub.url)
+    good = fetcher.fetch()
+    assert good == SNAPSHOTS[0]
+    stub.status = 503
+    assert fetcher.fetch() is None
+    assert isinstance(fetcher.last_error, requests.HTTPError)
+    assert fetcher.latest() == good
+    assert (fetcher.fetches, fetcher.errors) == (2, 1)
+    stub.status = 200
+    assert fetcher.fetch() == SNAPSHOTS[0]
+    assert fetcher.last_error is None
+    fetcher.close()
+
+
+def test_timeout_bounds_a_slow_endpoint(stub):
+    stub.latency = 1.0
+    fetcher = OrderBookFetcher(stub.url, timeout=0.1)
+    started = time.monotonic()
+    assert fetcher.fetch() is None
+    assert time.monotonic() - started < 0.5
+    assert isinstance(fetcher.last_error, requests.Timeout)
+    fetcher.close()
+
+
+def test_latest_does_not_wait_on_the_network(stub):
+    stub.latency = 0.3
+    with OrderBookFetcher(stub.url, poll_interval=0.0, timeout=2.0) as fetcher:
+        wait_until(lambda: fetcher.latest() is not None)
+        # a request is now in flight most of the time
+        started = time.monotonic()
+        for _ in range(1000):
+            fetcher.latest()
+        assert time.monotonic() - started < 0.05
+        assert fetcher.latest() in SNAPSHOTS
+
+
+def test_stub_counts_concurrent_requests(stub):
+    def get():
+        for _ in range(10):
+            requests.get(stub.url, timeout=5.0)
+    threads = [threading.Thread(target=get) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert stub.requests == 80
+
+
+def test_naik_lewandro_amm_reads_the_stub():
+    from naik_lewandro_amm import AMM
+    book = {'bids': [[1999.0, 1.0], [1998.0, 5.0]], 'asks': [[2001.0, 2.0], [2002.0, 1.0]]}
+    with StubOrderBookServer([book], port=0) as stub:
+        amm = AMM(math.sqrt(2000.0), 0.003, 166_666.67, cex_api_url=stub.url, order_book_poll_interval=0.05)
+        assert amm.process_order_book_data() == (None, None, None, None)
+        # the first block end starts the fetcher, without waiting for its slow first request
+        stub.latency = 0.5
+        started = time.monotonic()
+        amm.end_block()
+        assert time.monotonic() - started < 0.25
+        assert amm.order_book_data is None
+        stub.latency = 0.0
+        assert amm.order_book_fetcher.running
+        wait_until(lambda: amm.order_book_fetcher.latest() is not None)
+        amm.end_block()
+        assert amm.order_book_data == book
+        assert amm.process_order_book_data() == (1.0, 2.0, 6.0, 3.0)
+        # more ask than bid at the top of the book: buying costs more
+        assert amm.calculate_dynamic_fee('buy') == pytest.approx(0.0045)
+        assert amm.calculate_dynamic_fee('sell') == pytest.approx(0.0015)
+        # the last good book is kept while the CEX fails
+        stub.status = 503
+        wait_until(lambda: amm.order_book_fetcher.last_error is not None)
+        amm.end_block()
+        assert amm.order_book_data == book and amm.total_blocks == 3
+        amm.close()
+        assert not amm.order_book_fetcher.running
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from order_statistics import SortedFees
+
+EPSILON = np.finfo(np.float64).eps
+
+FEES = {'uniform': lambda rng, n: rng.uniform(0.0, 0.003, n),
+        'clustered': lambda rng, n: 0.0015 + rng.uniform(0.0, 1e-9, n),
+        'outlier_first': lambda rng, n: np.r_[0.03, rng.uniform(0.0, 0.003, n - 1)],
+        'descending': lambda rng, n: np.sort(rng.uniform(0.0, 0.003, n))[::-1],
+        'repeated': lambda rng, n: rng.choice([0.001, 0.002, 0.0025], n)}
+
+
+@pytest.mark.parametrize('fees', FEES)
+def test_trimmed_mean_and_std_against_numpy(fees):
+    rng = np.random.default_rng(1)
+    for _ in range(10):
+        n = int(rng.integers(2, 1000))
+        block = FEES[fees](rng, n)
+        sorted_fees = SortedFees()
+        for i, fee in enumerate(block.tolist()):
+            sorted_fees.append(fee)
+            seen = block[:i + 1]
+            # the cut-off may move between swaps
+            cut_off_percentile = rng.choice([0.5, 0.85, 0.9, 1.0])
+            cutoff_index = int((i + 1) * cut_off_percentile)
+            mean, std = sorted_fees.trimmed_mean_and_std(cut_off_percentile)
+            if cutoff_index == 0:
+                assert np.isnan(mean) and np.isnan(std)
+                continue
+            trimmed = np.sort(seen)[:cutoff_index]
+            assert abs(mean - trimmed.mean()) <= 1e-13 * np.abs(seen).max()
+            assert abs(std - trimmed.std()) <= np.sqrt((i + 1) * EPSILON) * np.abs(seen - block[0]).max()
+        assert list(sorted_fees) == np.sort(block).tolist()
+
+
+def test_snapshot_and_restore():
+    sorted_fees = SortedFees(capacity=2)
+    for fee in (0.002, 0.001, 0.003):
+        sorted_fees.append(fee)
+    snapshot = sorted_fees.snapshot()
+    expected = sorted_fees.trimmed_mean_and_std(0.85)
+    sorted_fees.clear()
+    assert len(sorted_fees) == 0
+    restored = SortedFees(capacity=1)
+    restored.restore(snapshot)
+    assert list(restored) == [0.001, 0.002, 0.003]
+    assert restored.trimmed_mean_and_std(0.85) == expected
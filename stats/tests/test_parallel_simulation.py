@@ -0,0 +1,37 @@
+import numpy as np
+from parallel_simulation import ParallelSimulation
+from sketches import ResultsSummary
+
+Q = np.linspace(0.05, 0.95, 19)
+
+
+def simulation() -> ParallelSimulation:
+    return ParallelSimulation(2000.0, 0.05, 0.01, 0.5, 166_666.67, 0.003, 6)
+
+
+def test_results_do_not_depend_on_the_workers():
+    expected = simulation().do_simulation(3, max_workers=1)
+    assert expected.shape == (3, 6)
+    for max_workers, paths_per_task in ((2, None), (3, 1), (2, 4)):
+        assert np.array_equal(simulation().do_simulation(3, max_workers, paths_per_task), expected)
+    # the serial runner draws path i from the same stream
+    assert np.array_equal(simulation().do_simulation_jit(3), expected)
+    assert not np.array_equal(simulation().do_simulation(4, max_workers=1), expected)
+
+
+def test_entropy_reproduces_an_unseeded_run():
+    first = simulation()
+    results = first.do_simulation(max_workers=2)
+    assert np.array_equal(simulation().do_simulation(first.entropy, max_workers=1), results)
+
+
+def test_summaries_are_merged_in_shard_order():
+    summaries = []
+    for max_workers in (1, 3):
+        summary = ResultsSummary(seed=0)
+        simulation().do_simulation(5, max_workers, paths_per_task=2, summary=summary)
+        summaries.append(summary)
+    assert summaries[0].names == summaries[1].names
+    for name in summaries[0].names:
+        assert summaries[0].moments[name].count == summaries[1].moments[name].count > 0
+        assert np.array_equal(summaries[0].quantiles(name, Q), summaries[1].quantiles(name, Q), equal_nan=True)
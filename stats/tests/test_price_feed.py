@@ -0,0 +1,68 @@
+import os
+import numpy as np
+import pytest
+from price_feed import PressureSeries, l1_order_book_pressure
+
+
+def test_pressure_is_indexed_from_the_first_block():
+    series = PressureSeries(np.arange(5.0), first_block=10)
+    assert series.pressure(10) == 0.0 and series.pressure(14) == 4.0
+    with pytest.raises(IndexError):
+        series.pressure(8)
+    with pytest.raises(IndexError):
+        series.pressure(15)
+
+
+def test_simulate_draws_distinct_sizes():
+    series = PressureSeries.simulate(np.random.default_rng(0), 20_000, first_block=1)
+    assert len(series) == 20_000 and series.first_block == 1
+    pressures = series.pressures
+    # sizes in 1..1000, never equal: the pressure is never that of a balanced book
+    balanced = l1_order_book_pressure(0.995, 1, 1.005, 1)
+    assert not np.any(np.isclose(pressures, balanced, rtol=0, atol=1e-15))
+    assert -1 < pressures.min() < -0.99 and 0.99 < pressures.max() < 1
+    # symmetric sizes, centred on the balanced pressure
+    assert abs(np.median(pressures) - balanced) < 0.02
+
+
+SNAPSHOTS = {'bid_price': [1999.0, 1998.0], 'bid_size': [1.0, 3.0],
+             'ask_price': [2001.0, 2002.0], 'ask_size': [2.0, 1.0],
+             'bid_price_2': [1997.0, 1996.0], 'bid_size_2': [5.0, 1.0],
+             'ask_price_2': [2003.0, 2004.0], 'ask_size_2': [1.0, 4.0]}
+
+
+def test_from_snapshots_one_level():
+    series = PressureSeries.from_snapshots(SNAPSHOTS, levels=1)
+    expected = [l1_order_book_pressure(1999.0, 1.0, 2001.0, 2.0), l1_order_book_pressure(1998.0, 3.0, 2002.0, 1.0)]
+    assert series.pressures.tolist() == pytest.approx(expected, rel=1e-15)
+
+
+def test_from_snapshots_two_levels():
+    series = PressureSeries.from_snapshots(SNAPSHOTS, levels=2)
+    bid = 1999.0 * 1.0 + 1997.0 * 5.0
+    ask = 2001.0 * 2.0 + 2003.0 * 1.0
+    assert series.pressure(0) == pytest.approx((ask - bid) / (ask + bid), rel=1e-15)
+    with pytest.raises(ValueError):
+        PressureSeries.from_snapshots({name: SNAPSHOTS[name] for name in PressureSeries.L1_COLUMNS}, levels=2)
+    with pytest.raises(ValueError):
+        PressureSeries.from_snapshots(SNAPSHOTS, levels=3)
+
+
+def test_load_caches_the_pressures(tmp_path):
+    filename = str(tmp_path / 'book.csv')
+    with open(filename, 'w') as f:
+        f.write(','.join(PressureSeries.L1_COLUMNS) + '\n')
+        f.write('1999,1,2001,2\n1998,3,2002,1\n')
+    loaded = PressureSeries.load(filename, first_block=5)
+    cache = filename + '.l1.npy'
+    assert os.path.exists(cache)
+    assert np.array_equal(loaded.pressures, PressureSeries.from_snapshots(SNAPSHOTS).pressures)
+    assert loaded.pressure(6) == loaded.pressures[1]
+    # a later load maps the cache, until the source changes
+    np.save(cache, np.zeros(2))
+    os.utime(cache, (os.path.getmtime(filename) + 10,) * 2)
+    assert PressureSeries.load(filename).pressures.tolist() == [0.0, 0.0]
+    os.utime(filename, (os.path.getmtime(cache) + 10,) * 2)
+    assert np.array_equal(PressureSeries.load(filename).pressures, loaded.pressures)
+    # a .npy file is the series itself
+    assert PressureSeries.load(cache).pressures.tolist() == loaded.pressures.tolist()
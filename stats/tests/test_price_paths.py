@@ -0,0 +1,73 @@
+import json
+import numpy as np
+import pytest
+import price_paths
+from price_paths import GBMPricePaths, path_rng
+
+
+def simulation_path(rng, p0: float, sigma: float, total_number_of_blocks: int) -> np.ndarray:
+    """The path of `Simulation.do_simulation`."""
+    z = np.cumsum(rng.normal(0.0, sigma, total_number_of_blocks))
+    prices = np.exp(z - (np.arange(total_number_of_blocks) * sigma**2)/2)
+    return (prices / prices[0]) * p0
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 1000, 65_536])
+def test_chunks_are_bit_identical_to_the_simulation_path(chunk_size):
+    paths = GBMPricePaths(2000.0, 0.05, 0.5, chunk_size=chunk_size)
+    expected = simulation_path(np.random.default_rng(3), 2000.0, paths.sigma, paths.total_number_of_blocks)
+    prices = paths.path(np.random.default_rng(3))
+    assert prices.shape == (paths.total_number_of_blocks,)
+    assert np.array_equal(prices, expected)
+
+
+def test_memmap_is_bit_identical_across_chunk_sizes(tmp_path):
+    files = []
+    for chunk_size in (5, 4096):
+        filename = str(tmp_path / f'paths_{chunk_size}.npy')
+        GBMPricePaths(2000.0, 0.05, 0.25, chunk_size=chunk_size).write_memmap(filename, 3, seed=11)
+        files.append(np.load(filename))
+    assert np.array_equal(*files)
+    entropy = np.random.SeedSequence(11).entropy
+    assert np.array_equal(files[0][2], GBMPricePaths(2000.0, 0.05, 0.25).path(path_rng(entropy, 2)))
+
+
+def test_open_memmap_reuses_only_matching_files(tmp_path):
+    filename = str(tmp_path / 'paths.npy')
+    paths = GBMPricePaths(2000.0, 0.05, 0.1)
+    first = np.array(paths.open_memmap(filename, 2, seed=1))
+    with open(filename + '.json') as f:
+        assert json.load(f)['paths'] == 2
+    assert np.array_equal(paths.open_memmap(filename, 2, seed=1), first)
+    other = paths.open_memmap(filename, 2, seed=2)
+    assert not np.array_equal(other, first)
+    assert np.array_equal(GBMPricePaths(2000.0, 0.05, 0.1).open_memmap(filename, 2, seed=1), first)
+
+
+def test_interrupted_write_is_not_reused(tmp_path, monkeypatch):
+    filename = str(tmp_path / 'paths.npy')
+    paths = GBMPricePaths(2000.0, 0.05, 0.1)
+    expected = np.array(paths.open_memmap(filename, 3, seed=1))
+
+    def failing_rng(entropy, path):
+        if path == 1:
+            raise KeyboardInterrupt
+        return path_rng(entropy, path)
+    monkeypatch.setattr(price_paths, 'path_rng', failing_rng)
+    with pytest.raises(KeyboardInterrupt):
+        paths.write_memmap(filename, 3, seed=2)
+    monkeypatch.undo()
+    # never the paths of seed 1 partly overwritten by those of seed 2
+    assert np.array_equal(paths.open_memmap(filename, 3, seed=1), expected)
+
+
+def test_antithetic_mirrors_the_normal_draws():
+    paths = GBMPricePaths(2000.0, 0.05, 0.1)
+    rng = np.random.default_rng(5)
+    draws = rng.normal(0.0, paths.sigma, paths.total_number_of_blocks)
+    prices = paths.path(np.random.default_rng(5))
+    mirrored = paths.antithetic(prices)
+    # log-returns are the negated draws, minus the martingale drift
+    expected = -draws[1:] - paths.sigma**2 / 2
+    assert np.allclose(np.diff(np.log(mirrored)), expected, rtol=0, atol=1e-12)
+    assert mirrored[0] == prices[0]
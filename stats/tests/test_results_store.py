@@ -0,0 +1,75 @@
+import random
+import numpy as np
+import pytest
+from results_store import COLUMNS, ResultsReader, ResultsRecorder
+from simulation import Simulation
+
+
+def record(directory, paths: int=3, blocks: int=5, chunk_rows: int=4) -> dict[str, np.ndarray]:
+    """Rows of `paths` paths of `blocks` blocks, recorded path by path."""
+    rng = np.random.default_rng(0)
+    rows = {name: [] for name in COLUMNS}
+    with ResultsRecorder(str(directory), chunk_rows=chunk_rows) as recorder:
+        for path in range(paths):
+            for block in range(blocks):
+                row = {'path': path, 'block': block, **{name: float(rng.random()) for name in list(COLUMNS)[2:]}}
+                recorder.record_block(**row)
+                for name, value in row.items():
+                    rows[name].append(value)
+    return {name: np.array(values, dtype=dtype) for (name, values), dtype in zip(rows.items(), COLUMNS.values())}
+
+
+def test_round_trip(tmp_path):
+    expected = record(tmp_path)
+    reader = ResultsReader(str(tmp_path))
+    assert reader.columns == list(COLUMNS)
+    assert len(reader) == 15
+    table = reader.select()
+    for name in COLUMNS:
+        assert table[name].dtype == np.dtype(COLUMNS[name])
+        assert np.array_equal(table[name], expected[name])
+
+
+def test_record_blocks_appends_many_rows(tmp_path):
+    with ResultsRecorder(str(tmp_path), chunk_rows=2) as recorder:
+        recorder.record_block(0, 0, *[1.0] * 10)
+        recorder.record_blocks(path=np.arange(1, 4), block=1, **{name: 2.0 for name in list(COLUMNS)[2:]})
+    reader = ResultsReader(str(tmp_path))
+    assert reader.column('path').tolist() == [0, 1, 2, 3]
+    assert reader.column('block').tolist() == [0, 1, 1, 1]
+    assert reader.column('gas').tolist() == [1.0, 2.0, 2.0, 2.0]
+
+
+def test_select_and_paths(tmp_path):
+    expected = record(tmp_path, paths=7, blocks=3)
+    reader = ResultsReader(str(tmp_path))
+    assert reader.paths().tolist() == list(range(7))
+    assert reader.paths(chunk_rows=2).tolist() == list(range(7))
+    selected = reader.select(['block', 'combined_fee'], paths=range(3, 5))
+    assert set(selected) == {'block', 'combined_fee'}
+    rows = (expected['path'] >= 3) & (expected['path'] < 5)
+    assert np.array_equal(selected['combined_fee'], expected['combined_fee'][rows])
+    assert selected['block'].tolist() == [0, 1, 2, 0, 1, 2]
+    assert np.array_equal(reader.rows([6, 0], chunk_rows=4), np.flatnonzero(np.isin(expected['path'], [0, 6])))
+    with pytest.raises(ValueError):
+        reader.select(['no_such_column'])
+
+
+def test_empty_table(tmp_path):
+    ResultsRecorder(str(tmp_path)).close()
+    reader = ResultsReader(str(tmp_path))
+    assert len(reader) == 0
+    assert reader.paths().tolist() == []
+
+
+def test_simulation_records_every_block(tmp_path):
+    random.seed(1)
+    np.random.seed(1)
+    simulation = Simulation(2000.0, 0.05, 0.01, 1.0, 166_666.67, 0.003, 2)
+    with ResultsRecorder(str(tmp_path), chunk_rows=16) as recorder:
+        simulation.do_simulation(recorder=recorder)
+    reader = ResultsReader(str(tmp_path))
+    blocks = int(0.01 * simulation.blocks_per_day) - 1
+    assert reader.paths().tolist() == [0, 1]
+    assert len(reader) == 2 * blocks
+    assert reader.select(['block'], paths=[1])['block'].tolist() == list(range(blocks))
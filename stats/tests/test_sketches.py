@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+from sketches import KLLSketch, ResultsSummary, RunningMoments
+
+K = 200
+# documented rank error with high probability, about 1.7 / k
+RANK_ERROR = 1.7 / K
+Q = np.linspace(0.01, 0.99, 99)
+
+
+def rank_error(sketch: KLLSketch, values: np.ndarray) -> float:
+    """Largest distance between `Q` and the rank in `values` of the sketch's quantiles."""
+    ordered = np.sort(values)
+    estimates = sketch.quantiles(Q)
+    low = np.searchsorted(ordered, estimates, side='left') / ordered.shape[0]
+    high = np.searchsorted(ordered, estimates, side='right') / ordered.shape[0]
+    # ties: any rank between the first and the last copy is exact
+    return float(np.max(np.maximum(np.maximum(low - Q, Q - high), 0.0)))
+
+
+def stream(seed: int, size: int=200_000) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return np.concatenate([rng.lognormal(0.0, 1.0, size // 2), rng.normal(-5.0, 0.5, size - size // 2)])
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_rank_error_against_np_quantile(seed):
+    values = stream(seed)
+    sketch = KLLSketch(K, seed=seed)
+    for batch in np.array_split(values, 997):
+        sketch.update(batch)
+    assert sketch.count == values.shape[0]
+    assert rank_error(sketch, values) <= RANK_ERROR
+    # np.quantile on the same ranks, as a value check
+    exact = np.quantile(values, Q)
+    spread = np.quantile(values, np.clip(Q + RANK_ERROR, 0, 1)) - np.quantile(values, np.clip(Q - RANK_ERROR, 0, 1))
+    assert np.all(np.abs(sketch.quantiles(Q) - exact) <= spread)
+    # memory stays about 3 k items
+    assert sum(items.shape[0] for items in sketch.levels) <= 3 * K
+
+
+def test_merged_sketches_summarise_the_combined_stream():
+    parts = [stream(seed, 50_000) for seed in range(4)]
+    combined = np.concatenate(parts)
+    merged = KLLSketch(K, seed=10)
+    for i, part in enumerate(parts):
+        sketch = KLLSketch(K, seed=20 + i)
+        sketch.update(part)
+        merged.merge(sketch)
+    single = KLLSketch(K, seed=30)
+    single.update(combined)
+    assert merged.count == single.count == combined.shape[0]
+    assert rank_error(merged, combined) <= RANK_ERROR
+    assert rank_error(single, combined) <= RANK_ERROR
+    # both within the bound of the true ranks, so within twice it of each other
+    assert np.max(np.abs(merged.cdf(single.quantiles(Q)) - Q)) <= 2 * RANK_ERROR
+
+
+def test_merge_requires_the_same_k():
+    with pytest.raises(ValueError):
+        KLLSketch(200).merge(KLLSketch(100))
+
+
+def test_running_moments_merge_against_numpy():
+    rng = np.random.default_rng(3)
+    parts = [rng.normal(1e6, 1.0, 1000), rng.normal(1e6 + 5.0, 3.0, 10), np.array([]), rng.uniform(1e6, 1e6 + 1, 4321)]
+    merged = RunningMoments()
+    for part in parts:
+        moments = RunningMoments()
+        for batch in np.array_split(part, 7):
+            moments.update(batch)
+        merged.merge(moments)
+    values = np.concatenate(parts)
+    assert merged.count == values.shape[0]
+    assert merged.mean == pytest.approx(values.mean(), rel=1e-14)
+    assert merged.variance == pytest.approx(values.var(ddof=1), rel=1e-9)
+    assert merged.std == pytest.approx(values.std(ddof=1), rel=1e-9)
+    assert (merged.min, merged.max) == (values.min(), values.max())
+
+
+def test_summary_merge_and_save(tmp_path):
+    values = stream(5, 20_000)
+    summaries = [ResultsSummary(seed=[1, i]) for i in range(2)]
+    for summary, part in zip(summaries, np.array_split(values, 2)):
+        summary.update('lvr', part)
+        summary.update('fee', np.where(part > 0, part, np.nan))
+    merged = summaries[0].merge(summaries[1])
+    assert merged.moments['lvr'].count == values.shape[0]
+    assert merged.moments['fee'].count == np.count_nonzero(values > 0)
+    assert rank_error(merged.sketches['lvr'], values) <= RANK_ERROR
+    counts, edges = merged.histogram('lvr', bins=10)
+    assert counts.sum() == pytest.approx(values.shape[0])
+    assert edges.shape == (11,)
+    merged.save(str(tmp_path / 'summary.pkl'))
+    loaded = ResultsSummary.load(str(tmp_path / 'summary.pkl'))
+    assert loaded.names == ['lvr', 'fee']
+    assert np.array_equal(loaded.quantiles('lvr', Q), merged.quantiles('lvr', Q))
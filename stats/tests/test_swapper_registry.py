@@ -0,0 +1,72 @@
+import numpy as np
+from swapper_registry import SwapperRegistry
+
+
+def test_intent_rate_is_at_most_one():
+    registry = SwapperRegistry(window=4)
+    rates = []
+    for _ in range(10):
+        registry.record('loyal')
+        rates.append(registry.intent_rate('loyal'))
+        registry.end_block()
+    # completed blocks with a swap per completed block, the current one left out
+    assert rates[0] == 0.0
+    assert rates[1:] == [1.0] * 9
+    registry.record('loyal')
+    assert registry.intent_rate('loyal') == 1.0
+
+
+def test_intent_rate_counts_completed_blocks_of_the_window():
+    registry = SwapperRegistry(window=4)
+    for block in range(8):
+        if block % 2 == 0:
+            registry.record(7)
+        registry.end_block()
+    # blocks 4 and 6 of the completed blocks 4..7
+    assert registry.intent_rate(7) == 0.5
+    registry.record(7)
+    assert registry.intent_rate(7) == 0.5
+    assert registry.in_current_block(7)
+
+
+def test_window_expiry_releases_slots():
+    registry = SwapperRegistry(window=3, capacity=8)
+    for swapper in range(20):
+        registry.record(swapper)
+    registry.end_block()
+    assert len(registry) == 20
+    for _ in range(2):
+        registry.record(0)
+        registry.end_block()
+    assert len(registry) == 20 and 5 in registry
+    registry.end_block()
+    # block 0 left the window, only swapper 0 swapped since
+    assert len(registry) == 1 and 5 not in registry and 0 in registry
+    assert registry.intent_rate(0) == 2 / 3
+    assert registry.intent_rate(5) == 0.0
+    registry.record('new')
+    assert registry._slots['new'] < 20
+    assert registry.counts.sum() == 3
+
+
+def test_snapshot_and_restore():
+    rng = np.random.default_rng(0)
+    registry = SwapperRegistry(window=5, capacity=8)
+    for _ in range(12):
+        for swapper in rng.integers(0, 30, 10).tolist():
+            registry.record(swapper)
+        registry.end_block()
+    registry.record(3)
+    snapshot = registry.snapshot()
+    expected = {swapper: registry.intent_rate(swapper) for swapper in range(30)}
+    for _ in range(7):
+        for swapper in rng.integers(0, 60, 10).tolist():
+            registry.record(swapper)
+        registry.end_block()
+    registry.restore(snapshot)
+    assert {swapper: registry.intent_rate(swapper) for swapper in range(30)} == expected
+    assert registry.in_current_block(3)
+    # the snapshot is not shared with the restored registry
+    registry.end_block()
+    registry.restore(snapshot)
+    assert {swapper: registry.intent_rate(swapper) for swapper in range(30)} == expected
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from trader_population import TraderPopulation
+
+
+def test_offsets_respect_the_swap_cap():
+    population = TraderPopulation(loyal_swappers=20, swaps_per_block=60, swap_count_dispersion=2.0,
+                                  max_swaps_per_block=50, activity_exponent=1.0, seed=1)
+    flow = population.draw(np.random.default_rng(0), 2000)
+    assert len(flow) == 2000
+    assert flow.offsets[0] == 0 and flow.offsets[-1] == flow.swapper_ids.shape[0]
+    assert np.array_equal(flow.swaps_per_block, np.diff(flow.offsets))
+    assert flow.swaps_per_block.max() == 50
+    assert flow.swaps_per_block.min() >= 0
+    for block in range(len(flow)):
+        ids = flow.block(block)['swapper_ids']
+        assert np.unique(ids).shape[0] == ids.shape[0]
+
+
+def test_loyal_swappers_are_active_at_their_rate():
+    population = TraderPopulation(loyal_swappers=10, loyal_activity=0.97, seed=1)
+    blocks = 5000
+    flow = population.draw(np.random.default_rng(0), blocks)
+    loyal = flow.swapper_ids <= 10
+    rate = np.bincount(flow.swapper_ids[loyal], minlength=11)[1:] / blocks
+    # 4 standard deviations of the rate over `blocks` blocks
+    assert np.abs(rate - 0.97).max() < 4 * np.sqrt(0.97 * 0.03 / blocks)
+    assert (flow.swaps_per_block - np.bincount(np.repeat(np.arange(blocks), flow.swaps_per_block)[loyal],
+                                                minlength=blocks) == 99).all()
+
+
+def test_fee_submission_rate():
+    population = TraderPopulation(fee_submission_rate=0.3, seed=1)
+    flow = population.draw(np.random.default_rng(0), 2000)
+    swaps = flow.submitted_fees.shape[0]
+    submitted = ~np.isnan(flow.submitted_fees)
+    assert abs(submitted.mean() - 0.3) < 4 * np.sqrt(0.3 * 0.7 / swaps)
+    assert (flow.submitted_fees[submitted] >= 0).all() and (flow.submitted_fees[submitted] < 0.003).all()
+
+
+def test_default_flow_is_the_simulation_flow():
+    """99 informed swaps per block by distinct uniform swappers, fees uniform in [0, 0.003)."""
+    blocks = 2000
+    flow = TraderPopulation(seed=1).draw(np.random.default_rng(0), blocks)
+    assert (flow.swaps_per_block == 99).all()
+    assert flow.informed.all() and (flow.trade_sizes == 0).all()
+    for block in range(blocks):
+        assert np.unique(flow.block(block)['swapper_ids']).shape[0] == 99
+    # chi-square of the swapper counts against uniform over 1..1000, 999 degrees of freedom
+    counts = np.bincount(flow.swapper_ids, minlength=1001)[1:]
+    expected = flow.swapper_ids.shape[0] / 1000
+    chi2 = ((counts - expected)**2 / expected).sum()
+    assert abs(chi2 - 999) < 5 * np.sqrt(2 * 999)
+    fees = np.sort(flow.submitted_fees)
+    assert fees[0] >= 0 and fees[-1] < 0.003
+    # Kolmogorov-Smirnov distance to uniform, about 1.95 / sqrt(n) at the 0.1% level
+    ks = np.abs(fees / 0.003 - np.arange(1, fees.shape[0] + 1) / fees.shape[0]).max()
+    assert ks < 1.95 / np.sqrt(fees.shape[0])
+
+
+def test_all_loyal_swappers_need_no_other_swaps():
+    with pytest.raises(ValueError):
+        TraderPopulation(number_of_swappers=10, loyal_swappers=10)
+    flow = TraderPopulation(number_of_swappers=10, loyal_swappers=10, swaps_per_block=0,
+                            seed=1).draw(np.random.default_rng(0), 100)
+    assert flow.swapper_ids.max() <= 10
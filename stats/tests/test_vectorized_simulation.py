@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+from vectorized_simulation import VectorizedSimulation, scalar_reference
+
+
+class LoyalSimulation(VectorizedSimulation):
+    """Every swapper swaps in every block, so all of them pass the intent threshold."""
+    number_of_swappers = VectorizedSimulation.number_of_swaps_in_block
+
+
+@pytest.mark.parametrize('simulation_class', [VectorizedSimulation, LoyalSimulation])
+@pytest.mark.parametrize('gas_cost', [0.0, 0.5])
+def test_run_equals_scalar_reference(simulation_class, gas_cost):
+    simulation = simulation_class(initial_price=3000.0,
+                                  daily_sigma=0.05,
+                                  days=0.02,
+                                  gas_cost=gas_cost,
+                                  liquidity_per_basis_point=1,
+                                  base_pool_fee=0.003,
+                                  paths=4)
+    blocks = list(simulation.draw_blocks(np.random.default_rng(1)))
+    results = simulation.run(blocks)
+    expected = scalar_reference(simulation, blocks)
+    assert results.shape == expected.shape == (3, 4)
+    np.testing.assert_allclose(results, expected, rtol=1e-9, atol=0)
+    # the paths did trade
+    assert np.all(expected[1] != 0.0)
+
+
+def test_do_simulation_is_run_over_draw_blocks():
+    simulation = VectorizedSimulation(3000.0, 0.05, 0.005, 0.5, 1, 0.003, 3)
+    expected = simulation.run(simulation.draw_blocks(np.random.default_rng(7)))
+    assert np.array_equal(simulation.do_simulation(7), expected)
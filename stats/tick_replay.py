@@ -0,0 +1,218 @@
+"""
+Historical tick replay.
+
+`block_prices` resamples a tick file (CSV or Parquet, sorted by time) to
+the block grid: the price of a block is the last tick at or before its
+end, carried forward over blocks without ticks. The file is streamed in
+chunks into a columnar cache (`price` and `ticks` per block, see
+`columnar`), so memory use does not depend on the size of the dataset.
+The cache records the source file's size and modification time and the
+resampling settings; later calls with the same file and settings map
+the cache without parsing anything.
+
+    prices = block_prices('btcusd_ticks.csv')
+    ReplaySimulation(prices, gas_cost=1.0, ...).do_simulation()
+"""
+import csv
+import json
+import os
+import shutil
+from datetime import datetime
+import numpy as np
+from columnar import ColumnarSink, read_columns
+from simulation import Simulation
+from gas_model import GasModel
+
+BLOCK_TIME = 13.2
+
+
+def _timestamp(value: str) -> float:
+    """Unix seconds, or an ISO 8601 date-time."""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def read_tick_chunks(filename: str,
+                     timestamp_column: str='timestamp',
+                     price_column: str='price',
+                     chunk_rows: int=1_000_000):
+    """
+    Yields (timestamps, prices) arrays of up to `chunk_rows` ticks.
+    Without a `price_column`, the mid of `bid` and `ask` columns is used.
+    """
+    if filename.endswith('.parquet'):
+        # optional dependency, only needed for parquet files
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(filename)
+        names = parquet.schema_arrow.names
+        columns = [timestamp_column] + ([price_column] if price_column in names else ['bid', 'ask'])
+        for batch in parquet.iter_batches(batch_size=chunk_rows, columns=columns):
+            values = [batch.column(i).to_numpy(zero_copy_only=False) for i in range(len(columns))]
+            timestamps = np.asarray(values[0], dtype=np.float64) \
+                if np.issubdtype(values[0].dtype, np.number) else \
+                values[0].astype('datetime64[ns]').astype(np.int64) / 1e9
+            prices = values[1] if len(values) == 2 else (values[1] + values[2]) / 2
+            yield timestamps, np.asarray(prices, dtype=np.float64)
+        return
+    if not filename.endswith('.csv'):
+        raise ValueError(f"Unsupported tick file {filename}, expected .csv or .parquet.")
+    with open(filename, newline='') as f:
+        reader = csv.reader(f)
+        header = [name.strip() for name in next(reader)]
+        if timestamp_column not in header:
+            raise ValueError(f"{filename} has no {timestamp_column!r} column.")
+        time_index = header.index(timestamp_column)
+        if price_column in header:
+            price_indices = [header.index(price_column)]
+        elif 'bid' in header and 'ask' in header:
+            price_indices = [header.index('bid'), header.index('ask')]
+        else:
+            raise ValueError(f"{filename} has neither a {price_column!r} nor bid and ask columns.")
+        parse = float
+        rows = []
+        for row in reader:
+            if not row:
+                continue
+            if not rows and parse is float:
+                # ISO dates are slower to parse, decided once on the first tick
+                try:
+                    float(row[time_index])
+                except ValueError:
+                    parse = _timestamp
+            rows.append((parse(row[time_index]), *(float(row[i]) for i in price_indices)))
+            if len(rows) == chunk_rows:
+                yield _chunk(rows)
+                rows = []
+        if rows:
+            yield _chunk(rows)
+
+
+def _chunk(rows: list[tuple]) -> tuple[np.ndarray, np.ndarray]:
+    values = np.array(rows, dtype=np.float64)
+    prices = values[:, 1] if values.shape[1] == 2 else (values[:, 1] + values[:, 2]) / 2
+    return values[:, 0], prices
+
+
+def resample_to_blocks(chunks, sink: ColumnarSink, block_time: float=BLOCK_TIME) -> dict:
+    """
+    Appends the price and the number of ticks of every block to `sink`,
+    from the first tick on.
+    Returns:
+        start (timestamp of the start of block 0), blocks and ticks.
+    """
+    start = None
+    # last block seen so far, complete only once a later block shows up
+    pending_block, pending_price, pending_ticks = None, None, 0
+    next_block = 0
+    last_price = np.nan
+    ticks = 0
+    last_timestamp = -np.inf
+
+    def write(blocks: np.ndarray, prices: np.ndarray, counts: np.ndarray) -> None:
+        """Writes blocks `next_block`..`blocks[-1]`, carrying prices forward."""
+        nonlocal next_block, last_price
+        grid = np.arange(next_block, blocks[-1] + 1)
+        index = np.searchsorted(blocks, grid, side='right') - 1
+        # blocks before the first one with ticks keep the last written price
+        block_prices = np.where(index >= 0, prices[index], last_price)
+        block_counts = np.zeros(grid.shape[0], dtype=np.int64)
+        block_counts[blocks - next_block] = counts
+        sink.append_rows(block_prices, block_counts)
+        next_block = int(blocks[-1]) + 1
+        last_price = prices[-1]
+
+    for timestamps, prices in chunks:
+        if timestamps.shape[0] == 0:
+            continue
+        if start is None:
+            start = float(timestamps[0])
+        if timestamps[0] < last_timestamp or np.any(np.diff(timestamps) < 0):
+            raise ValueError("Ticks must be sorted by timestamp.")
+        last_timestamp = timestamps[-1]
+        ticks += timestamps.shape[0]
+        blocks = ((timestamps - start) // block_time).astype(np.int64)
+        # last tick and number of ticks of each block in the chunk
+        last = np.flatnonzero(np.r_[blocks[1:] != blocks[:-1], True])
+        counts = np.diff(np.r_[-1, last])
+        blocks, prices, counts = blocks[last], prices[last], counts
+        if pending_block is not None:
+            if pending_block == blocks[0]:
+                counts[0] += pending_ticks
+            else:
+                blocks = np.r_[pending_block, blocks]
+                prices = np.r_[pending_price, prices]
+                counts = np.r_[pending_ticks, counts]
+        if blocks.shape[0] > 1:
+            write(blocks[:-1], prices[:-1], counts[:-1])
+        pending_block, pending_price, pending_ticks = blocks[-1], prices[-1], counts[-1]
+    if pending_block is None:
+        raise ValueError("No ticks to resample.")
+    write(np.array([pending_block]), np.array([pending_price]), np.array([pending_ticks]))
+    return {'start': start, 'blocks': next_block, 'ticks': ticks}
+
+
+def block_prices(filename: str,
+                 block_time: float=BLOCK_TIME,
+                 cache: str|None=None,
+                 timestamp_column: str='timestamp',
+                 price_column: str='price',
+                 chunk_rows: int=1_000_000) -> np.ndarray:
+    """
+    Read-only, memory-mapped block prices of a tick file, resampled on the
+    first call and read from the cache directory (`<filename>.blocks` by
+    default) afterwards.
+    """
+    cache = cache or f"{filename}.blocks"
+    source = {'filename': os.path.abspath(filename),
+              'size': os.path.getsize(filename),
+              'mtime': os.path.getmtime(filename),
+              'block_time': block_time,
+              'timestamp_column': timestamp_column,
+              'price_column': price_column}
+    metadata = os.path.join(cache, 'replay.json')
+    if os.path.exists(metadata):
+        with open(metadata) as f:
+            if json.load(f)['source'] == source:
+                return read_columns(cache)['price']
+        shutil.rmtree(cache)
+    with ColumnarSink(cache, {'price': 'f8', 'ticks': 'i8'}) as sink:
+        summary = resample_to_blocks(read_tick_chunks(filename, timestamp_column, price_column, chunk_rows),
+                                     sink,
+                                     block_time)
+    # written last, an interrupted build is redone on the next call
+    with open(metadata, 'w') as f:
+        json.dump({'source': source, **summary}, f)
+    return read_columns(cache)['price']
+
+
+class ReplaySimulation(Simulation):
+    """
+    `Simulation` driven by replayed block prices instead of GBM paths.
+    Every path replays the same prices with its own submitted fees,
+    swappers and order books.
+    """
+    def __init__(self,
+                 prices: np.ndarray,
+                 gas_cost: float,
+                 liquidity_per_basis_point: float,
+                 base_pool_fee: float,
+                 paths: int=1,
+                 block_time: float=BLOCK_TIME,
+                 gas_model: GasModel|None=None) -> None:
+        blocks_per_day = 60 * 60 * 24 / block_time
+        super().__init__(initial_price=float(prices[0]),
+                         # NOTE: not used, the prices are replayed
+                         daily_sigma=float('nan'),
+                         days=len(prices) / blocks_per_day,
+                         gas_cost=gas_cost,
+                         liquidity_per_basis_point=liquidity_per_basis_point,
+                         base_pool_fee=base_pool_fee,
+                         paths=paths,
+                         gas_model=gas_model)
+        self.blocks_per_day = blocks_per_day
+        self.prices = prices
+
+    def path_prices(self, path: int) -> np.ndarray:
+        return self.prices
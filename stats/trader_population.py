@@ -0,0 +1,214 @@
+"""
+Heterogeneous swapper populations and their order flow, drawn as arrays.
+
+`TraderPopulation` fixes the agents (ids 1..number_of_swappers, each
+informed or not) and the distributions of their order flow.
+`TraderPopulation.draw` produces the order flow of many blocks in one
+vectorized call:
+
+    offsets         swaps of block i are offsets[i]:offsets[i + 1]
+    swapper_ids     per swap, int64
+    informed        per swap, the swapper's type
+    submitted_fees  per swap, NaN if no fee is submitted
+    trade_sizes     per swap, X bought (sold if negative) by an uninformed
+                    swapper, 0 for the informed ones who trade to the
+                    efficient price
+
+Swappers `1..loyal_swappers` swap in each block with probability
+`loyal_activity`, so at the default 0.97 they pass the 0.95 intent
+threshold of the fee discount. The others share a number of swaps per
+block, fixed, Poisson or negative binomial, and are picked without
+replacement within a block, one after the other with weights
+`id ** -activity_exponent`. The defaults are the order flow of
+`Simulation.do_simulation`: 99 informed swaps per block by distinct,
+uniformly drawn swappers, each submitting a fee uniform in [0, 0.003).
+
+    population = TraderPopulation(informed_share=0.8, loyal_swappers=20, swap_count_dispersion=0.5, seed=1)
+    Simulation(...).do_simulation_jit(seed, population=population)
+"""
+import math
+import numpy as np
+
+
+class OrderFlow:
+    def __init__(self,
+                 offsets: np.ndarray,
+                 swapper_ids: np.ndarray,
+                 informed: np.ndarray,
+                 submitted_fees: np.ndarray,
+                 trade_sizes: np.ndarray) -> None:
+        self.offsets = offsets
+        self.swapper_ids = swapper_ids
+        self.informed = informed
+        self.submitted_fees = submitted_fees
+        self.trade_sizes = trade_sizes
+
+    def __len__(self) -> int:
+        """Number of blocks."""
+        return self.offsets.shape[0] - 1
+
+    @property
+    def swaps_per_block(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def block(self, block: int) -> dict[str, np.ndarray]:
+        """The swaps of `block`, per column."""
+        swaps = slice(self.offsets[block], self.offsets[block + 1])
+        return {'swapper_ids': self.swapper_ids[swaps],
+                'informed': self.informed[swaps],
+                'submitted_fees': self.submitted_fees[swaps],
+                'trade_sizes': self.trade_sizes[swaps]}
+
+
+class TraderPopulation:
+    def __init__(self,
+                 number_of_swappers: int=1000,
+                 informed_share: float=1.0,
+                 loyal_swappers: int=0,
+                 loyal_activity: float=0.97,
+                 swaps_per_block: float=99,
+                 swap_count_dispersion: float|None=None,
+                 max_swaps_per_block: int=1000,
+                 activity_exponent: float=0.0,
+                 fee_submission_rate: float=1.0,
+                 max_submitted_fee: float=0.003,
+                 submitted_fee_shape: tuple[float, float]=(1.0, 1.0),
+                 median_trade_size: float=1.0,
+                 trade_size_sigma: float=1.0,
+                 seed=None) -> None:
+        """
+        Args:
+            informed_share: probability of a swapper to be informed, the
+                types are drawn once from `seed`.
+            swaps_per_block: mean number of swaps per block of the swappers
+                that are not loyal.
+            swap_count_dispersion: None for a fixed number of swaps, 0 for
+                Poisson, d > 0 for negative binomial of variance mean + d mean^2.
+            max_swaps_per_block: cap of the swaps of a block, loyal ones included.
+            activity_exponent: 0 for equally active swappers, larger for a
+                few very active ones.
+            submitted_fee_shape: beta distribution of the submitted fees
+                over [0, max_submitted_fee], uniform by default.
+            median_trade_size, trade_size_sigma: log-normal size in X of
+                uninformed trades, buying or selling with equal probability.
+        """
+        if not 0 <= loyal_swappers <= number_of_swappers:
+            raise ValueError("`loyal_swappers` must be between 0 and `number_of_swappers`.")
+        if loyal_swappers > max_swaps_per_block:
+            raise ValueError("`loyal_swappers` cannot exceed `max_swaps_per_block`.")
+        if loyal_swappers == number_of_swappers and swaps_per_block > 0:
+            raise ValueError("All swappers are loyal, set `swaps_per_block` to 0.")
+        self.number_of_swappers = number_of_swappers
+        self.informed_share = informed_share
+        self.loyal_swappers = loyal_swappers
+        self.loyal_activity = loyal_activity
+        self.swaps_per_block = swaps_per_block
+        self.swap_count_dispersion = swap_count_dispersion
+        self.max_swaps_per_block = max_swaps_per_block
+        self.activity_exponent = activity_exponent
+        self.fee_submission_rate = fee_submission_rate
+        self.max_submitted_fee = max_submitted_fee
+        self.submitted_fee_shape = submitted_fee_shape
+        self.median_trade_size = median_trade_size
+        self.trade_size_sigma = trade_size_sigma
+        # type per swapper id, index 0 unused
+        self.informed = np.random.default_rng(seed).random(number_of_swappers + 1) < informed_share
+        self.informed[0] = True
+        # picking weights of the swappers that are not loyal
+        self._occasional_ids = np.arange(loyal_swappers + 1, number_of_swappers + 1)
+        self._occasional_weights = self._occasional_ids.astype(np.float64)**-activity_exponent
+
+    def _swap_counts(self, rng: np.random.Generator, blocks: int) -> np.ndarray:
+        mean = self.swaps_per_block
+        if self.swap_count_dispersion is None:
+            counts = np.full(blocks, int(round(mean)), dtype=np.int64)
+        elif self.swap_count_dispersion == 0:
+            counts = rng.poisson(mean, blocks)
+        else:
+            n = 1 / self.swap_count_dispersion
+            counts = rng.negative_binomial(n, n / (n + mean), blocks)
+        return counts
+
+    def _occasional_swappers(self, rng: np.random.Generator, counts: np.ndarray) -> np.ndarray:
+        """
+        `counts[i]` distinct swappers that are not loyal for each block i, in
+        the order of successive weighted draws without replacement: the
+        swappers whose exponential clocks of rate `weight` ring first.
+        """
+        occasional = self._occasional_ids.shape[0]
+        picked = []
+        # rows per batch, bounding the clocks drawn at once to about 4M
+        rows = max(1, 2**22 // max(occasional, 1))
+        for start in range(0, counts.shape[0], rows):
+            batch = counts[start:start + rows]
+            k = int(batch.max(initial=0))
+            if k == 0:
+                continue
+            clocks = rng.standard_exponential((batch.shape[0], occasional)) / self._occasional_weights
+            first = np.argpartition(clocks, k - 1, axis=1)[:, :k] if k < occasional else \
+                np.broadcast_to(np.arange(occasional), (batch.shape[0], occasional))
+            first = np.take_along_axis(first, np.argsort(np.take_along_axis(clocks, first, axis=1), axis=1), axis=1)
+            picked.append(first[np.arange(k) < batch[:, None]])
+        return self._occasional_ids[np.concatenate(picked)] if picked else np.zeros(0, dtype=np.int64)
+
+    def draw(self, rng: np.random.Generator, blocks: int) -> OrderFlow:
+        """The order flow of `blocks` consecutive blocks."""
+        loyal = rng.random((blocks, self.loyal_swappers)) < self.loyal_activity
+        loyal_blocks, loyal_slots = np.nonzero(loyal)
+        counts = np.minimum(self._swap_counts(rng, blocks), self.max_swaps_per_block - loyal.sum(axis=1))
+        counts = np.minimum(counts, self._occasional_ids.shape[0])
+        block_of_swap = np.repeat(np.arange(blocks), counts)
+        swapper_ids = self._occasional_swappers(rng, counts).astype(np.int64)
+        if self.loyal_swappers:
+            block_of_swap = np.concatenate([loyal_blocks, block_of_swap])
+            swapper_ids = np.concatenate([loyal_slots + 1, swapper_ids])
+            # by block, in random order within a block (the fraction keeps 30+ random bits)
+            swapper_ids = swapper_ids[np.argsort(block_of_swap + rng.random(swapper_ids.shape[0]))]
+        swaps = swapper_ids.shape[0]
+        offsets = np.zeros(blocks + 1, dtype=np.int64)
+        np.cumsum(np.bincount(block_of_swap, minlength=blocks), out=offsets[1:])
+
+        informed = self.informed[swapper_ids]
+        if self.submitted_fee_shape == (1.0, 1.0):
+            submitted_fees = rng.uniform(0.0, self.max_submitted_fee, swaps)
+        else:
+            submitted_fees = rng.beta(*self.submitted_fee_shape, swaps) * self.max_submitted_fee
+        if self.fee_submission_rate < 1.0:
+            submitted_fees[rng.random(swaps) >= self.fee_submission_rate] = math.nan
+        trade_sizes = np.where(informed,
+                               0.0,
+                               rng.lognormal(math.log(self.median_trade_size), self.trade_size_sigma, swaps)
+                               * rng.choice([-1.0, 1.0], swaps))
+        return OrderFlow(offsets, swapper_ids, informed, submitted_fees, trade_sizes)
+
+
+def simulate_population_path(rng: np.random.Generator,
+                             population: TraderPopulation,
+                             price_paths,
+                             params: np.ndarray,
+                             gas_cost: float,
+                             chunk_blocks: int=4096) -> np.ndarray:
+    """
+    One path of the compiled AMM traded by `population`: a path of the
+    `price_paths.GBMPricePaths` `price_paths`, order book pressures as `PressureSeries.simulate`, and the order
+    flow drawn `chunk_blocks` blocks at a time.
+    Returns:
+        lvr and arbitrage gain of the informed swaps, gas of all executed
+        swaps and lvr of the uninformed swaps over the path (not yet
+        divided by days).
+    """
+    # NOTE: imported here, numba is only loaded by the runs that compile
+    from amm_kernel import new_pool, run_order_flow
+    from price_feed import PressureSeries
+    total_number_of_blocks = price_paths.total_number_of_blocks
+    prices = price_paths.path(rng)
+    pressures = PressureSeries.simulate(rng, total_number_of_blocks - 1).pressures
+    pool = new_pool(prices[0], params, population.number_of_swappers, population.max_swaps_per_block)
+    totals = np.zeros(4)
+    for first_block in range(1, total_number_of_blocks, chunk_blocks):
+        last_block = min(first_block + chunk_blocks, total_number_of_blocks)
+        flow = population.draw(rng, last_block - first_block)
+        run_order_flow(pool, params, first_block, prices[first_block - 1:last_block],
+                       pressures[first_block - 1:last_block - 1], flow.offsets, flow.swapper_ids,
+                       flow.informed, flow.submitted_fees, flow.trade_sizes, gas_cost, totals)
+    return totals
@@ -0,0 +1,359 @@
+"""
+Vectorized Monte-Carlo engine for `Simulation`.
+
+Every path carries its own `AMM` whose state (sqrt_price, fee state,
+cut-off percentile, submitted fees, swapper intent, accumulators) is held
+in NumPy arrays of length `paths`. All paths are stepped together, one
+block and one swap at a time, so the Python loop runs over blocks x swaps
+instead of paths x blocks x swaps.
+
+Tolerance: fed with the same draws (see `draw_blocks` and
+`scalar_reference`), the `(3, paths)` result agrees with the scalar
+`Simulation`/`AMM` loop to `rtol=1e-9`. The differences come only from the
+summation order inside np.mean/np.std of the trimmed submitted fees.
+With independent seeds the two engines agree in distribution only.
+"""
+import numpy as np
+from simulation import Simulation
+from sketches import ResultsSummary
+from amm_modified import AMM
+from price_feed import PressureSeries
+
+
+class VectorizedAMM:
+    """
+    `amm_modified.AMM` for many paths at once.
+
+    Parameters may be scalars or arrays broadcastable to `(paths,)`.
+    Every swap is expected to submit a fee, so the number of submitted fees
+    in the current block is the same for all paths.
+    """
+    def __init__(self,
+                 price: np.ndarray,
+                 L: float=166_666.67,
+                 base_fee=0.003,
+                 m=0.5,
+                 n=2,
+                 alpha=0.5,
+                 intent_threshold=0.95,
+                 intent_window: int=256,
+                 cut_off_percentile=0.85,
+                 cut_off_percentile_step=0.05,
+                 number_of_swappers: int=1000,
+                 max_swaps_per_block: int=100) -> None:
+        price = np.asarray(price, dtype=np.float64)
+        self.paths = price.shape[0]
+        self.sqrt_price = np.sqrt(price)
+        self.current_block_id = None
+
+        self.L = L
+        self.base_fee = base_fee
+        self.pool_fee = np.broadcast_to(base_fee, price.shape).astype(np.float64)
+        self.pool_fee_in_market_direction = self.pool_fee.copy()
+        self.pool_fee_in_opposite_direction = self.pool_fee.copy()
+
+        # endogenous fee: the previous block prices are never updated in `AMM`
+        price_before_previous_block = np.trunc(price * 0.995)
+        price_impact = np.abs(price - price_before_previous_block) / price_before_previous_block
+        self.endogenous_fee = base_fee + price_impact * 0.01
+        # of the last swap, as `AMM.combined_fee`
+        self.combined_fee = np.broadcast_to(base_fee, price.shape).astype(np.float64)
+
+        self.cut_off_percentile = np.broadcast_to(cut_off_percentile, price.shape).astype(np.float64)
+        self.cut_off_percentile_step = cut_off_percentile_step
+        self.m = m
+        self.n = n
+        self.alpha = alpha
+        self.intent_threshold = intent_threshold
+        self.first_transaction = np.ones(self.paths, dtype=bool)
+        self.intent_window = intent_window
+        # swapper ids are 1..number_of_swappers, one bit per id and path in a ring
+        # of the current block plus the last `intent_window` blocks
+        self.swapper_history = np.zeros((intent_window + 1, self.paths, (number_of_swappers + 8) // 8),
+                                        dtype=np.uint8)
+        self.swapper_intent = np.zeros((self.paths, number_of_swappers + 1), dtype=np.int64)
+        self.total_blocks = 0
+        self.order_bool_pressure = np.zeros(self.paths)
+
+        # submitted fees of the current block, kept sorted per path
+        self.submitted_fees = np.empty((self.paths, max_swaps_per_block))
+        self.number_of_submitted_fees = 0
+        self._rows = np.arange(self.paths)
+
+    def _current_swappers(self) -> np.ndarray:
+        return self.swapper_history[self.total_blocks % (self.intent_window + 1)]
+
+    def _in_current_block(self, swapper_id: np.ndarray) -> np.ndarray:
+        return (self._current_swappers()[self._rows, swapper_id >> 3] >> (swapper_id & 7)) & 1 == 1
+
+    def exogenous_dynamic_fee(self, swapper_id: np.ndarray) -> np.ndarray:
+        k = self.number_of_submitted_fees
+        if k < 2:
+            return np.broadcast_to(self.base_fee, (self.paths,)).astype(np.float64)
+        sorted_fees = self.submitted_fees[:, :k]
+        cutoff_index = (k * self.cut_off_percentile).astype(np.int64)
+        kept = np.arange(k) < cutoff_index[:, None]
+        mean_fee = np.where(kept, sorted_fees, 0.0).sum(axis=1) / cutoff_index
+        deviation = np.where(kept, sorted_fees - mean_fee[:, None], 0.0)
+        sigma_fee = np.sqrt((deviation * deviation).sum(axis=1) / cutoff_index)
+        loyal = self._in_current_block(swapper_id)
+        return np.where(loyal, mean_fee + self.m * sigma_fee, self.n * sigma_fee)
+
+    def calculate_combined_fee(self, swapper_id: np.ndarray) -> np.ndarray:
+        combined_fee = self.alpha * self.endogenous_fee +\
+            (1 - self.alpha) * self.exogenous_dynamic_fee(swapper_id)
+        combined_fee = np.maximum(combined_fee, self.endogenous_fee)
+        # Adjust cut-off percentile
+        self.cut_off_percentile = np.where(combined_fee <= (self.base_fee * 1.25),
+                                           np.minimum(self.cut_off_percentile + self.cut_off_percentile_step, 1.0),
+                                           self.cut_off_percentile)
+        self.cut_off_percentile = np.where(combined_fee > self.base_fee * 2,
+                                           np.maximum(self.cut_off_percentile - self.cut_off_percentile_step, 0.5),
+                                           self.cut_off_percentile)
+        combined_fee = np.where(self.first_transaction, combined_fee * 5, combined_fee)
+        self.first_transaction[:] = False
+
+        intent = self.swapper_intent[self._rows, swapper_id]
+        if self.total_blocks > 0:
+            # completed blocks only, as the denominator
+            intent_rate = (intent - self._in_current_block(swapper_id)) / min(self.total_blocks, self.intent_window)
+            loyal = (intent > 0) & (intent_rate >= self.intent_threshold)
+            combined_fee = np.where(loyal, combined_fee * 0.9, combined_fee)
+        return combined_fee
+
+    def _insert_submitted_fee(self, submitted_fee: np.ndarray) -> None:
+        k = self.number_of_submitted_fees
+        self.submitted_fees[:, k] = submitted_fee
+        # rows are already sorted, a stable sort only has to merge one element
+        self.submitted_fees[:, :k + 1].sort(axis=1, kind='stable')
+        self.number_of_submitted_fees = k + 1
+
+    def trade_to_price_with_gas_fee(self,
+                                    efficient_off_chain_price: np.ndarray,
+                                    submitted_fee: np.ndarray,
+                                    swapper_id: np.ndarray,
+                                    block_id: int,
+                                    gas: float=0.0):
+        """
+        Vectorized `AMM.trade_to_price_with_gas_fee` for informed traders.
+        Returns:
+            x, y, fee: arrays of length `paths`, zero where no swap happened.
+        """
+        if self.current_block_id != 0:
+            self.combined_fee = self.calculate_combined_fee(swapper_id)
+            delta = self.combined_fee - self.base_fee
+            self.pool_fee_in_market_direction = self.pool_fee + delta
+            self.pool_fee_in_opposite_direction = self.pool_fee - delta
+
+        current_amm_price = self.sqrt_price**2
+        amm_bid_price = current_amm_price * (2 - (1 + self.base_fee))
+        amm_ask_price = current_amm_price * (1 + self.base_fee)
+        self._insert_submitted_fee(submitted_fee)
+        new_swapper = ~self._in_current_block(swapper_id)
+        bit = np.left_shift(np.uint8(1), (swapper_id & 7).astype(np.uint8))
+        self._current_swappers()[self._rows, swapper_id >> 3] |= np.where(new_swapper, bit, np.uint8(0))
+        self.swapper_intent[self._rows, swapper_id] += new_swapper
+
+        buy = amm_ask_price < efficient_off_chain_price
+        sell = ~buy & (amm_bid_price > efficient_off_chain_price)
+        pressure = self.order_bool_pressure
+        market = 1 + self.pool_fee_in_market_direction
+        opposite = 1 + self.pool_fee_in_opposite_direction
+        _fee = np.where(pressure == 0, 1 + self.base_fee,
+                        np.where(buy == (pressure > 0), market, opposite))
+        new_sqrt_price = np.sqrt(np.where(buy,
+                                          efficient_off_chain_price / _fee,
+                                          efficient_off_chain_price * (2 - _fee)))
+        x = (new_sqrt_price - self.sqrt_price) * self.L / (self.sqrt_price * new_sqrt_price)
+        y = -(new_sqrt_price - self.sqrt_price) * self.L
+        y, fee = (np.where(buy, y * _fee, y * (2 - _fee)),
+                  np.where(buy, -y * (_fee - 1), (y - y * (2 - _fee))))
+        executed = (buy | sell) & ~(gas > (x * efficient_off_chain_price + y))
+        self.sqrt_price = np.where(executed, new_sqrt_price, self.sqrt_price)
+        return (np.where(executed, x, 0.0),
+                np.where(executed, y, 0.0),
+                np.where(executed, fee, 0.0))
+
+    def begin_block(self, block_id: int, order_bool_pressure: np.ndarray):
+        self.current_block_id = block_id
+        self.order_bool_pressure = order_bool_pressure
+
+    def end_block(self):
+        self.number_of_submitted_fees = 0
+        self.total_blocks += 1
+        # the row of the block leaving the window becomes the current block
+        expired = self._current_swappers()
+        if self.total_blocks > self.intent_window:
+            self.swapper_intent -= np.unpackbits(expired, axis=1, bitorder='little',
+                                                 count=self.swapper_intent.shape[1])
+        expired[:] = 0
+        self.first_transaction[:] = True
+
+
+def l1_order_book_pressure(price: float,
+                           bid_size: np.ndarray,
+                           ask_size: np.ndarray,
+                           half_spread: float=0.005) -> np.ndarray:
+    """Vectorized `PriceFeed.l1_order_book_pressure`."""
+    bid_price = price * (1 - half_spread)
+    ask_price = price * (1 + half_spread)
+    return (ask_size * ask_price - bid_size * bid_price) /\
+        (ask_size * ask_price + bid_size * bid_price)
+
+
+class VectorizedSimulation(Simulation):
+    """
+    Drop-in replacement for `Simulation` that steps all paths together.
+    """
+    number_of_swaps_in_block = 100
+    number_of_swappers = 1000
+
+    def amm(self, prices: np.ndarray) -> VectorizedAMM:
+        return VectorizedAMM(prices,
+                             L=166_666.67,
+                             base_fee=0.003,
+                             m=0.5,
+                             n=2,
+                             alpha=0.5,
+                             intent_threshold=0.95,
+                             number_of_swappers=self.number_of_swappers,
+                             max_swaps_per_block=self.number_of_swaps_in_block)
+
+    def draw_blocks(self, rng: np.random.Generator, paths: int|None=None):
+        """
+        Yields the random inputs of each block for all paths:
+        log-price increment, submitted fees, swapper ids and order book pressure.
+        """
+        paths = paths or self.paths
+        sigma = self.daily_sigma / np.sqrt(self.blocks_per_day)
+        total_number_of_blocks = int(self.days * self.blocks_per_day)
+        swapper_ids = np.broadcast_to(np.arange(1, self.number_of_swappers + 1),
+                                      (paths, self.number_of_swappers))
+        for _ in range(1, total_number_of_blocks):
+            increment = rng.normal(0.0, sigma, paths) - sigma**2 / 2
+            submitted_fees = rng.uniform(0.0, 0.003, (paths, self.number_of_swaps_in_block))
+            swappers = rng.permuted(swapper_ids, axis=1)[:, :self.number_of_swaps_in_block]
+            bid_size = rng.integers(1, 1001, paths)
+            ask_size = rng.integers(1, 1001, paths)
+            while np.any(equal := ask_size == bid_size):
+                ask_size[equal] = rng.integers(1, 1001, np.count_nonzero(equal))
+            pressure = l1_order_book_pressure(self.initial_price, bid_size, ask_size)
+            yield increment, submitted_fees, swappers, pressure
+
+    def run(self, blocks, summary: ResultsSummary|None=None) -> np.ndarray:
+        """
+        Runs all paths over the block inputs produced by `draw_blocks`,
+        adding every block's metrics of all paths to `summary`, if given.
+        """
+        price = np.full(self.paths, float(self.initial_price))
+        amm = self.amm(price)
+        loss_versus_rebalancing = np.zeros(self.paths)
+        arbitrage_gain = np.zeros(self.paths)
+        gas = np.zeros(self.paths)
+        if summary is not None:
+            block_lvr = np.empty(self.paths)
+            block_arbitrage_gain = np.empty(self.paths)
+            swap_metrics = np.empty((2, self.number_of_swaps_in_block - 1, self.paths))
+        for block, (increment, submitted_fees, swappers, pressure) in enumerate(blocks, start=1):
+            next_price = price * np.exp(increment)
+            if block > 1:
+                amm.end_block()
+            amm.begin_block(block - 1, pressure)
+            if summary is not None:
+                block_lvr[:] = 0.0
+                block_arbitrage_gain[:] = 0.0
+            for swap in range(1, submitted_fees.shape[1]):
+                x0, y0, f = amm.trade_to_price_with_gas_fee(
+                    efficient_off_chain_price=price,
+                    submitted_fee=submitted_fees[:, swap],
+                    swapper_id=swappers[:, swap],
+                    block_id=block-1,
+                    gas=self.gas_cost)
+                loss_versus_rebalancing += -x0 * next_price - y0
+                traded = x0 != 0.0
+                arbitrage_gain += np.where(traded, x0 * next_price + y0 - self.gas_cost, 0.0)
+                gas += np.where(traded, self.gas_cost, 0.0)
+                if summary is not None:
+                    block_lvr += -x0 * next_price - y0
+                    block_arbitrage_gain += np.where(traded, x0 * next_price + y0 - self.gas_cost, 0.0)
+                    swap_metrics[0, swap - 1] = amm.combined_fee
+                    swap_metrics[1, swap - 1] = np.where(traded, f, np.nan)
+            if summary is not None:
+                summary.update('lvr', block_lvr)
+                summary.update('arbitrage_gain', block_arbitrage_gain)
+                summary.update('combined_fee', swap_metrics[0, :submitted_fees.shape[1] - 1])
+                summary.update('fee', swap_metrics[1, :submitted_fees.shape[1] - 1])
+            price = next_price
+        return np.stack([loss_versus_rebalancing / self.days,
+                         arbitrage_gain / self.days,
+                         gas / self.days])
+
+    def do_simulation(self, seed: int|None=None, summary: ResultsSummary|None=None) -> np.ndarray:
+        """
+        # Same (3, paths) layout as `Simulation.do_simulation`:
+        (0) lvr (as a positive number),
+        (1) arb's gain (negative),
+        (2) total gas burned
+        """
+        return self.run(self.draw_blocks(np.random.default_rng(seed)), summary)
+
+
+def scalar_reference_path(prices,
+                          submitted_fees: np.ndarray,
+                          swappers: np.ndarray,
+                          pressures,
+                          gas_cost: float) -> np.ndarray:
+    """
+    Drives the scalar `AMM` over one path of recorded inputs, one row of
+    `submitted_fees`/`swappers` and one pressure per block.
+    Returns:
+        lvr, arbitrage gain and gas of the path (not yet divided by days).
+    """
+    prices = [float(price) for price in prices]
+    amm = AMM(prices[0],
+              L=166_666.67,
+              base_fee=0.003,
+              m=0.5,
+              n=2,
+              alpha=0.5,
+              intent_threshold=0.95,
+              price_feed=PressureSeries(np.asarray(pressures, dtype=np.float64)))
+    loss_versus_rebalancing = 0.0
+    arbitrage_gain = 0.0
+    gas = 0.0
+    for block in range(1, len(prices)):
+        for swap in range(1, submitted_fees.shape[1]):
+            x0, y0, f = amm.trade_to_price_with_gas_fee(
+                efficient_off_chain_price=prices[block-1],
+                submitted_fee=float(submitted_fees[block-1, swap]),
+                swapper_id=int(swappers[block-1, swap]),
+                block_id=block-1,
+                gas=gas_cost)
+            loss_versus_rebalancing += -x0 * prices[block] - y0
+            if x0 != 0.0:
+                arbitrage_gain += x0 * prices[block] + y0 - gas_cost
+                gas += gas_cost
+    return np.array([loss_versus_rebalancing, arbitrage_gain, gas])
+
+
+def scalar_reference(simulation: VectorizedSimulation, blocks: list) -> np.ndarray:
+    """
+    Drives the scalar `AMM`, path by path, with the same block inputs as
+    `VectorizedSimulation.run` so that both engines can be cross-checked.
+    """
+    results = np.zeros((3, simulation.paths))
+    # same recursion as `run`, so both engines see bit-identical prices
+    all_prices = [np.full(simulation.paths, float(simulation.initial_price))]
+    for increment, *_ in blocks:
+        all_prices.append(all_prices[-1] * np.exp(increment))
+    prices = np.stack(all_prices, axis=1)
+    submitted_fees = np.stack([block[1] for block in blocks], axis=1)
+    swappers = np.stack([block[2] for block in blocks], axis=1)
+    pressures = np.stack([block[3] for block in blocks], axis=1)
+    for path in range(simulation.paths):
+        results[:, path] = scalar_reference_path(prices[path],
+                                                 submitted_fees[path],
+                                                 swappers[path],
+                                                 pressures[path],
+                                                 simulation.gas_cost) / simulation.days
+    return results